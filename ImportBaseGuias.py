@@ -8,6 +8,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from openpyxl import load_workbook, Workbook
+from carteira import decompor_carteira
 
 # Variáveis globais
 driver = None
@@ -75,37 +76,14 @@ def funccarteira(carteira, Retorno):
       Se Retorno == 4, retorna p4;
       Se Retorno == 5, retorna p5.
     """
-    try:
-        # Divide nos três primeiros pontos
-        p1, resto = carteira.split('.', 1)
-        p2, resto = resto.split('.', 1)
-        p3, resto = resto.split('.', 1)
-        # Divide o restante com base no primeiro traço
-        if '-' in resto:
-            p4, p5 = resto.split('-', 1)
-        else:
-            p4, p5 = resto, ""
-    except Exception as e:
-        print("Erro na função funccarteira:", e)
+    # A decomposição é compartilhada com o app (carteira.py) e fica em cache por número
+    componentes = decompor_carteira(carteira)
+    if componentes is None:
+        print("Erro na função funccarteira: formato de carteira inválido:", carteira)
         return ""
     
-    # Remover espaços em branco extra
-    p1 = p1.strip()
-    p2 = p2.strip()
-    p3 = p3.strip()
-    p4 = p4.strip()
-    p5 = p5.strip()
-    
-    if Retorno == 1:
-        return p1
-    elif Retorno == 2:
-        return p2
-    elif Retorno == 3:
-        return p3
-    elif Retorno == 4:
-        return p4
-    elif Retorno == 5:
-        return p5
+    if Retorno in (1, 2, 3, 4, 5):
+        return componentes[Retorno - 1]
     else:
         return ""
 
@@ -1,30 +1,44 @@
-# Imports e configurações iniciais
+# Imports e configurações iniciais (o Plotly é importado apenas nas funções dos dashboards)
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
 from datetime import datetime, date, time, timedelta
 import logging
+import threading
 import traceback
 import re
-import tempfile
 from io import BytesIO
-from sqlalchemy import (
-    create_engine, Column, Integer, String, Boolean, ForeignKey, 
-    Date, DateTime, text, extract, Table, MetaData, inspect, and_
-)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, joinedload
+from sqlalchemy import Date, text, extract, inspect, func, event, select, insert, update, delete, literal, or_
+from sqlalchemy.orm import joinedload
 import os
 from unidecode import unidecode
-import unicodedata
-from dotenv import load_dotenv
-
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv(override=True)
 
-# Obter a URL do banco de dados do arquivo .env
-DATABASE_URL = os.getenv('DATABASE_URL')
+# Módulos carregados uma única vez por processo (os reruns reexecutam apenas este arquivo)
+from database import (
+    Base, engine, engine_leitura, Session, get_session, sessao_banco, sessao_leitura,
+    metricas_pool, otimizar_apos_importacao, sincronizar_associacao, upsert_em_lote
+)
+from models import (
+    profissional_area_atuacao, profissional_pagamento, profissional_perfil_paciente,
+    Unidade, Sala, AreaAtuacao, Pagamento, PerfilPaciente, Disponibilidade, DisponibilidadeSala,
+    Terminologia, Profissional, AgendaFixa, AgendaDiaria, VersaoEsquema, Agendamento, Paciente,
+    Carteira, ContadorOcupacao, SnapshotOcupacao
+)
+from carteira import CAMPOS_CARTEIRA, decompor_carteiras
+from utils import remover_acentos, normalizar_texto
+from deduplicacao import LIMIAR_SIMILARIDADE, propor_duplicados
+from referencias import MapasAgenda, vincular_agenda_fixa
+from leitura import FORMATOS_UPLOAD, ler_planilha
+from importacao import (
+    IMPORTACAO_AREAS, IMPORTACAO_PAGAMENTOS, IMPORTACAO_PERFIS, IMPORTACAO_SALAS, IMPORTACAO_TERMINOLOGIAS,
+    IMPORTACAO_UNIDADES,
+    colunas_template, importar_tabela
+)
+from ocupacao import (
+    SEM_UNIDADE, construir_cubo_profissionais, construir_cubo_salas,
+    consulta_contagem_grade, atualizar_contadores_ocupacao, consultar_historico_ocupacao,
+    atualizar_agenda_diaria, consultar_agenda_diaria, capacidade_no_periodo, mapa_calor_ocupacao
+)
 
 # Configuração da página do Streamlit
 st.set_page_config(
@@ -43,24 +57,6 @@ logging.basicConfig(
     ]
 )
 
-# Função base para sessão do banco de dados
-def get_session():
-    """Retorna uma sessão do banco de dados"""
-    try:
-        session = Session()
-        return session
-    except Exception as e:
-        logging.error(f"Erro ao criar sessão do banco de dados: {str(e)}")
-        return None
-
-# Configuração do banco de dados
-Base = declarative_base()
-engine = create_engine(
-    DATABASE_URL,
-    echo=False
-)
-Session = sessionmaker(bind=engine)
-
 # Constantes
 DIAS_SEMANA_UTIL = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira"]
 DIAS_SEMANA_SABADO = ["Sábado"]
@@ -93,32 +89,9 @@ HORARIOS_DISPONIVEIS = [
 
 # Funções auxiliares
 def verificar_integridade_banco():
-    """Verifica e cria o banco de dados se necessário"""
+    """Verifica e cria o banco de dados se necessário (uma única vez por processo)"""
     try:
-        session = get_session()
-        if not session:
-            st.error("❌ Não foi possível conectar ao banco de dados")
-            return False
-            
-        try:
-            # Criar tabelas se não existirem
-            Base.metadata.create_all(engine)
-            
-            # Carregar dados iniciais apenas se necessário
-            carregar_dados_iniciais(session)
-            
-            session.commit()
-            return True
-            
-        except Exception as e:
-            logging.error(f"Erro ao verificar integridade do banco: {str(e)}")
-            st.error(f"❌ Erro ao verificar integridade do banco: {str(e)}")
-            return False
-
-        finally:
-            if session:
-                session.close()
-            
+        return inicializar_banco()
     except Exception as e:
         logging.error(f"Erro ao verificar integridade do banco: {str(e)}")
         st.error(f"❌ Erro ao verificar integridade do banco: {str(e)}")
@@ -170,226 +143,6 @@ def verificar_tabela_pacientes(session):
         st.error(f"❌ Erro ao verificar tabelas de pacientes: {str(e)}")
         return False
 
-# Tabelas de junção
-profissional_area_atuacao = Table(
-    'profissional_area_atuacao', Base.metadata,
-    Column('profissional_id', Integer, ForeignKey('profissionais.id'), primary_key=True),
-    Column('area_atuacao_id', Integer, ForeignKey('areas_atuacao.id'), primary_key=True)
-)
-
-profissional_pagamento = Table(
-    'profissional_pagamento', Base.metadata,
-    Column('profissional_id', Integer, ForeignKey('profissionais.id'), primary_key=True),
-    Column('pagamento_id', Integer, ForeignKey('pagamentos.id'), primary_key=True)
-)
-
-profissional_perfil_paciente = Table(
-    'profissional_perfil_paciente', Base.metadata,
-    Column('profissional_id', Integer, ForeignKey('profissionais.id'), primary_key=True),
-    Column('perfil_paciente_id', Integer, ForeignKey('perfis_paciente.id'), primary_key=True)
-)
-
-# Modelos
-class Unidade(Base):
-    """Modelo para unidades"""
-    __tablename__ = 'unidades'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    nome = Column(String(100), nullable=False, unique=True)
-    atende_sabado = Column(Boolean, default=False)
-    ativo = Column(Boolean, default=True)
-    
-    # Relacionamentos
-    salas = relationship("Sala", back_populates="unidade", cascade="all, delete-orphan")
-    disponibilidades = relationship("Disponibilidade", back_populates="unidade", cascade="all, delete-orphan")
-
-class Sala(Base):
-    """Modelo para salas"""
-    __tablename__ = 'salas'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    nome = Column(String(50), nullable=False)
-    unidade_id = Column(Integer, ForeignKey('unidades.id'), nullable=False)
-    ativo = Column(Boolean, default=True)
-    
-    # Relacionamentos
-    unidade = relationship("Unidade", back_populates="salas")
-    profissionais = relationship("Profissional", back_populates="sala", cascade="all, delete-orphan")
-    disponibilidades_sala = relationship("DisponibilidadeSala", back_populates="sala", cascade="all, delete-orphan")
-
-class AreaAtuacao(Base):
-    """Modelo para áreas de atuação dos profissionais"""
-    __tablename__ = 'areas_atuacao'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    nome = Column(String(100), nullable=False, unique=True)
-    descricao = Column(String(200))
-    ativo = Column(Boolean, default=True)
-    
-    # Relacionamentos
-    profissionais = relationship("Profissional", secondary="profissional_area_atuacao", back_populates="areas_atuacao")
-    terminologias = relationship("Terminologia", back_populates="area_atuacao")
-
-class Pagamento(Base):
-    """Modelo para tipos de pagamento"""
-    __tablename__ = 'pagamentos'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    nome = Column(String(100), nullable=False, unique=True)
-    ativo = Column(Boolean, default=True)
-    
-    # Relacionamentos
-    profissionais = relationship("Profissional", secondary="profissional_pagamento", back_populates="pagamentos")
-    terminologias = relationship("Terminologia", back_populates="pagamento")
-
-class PerfilPaciente(Base):
-    """Modelo para perfis de pacientes"""
-    __tablename__ = 'perfis_paciente'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    nome = Column(String(100), nullable=False, unique=True)
-    descricao = Column(String(200))
-    ativo = Column(Boolean, default=True)
-    
-    # Relacionamentos
-    profissionais = relationship("Profissional", secondary="profissional_perfil_paciente", back_populates="perfis_paciente")
-
-class Disponibilidade(Base):
-    """Modelo para disponibilidade de profissionais"""
-    __tablename__ = 'disponibilidade'
-    __table_args__ = {'extend_existing': True}
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    profissional_id = Column(Integer, ForeignKey('profissionais.id'), nullable=False)
-    unidade_id = Column(Integer, ForeignKey('unidades.id'), nullable=True)
-    dia_semana = Column(String(20), nullable=False)
-    periodo = Column(String(20), nullable=False)  # 'Matutino' ou 'Vespertino'
-    hora_inicio = Column(String(5), nullable=True)
-    hora_fim = Column(String(5), nullable=True)
-    status = Column(String(20), nullable=False, default='Disponível')
-    
-    # Relacionamentos
-    profissional = relationship("Profissional", back_populates="disponibilidades")
-    unidade = relationship("Unidade", back_populates="disponibilidades")
-
-class DisponibilidadeSala(Base):
-    """Modelo para disponibilidade de salas"""
-    __tablename__ = 'disponibilidade_salas'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    sala_id = Column(Integer, ForeignKey('salas.id'), nullable=False)
-    dia_semana = Column(String(20), nullable=False)
-    horario = Column(String(5), nullable=False)
-    status = Column(String(20), nullable=False, default='Disponível')
-    
-    # Relacionamentos
-    sala = relationship("Sala", back_populates="disponibilidades_sala")
-
-class Terminologia(Base):
-    """Modelo para terminologias"""
-    __tablename__ = 'terminologias'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    descricao = Column(String(200), nullable=False)
-    cod_faturamento = Column(String(50), nullable=False)
-    tipo = Column(String(50), nullable=False)
-    pagamento_id = Column(Integer, ForeignKey('pagamentos.id'), nullable=True)
-    area_atuacao_id = Column(Integer, ForeignKey('areas_atuacao.id'), nullable=True)
-    ativo = Column(Boolean, default=True)
-    
-    # Relacionamentos
-    profissionais = relationship("Profissional", back_populates="terminologia")
-    pagamento = relationship("Pagamento", back_populates="terminologias")
-    area_atuacao = relationship("AreaAtuacao", back_populates="terminologias")
-
-class Profissional(Base):
-    """Modelo para profissionais"""
-    __tablename__ = 'profissionais'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    nome = Column(String(100), nullable=False, unique=True)
-    cod_faturamento = Column(String(50), nullable=True)
-    terminologia_id = Column(Integer, ForeignKey('terminologias.id'), nullable=True)
-    sala_id = Column(Integer, ForeignKey('salas.id'), nullable=True)
-    nome_conselho = Column(String(100), nullable=True)
-    registro = Column(String(50), nullable=True)
-    uf = Column(String(2), nullable=True)
-    cbo = Column(String(10), nullable=True)
-    ativo = Column(Boolean, default=True)
-    
-    # Relacionamentos
-    terminologia = relationship("Terminologia", back_populates="profissionais")
-    sala = relationship("Sala", back_populates="profissionais")
-    disponibilidades = relationship("Disponibilidade", back_populates="profissional", cascade="all, delete-orphan")
-    
-    # Relacionamentos com as tabelas de junção
-    areas_atuacao = relationship("AreaAtuacao", secondary=profissional_area_atuacao, back_populates="profissionais")
-    pagamentos = relationship("Pagamento", secondary=profissional_pagamento, back_populates="profissionais")
-    perfis_paciente = relationship("PerfilPaciente", secondary=profissional_perfil_paciente, back_populates="profissionais")
-
-class AgendaFixa(Base):
-    """Modelo para agenda fixa"""
-    __tablename__ = 'agenda_fixa'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    data = Column(Date, nullable=False)
-    dia_semana = Column(String(20), nullable=False)
-    horario = Column(String(5), nullable=False)
-    unidade = Column(String(100), nullable=False)
-    sala = Column(String(50), nullable=True)
-    profissional = Column(String(100), nullable=False)
-    tipo_atend = Column(String(100), nullable=False)
-    cod_faturamento = Column(String(50), nullable=True)
-    qtd_sess = Column(Integer, nullable=True)
-    pagamento = Column(String(50), nullable=True)
-    paciente = Column(String(100), nullable=True)
-    created_at = Column(Date, nullable=True, default=datetime.now().date())
-    updated_at = Column(Date, nullable=True, default=datetime.now().date())
-
-class Agendamento(Base):
-    """Modelo para agendamentos"""
-    __tablename__ = 'agendamentos'
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    data_hora = Column(DateTime, nullable=False)
-    status = Column(String(20), nullable=False)
-    profissional_id = Column(Integer, ForeignKey('profissionais.id'), nullable=False)
-    sala_id = Column(Integer, ForeignKey('salas.id'), nullable=False)
-    paciente = Column(String(100), nullable=True)
-    created_at = Column(DateTime, nullable=True, default=datetime.now())
-    updated_at = Column(DateTime, nullable=True, default=datetime.now())
-
-class Paciente(Base):
-    """Modelo para pacientes"""
-    __tablename__ = 'pacientes'
-    __table_args__ = {'extend_existing': True}
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    id_paciente_carteira = Column(Integer, nullable=False, unique=True)  # ID externo único
-    nome = Column(String(100), nullable=False)
-    created_at = Column(DateTime, nullable=True, default=datetime.now())
-    updated_at = Column(DateTime, nullable=True, default=datetime.now())
-    
-    # Relacionamentos
-    carteiras = relationship("Carteira", back_populates="paciente", cascade="all, delete-orphan")
-
-class Carteira(Base):
-    """Modelo para carteiras dos pacientes"""
-    __tablename__ = 'carteiras'
-    __table_args__ = {'extend_existing': True}  # Permite recriar a tabela se necessário
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    numero_carteira = Column(String(50), nullable=False)
-    id_pagamento = Column(Integer, ForeignKey('pagamentos.id'), nullable=False)
-    status = Column(String(20), nullable=False, default='Ativo')
-    paciente_id = Column(Integer, ForeignKey('pacientes.id'), nullable=False)
-    created_at = Column(DateTime, nullable=True, default=datetime.now())
-    updated_at = Column(DateTime, nullable=True, default=datetime.now())
-    
-    # Relacionamentos
-    paciente = relationship("Paciente", back_populates="carteiras")
-    pagamento = relationship("Pagamento")
-
 # Estilos CSS personalizados
 st.markdown("""
 <style>
@@ -530,7 +283,7 @@ h1, h2, h3 {
 """, unsafe_allow_html=True)
 
 # =====================================================
-# 1. MODELOS DE DADOS
+# 1. MODELOS DE DADOS (models.py)
 # =====================================================
 
 # =====================================================
@@ -624,31 +377,141 @@ def carregar_dados_iniciais(session):
     """Carrega dados iniciais no banco de dados"""
     try:
         # Verificar e carregar dados das tabelas existentes
-        carregar_dados_iniciais_extras(session)
-        
-        # Verificar se as tabelas existem e recriar se necessário
-        inspector = inspect(session.get_bind())
-        
-        # Recriar tabela de pacientes se necessário
-        if 'pacientes' not in inspector.get_table_names():
-            Base.metadata.tables['pacientes'].create(session.get_bind())
-            logging.info("Tabela de pacientes criada")
-            
-        # Recriar tabela de carteiras se necessário
-        if 'carteiras' in inspector.get_table_names():
-            # Dropar tabela existente para recriar com a estrutura correta
-            Base.metadata.tables['carteiras'].drop(session.get_bind())
-            logging.info("Tabela de carteiras antiga removida")
-            
-        Base.metadata.tables['carteiras'].create(session.get_bind())
-        logging.info("Tabela de carteiras recriada com a estrutura correta")
-        
-        return True
+        return carregar_dados_iniciais_extras(session)
         
     except Exception as e:
         logging.error(f"Erro ao carregar dados iniciais: {str(e)}")
         return False
 
+# =====================================================
+# 2.1 VERSÃO DO ESQUEMA E MIGRAÇÕES
+# =====================================================
+
+# As migrações usam sempre session.connection(): DDL, DML e o registro da versão ficam na
+# mesma conexão e transação, e o aplicar_migracoes faz um único commit por versão. Outra
+# conexão do pool esperaria pelo lock de escrita da primeira (SQLite "database is locked",
+# PostgreSQL bloqueado até o fim da transação).
+
+def _criar_indice(session, nome, tabela, colunas, unico=False):
+    """Cria um índice nomeado explicitamente, se ainda não existir, na conexão da sessão.
+    
+    O índice é descrito na própria migração (e não lido dos modelos) para que mudanças
+    posteriores nos modelos nunca alterem o que uma versão publicada cria.
+    """
+    session.execute(text(
+        f"CREATE {'UNIQUE ' if unico else ''}INDEX IF NOT EXISTS {nome} ON {tabela} ({', '.join(colunas)})"
+    ))
+
+def _migracao_inicial(session):
+    """Cria as tabelas ausentes e carrega os dados iniciais"""
+    Base.metadata.create_all(session.connection())
+    if not carregar_dados_iniciais(session):
+        raise RuntimeError("Falha ao carregar dados iniciais")
+
+def _migracao_agenda_diaria(session):
+    """Cria o índice de AgendaFixa.data e preenche a agregação diária da agenda"""
+    _criar_indice(session, 'ix_agenda_fixa_data', 'agenda_fixa', ['data'])
+    if not session.query(AgendaDiaria.id).first():
+        atualizar_agenda_diaria(session)
+
+def _migracao_chave_carteiras(session):
+    """Remove carteiras duplicadas e cria o índice único usado pelo upsert de pacientes"""
+    session.execute(text("""
+        DELETE FROM carteiras
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM carteiras
+            GROUP BY paciente_id, numero_carteira, id_pagamento
+        )
+    """))
+    _criar_indice(
+        session, 'uq_carteiras_paciente_numero_pagamento', 'carteiras',
+        ['paciente_id', 'numero_carteira', 'id_pagamento'], unico=True
+    )
+
+def _migracao_indice_nome_pacientes(session):
+    """Cria o índice por nome usado na ordenação e na busca da lista de pacientes"""
+    _criar_indice(session, 'ix_pacientes_nome', 'pacientes', ['nome'])
+
+def _adicionar_colunas_ausentes(session, tabela):
+    """Adiciona ao banco as colunas do modelo que ainda não existem na tabela (ALTER TABLE ADD COLUMN)"""
+    conexao = session.connection()
+    existentes = {coluna['name'] for coluna in inspect(conexao).get_columns(tabela.name)}
+    for coluna in tabela.columns:
+        if coluna.name not in existentes:
+            tipo = coluna.type.compile(dialect=conexao.dialect)
+            session.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'))
+            logging.info(f"Coluna {tabela.name}.{coluna.name} adicionada")
+
+def _migracao_componentes_carteira(session):
+    """Cria e indexa as colunas dos componentes da carteira e preenche as carteiras existentes"""
+    _adicionar_colunas_ausentes(session, Carteira.__table__)
+    _criar_indice(session, 'ix_carteiras_numero_carteira', 'carteiras', ['numero_carteira'])
+    _criar_indice(session, 'ix_carteiras_operadora', 'carteiras', ['operadora'])
+    _criar_indice(session, 'ix_carteiras_base', 'carteiras', ['base'])
+    
+    carteiras = pd.DataFrame(
+        session.query(Carteira.id, Carteira.numero_carteira).all(),
+        columns=['id', 'numero_carteira']
+    )
+    if carteiras.empty:
+        return
+    componentes = decompor_carteiras(carteiras['numero_carteira'])
+    componentes['id'] = carteiras['id'].astype(int)
+    # UPDATE em lote pela chave primária
+    session.execute(update(Carteira), componentes.to_dict('records'))
+
+def _migracao_chaves_agenda_fixa(session):
+    """Cria e indexa as chaves estrangeiras da agenda fixa e preenche as linhas existentes pelos nomes"""
+    _adicionar_colunas_ausentes(session, AgendaFixa.__table__)
+    for coluna in ('unidade_id', 'sala_id', 'profissional_id', 'pagamento_id', 'paciente_id'):
+        _criar_indice(session, f'ix_agenda_fixa_{coluna}', 'agenda_fixa', [coluna])
+    vincular_agenda_fixa(session, somente_pendentes=False)
+
+# Migrações em ordem de versão: (versão, descrição, função). Nunca altere uma versão já publicada;
+# novas mudanças de esquema entram como uma nova versão no fim da lista.
+MIGRACOES = [
+    (1, "Criação das tabelas e dados iniciais", _migracao_inicial),
+    (2, "Índice de AgendaFixa.data e agenda diária", _migracao_agenda_diaria),
+    (3, "Índice único das carteiras (paciente, número, pagamento)", _migracao_chave_carteiras),
+    (4, "Índice do nome dos pacientes", _migracao_indice_nome_pacientes),
+    (5, "Componentes indexados do número da carteira", _migracao_componentes_carteira),
+    (6, "Chaves estrangeiras da agenda fixa", _migracao_chaves_agenda_fixa),
+]
+
+def versao_esquema_atual(session):
+    """Retorna a maior versão de esquema aplicada (0 para um banco sem versionamento)"""
+    return session.query(func.max(VersaoEsquema.versao)).scalar() or 0
+
+def aplicar_migracoes(session):
+    """Aplica, em ordem, as migrações posteriores à versão registrada no banco"""
+    VersaoEsquema.__table__.create(session.connection(), checkfirst=True)
+    session.commit()
+    versao = versao_esquema_atual(session)
+    
+    for numero, descricao, migracao in MIGRACOES:
+        if numero <= versao:
+            continue
+        logging.info(f"Aplicando migração {numero}: {descricao}")
+        try:
+            migracao(session)
+            session.add(VersaoEsquema(versao=numero, descricao=descricao))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+    return versao_esquema_atual(session)
+
+@st.cache_resource
+def inicializar_banco():
+    """Aplica as migrações pendentes uma vez por processo; os reruns reutilizam o resultado.
+    
+    Em caso de erro nada é guardado em cache e a próxima execução tenta novamente.
+    """
+    with sessao_banco() as session:
+        versao = aplicar_migracoes(session)
+        logging.info(f"Banco de dados na versão de esquema {versao}")
+        return True
+
 def verificar_tabela_unidades(session):
     """Verifica e recria a tabela unidades se necessário"""
     try:
@@ -787,48 +650,10 @@ def verificar_tabela_disponibilidade(session):
         st.error(f"❌ Erro ao verificar tabela de disponibilidade: {str(e)}")
         logging.error(f"Erro ao verificar tabela de disponibilidade: {str(e)}")
 
-# Inicializar banco de dados
-if not verificar_integridade_banco():
-    st.error("❌ Falha ao verificar/criar banco de dados")
-    st.stop()
-
 # =====================================================
 # 3. FUNÇÕES DE PROCESSAMENTO
 # =====================================================
 
-def remover_acentos(texto: str) -> str:
-    """Remove acentos de um texto"""
-    if not isinstance(texto, str):
-        return ''
-    nfkd = unicodedata.normalize('NFKD', texto)
-    return u"".join([c for c in nfkd if not unicodedata.combining(c)])
-
-def normalizar_texto(texto):
-    """Normaliza um texto removendo acentos, caracteres especiais e espaços extras"""
-    try:
-        if pd.isna(texto) or texto is None:
-            return ""
-        
-        # Converter para string
-        texto = str(texto)
-        
-        # Remover caracteres especiais e acentos
-        texto = unidecode(texto)
-        
-        # Converter para minúsculo
-        texto = texto.lower()
-        
-        # Remover caracteres especiais mantendo letras, números e espaços
-        texto = re.sub(r'[^a-z0-9\s]', '', texto)
-        
-        # Remover espaços extras
-        texto = ' '.join(texto.split())
-        
-        return texto
-    except Exception as e:
-        logging.error(f"Erro ao normalizar texto '{texto}': {str(e)}")
-        return texto
-
 def criar_ou_obter_unidade(session, nome_unidade):
     """Cria ou obtém uma unidade, tratando caracteres especiais"""
     try:
@@ -1164,6 +989,8 @@ def processar_agenda_fixa(df):
             logging.info("Limpando dados existentes")
             session.query(AgendaFixa).delete()
             session.query(Disponibilidade).delete()
+            atualizar_agenda_diaria(session)
+            registrar_alteracao_ocupacao(session)
             session.commit()
 
             # 2. Primeiro, criar ou atualizar todos os profissionais e gerar suas grades
@@ -1199,6 +1026,9 @@ def processar_agenda_fixa(df):
                 
             session.commit()
             
+            # Cadastros em memória para resolver as chaves da agenda sem consultar o banco a cada linha
+            mapas = MapasAgenda(session)
+            
             # 3. Processar cada linha do arquivo para criar agendamentos
             registros_processados = 0
             registros_ignorados = 0
@@ -1212,7 +1042,7 @@ def processar_agenda_fixa(df):
                     # Obter e converter ID do profissional para inteiro
                     profissional_id = int(float(row['Id Profissional']))
                     
-                    # Converter data
+                    # Converter data (textos do CSV já chegam convertidos com o dia primeiro)
                     data = pd.to_datetime(row['Data']).date()
                     dia_semana = obter_dia_semana(data)
                     if not dia_semana:
@@ -1248,15 +1078,29 @@ def processar_agenda_fixa(df):
                             nome_unidade = "República do Líbano"
                             logging.info(f"Nome da unidade corrigido para: {nome_unidade}")
                     
-                    # Criar ou obter unidade
-                    unidade = criar_ou_obter_unidade(session, nome_unidade)
-                    if not unidade:
-                        erros.append(f"Erro ao criar/obter unidade na linha {idx+2}: {nome_unidade}")
-                        registros_ignorados += 1
-                        continue
+                    # Obter a unidade pelo mapa ou, se ausente, criar/obter no banco
+                    unidade_id = mapas.unidades.get(normalizar_texto(nome_unidade))
+                    if not unidade_id:
+                        unidade = criar_ou_obter_unidade(session, nome_unidade)
+                        if not unidade:
+                            erros.append(f"Erro ao criar/obter unidade na linha {idx+2}: {nome_unidade}")
+                            registros_ignorados += 1
+                            continue
+                        unidade_id = unidade.id
+                        mapas.adicionar_unidade(nome_unidade, unidade_id)
+                    
+                    # Chaves estrangeiras resolvidas pelos nomes da linha
+                    chaves = mapas.resolver(
+                        unidade=nome_unidade,
+                        sala=row['Sala'] if 'Sala' in row else None,
+                        pagamento=row['Pagamento'] if 'Pagamento' in row else None,
+                        paciente=row['Paciente'] if 'Paciente' in row else None
+                    )
+                    chaves.update(unidade_id=unidade_id, profissional_id=profissional_id)
                     
                     # Criar registro na agenda fixa
                     agenda = AgendaFixa(
+                        **chaves,
                         data=data,
                         dia_semana=dia_semana,
                         horario=hora_inicial,
@@ -1277,8 +1121,8 @@ def processar_agenda_fixa(df):
                     # Salvar a unidade para este profissional, dia e período
                     chave = (profissional_id, dia_grade, periodo)
                     if chave not in unidades_por_profissional:
-                        unidades_por_profissional[chave] = unidade.id
-                        logging.info(f"Primeira ocorrência: Prof {profissional_id}, {dia_grade}, {periodo} - Unidade {unidade.id}")
+                        unidades_por_profissional[chave] = unidade_id
+                        logging.info(f"Primeira ocorrência: Prof {profissional_id}, {dia_grade}, {periodo} - Unidade {unidade_id}")
                     
                     # Atualizar status na grade de disponibilidade
                     if row.get('Paciente'):
@@ -1292,7 +1136,7 @@ def processar_agenda_fixa(df):
                             if disponibilidade:
                                 logging.info(f"Atualizando status para Em atendimento: Prof {profissional_id}, {dia_grade}, {hora_inicial}")
                                 disponibilidade.status = 'Em atendimento'
-                                disponibilidade.unidade_id = unidade.id
+                                disponibilidade.unidade_id = unidade_id
                                 session.flush()
                             else:
                                 logging.warning(f"Disponibilidade não encontrada: Prof {profissional_id}, {dia_grade}, {hora_inicial}")
@@ -1328,7 +1172,10 @@ def processar_agenda_fixa(df):
                     erros.append(f"Erro ao atribuir unidade para profissional {prof_id}, dia {dia}, período {periodo}: {str(e)}")
             
             # Commit das alterações
+            atualizar_agenda_diaria(session)
+            registrar_alteracao_ocupacao(session)
             session.commit()
+            otimizar_apos_importacao(session, ['agenda_fixa', 'agenda_diaria', 'disponibilidade', 'contadores_ocupacao'])
                 
             # Retornar estatísticas
             return {
@@ -1425,6 +1272,7 @@ def processar_bloqueios(df: pd.DataFrame) -> bool:
                 registros_ignorados = 0
                 erros = []
                 profissionais_afetados = set()
+                profissionais_afetados_ids = set()
                 
                 # Processar cada linha
                 for idx, row in df_processado.iterrows():
@@ -1452,6 +1300,7 @@ def processar_bloqueios(df: pd.DataFrame) -> bool:
                             disponibilidade.status = 'Bloqueio'
                             registros_processados += 1
                             profissionais_afetados.add(profissional.nome)
+                            profissionais_afetados_ids.add(profissional.id)
                             logging.info(f"Bloqueio aplicado para profissional {profissional.nome} no dia {row['dia_semana']} às {row['horario']}")
                         else:
                             erros.append(f"Disponibilidade não encontrada para profissional {profissional.nome} no dia {row['dia_semana']} às {row['horario']}")
@@ -1463,7 +1312,9 @@ def processar_bloqueios(df: pd.DataFrame) -> bool:
                         continue
                 
                 # Commit das alterações
+                registrar_alteracao_ocupacao(session, profissional_ids=profissionais_afetados_ids)
                 session.commit()
+                otimizar_apos_importacao(session, ['disponibilidade', 'contadores_ocupacao'])
         
                 # Exibir resultados
                 st.success("✅ Arquivo processado com sucesso!")
@@ -1510,6 +1361,8 @@ def gerenciar_unidades():
             st.error("❌ Erro ao conectar ao banco de dados")
             return
         
+        exibir_importacao_cadastro(session, IMPORTACAO_UNIDADES, "upload_unidades", "Unidades")
+        
         # Listar unidades existentes
         unidades = session.query(Unidade).all()
         
@@ -1535,6 +1388,7 @@ def gerenciar_unidades():
                             unidade.nome = novo_nome
                             unidade.atende_sabado = atende_sabado == "Sim"
                             unidade.ativo = status == "Ativo"
+                            registrar_alteracao_ocupacao(session, profissional_ids=[])
                             session.commit()
                             st.success("✅ Unidade atualizada com sucesso!")
                         except Exception as e:
@@ -1762,6 +1616,7 @@ def gerar_grade_sala(session, sala_id):
                     )
                     session.add(disponibilidade)
         
+        registrar_alteracao_ocupacao(session, profissional_ids=[])
         session.commit()
         logging.info(f"Grade de disponibilidade gerada com sucesso para sala {sala_id}")
         return True
@@ -1833,37 +1688,37 @@ def salvar_arquivo_temporario(uploaded_file):
         st.error(f"❌ Erro ao salvar arquivo temporário: {str(e)}")
         return None
 
+# Colunas lidas do upload da agenda fixa ('Hora inicial' aparece com as duas grafias nas planilhas)
+COLUNAS_AGENDA_FIXA = [
+    "Id Profissional", "Data", "Hora inicial", "Hora Inicial", "Unidade", "Sala", "Profissional",
+    "Tipo Atend", "Codigo Faturamento", "Qtd Sess", "Pagamento", "Paciente"
+]
+TIPOS_AGENDA_FIXA = {
+    "Unidade": str, "Sala": str, "Profissional": str, "Tipo Atend": str,
+    "Codigo Faturamento": str, "Pagamento": str, "Paciente": str
+}
+
+def ler_upload(arquivo, colunas=None, tipos=None, datas=None):
+    """Lê o arquivo enviado (Excel, CSV ou Parquet) e informa o tempo de leitura"""
+    leitura = ler_planilha(arquivo, colunas=colunas, tipos=tipos, datas=datas)
+    st.caption(
+        f"⏱️ {getattr(arquivo, 'name', 'Arquivo')}: {len(leitura.dados)} linha(s) lidas em "
+        f"{leitura.segundos:.2f}s ({leitura.formato}, {leitura.motor})"
+    )
+    return leitura.dados
+
 def processar_arquivo_excel(arquivo):
     """
     Processa o arquivo Excel enviado
     """
     try:
-        # Salvar arquivo temporariamente
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-            tmp_file.write(arquivo.getvalue())
-            tmp_path = tmp_file.name
-
-        try:
-            # Tentar ler com diferentes encodings
-            df = pd.read_excel(tmp_path)
-            
-            # Normalizar nomes das colunas
-            df.columns = [normalizar_texto(col) for col in df.columns]
-            
-            # Remover linhas vazias
-            df = df.dropna(how='all')
-            
-            # Remover o arquivo temporário
-            os.unlink(tmp_path)
-            
-            return df
-
-        except Exception as e:
-            st.error(f"❌ Erro ao ler arquivo Excel: {str(e)}")
-            logging.error(f"Erro ao ler arquivo Excel: {str(e)}")
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-            return None
+        df = ler_upload(arquivo)
+        
+        # Normalizar nomes das colunas
+        df.columns = [normalizar_texto(col) for col in df.columns]
+        
+        # Remover linhas vazias
+        return df.dropna(how='all')
 
     except Exception as e:
         st.error(f"❌ Erro ao processar arquivo: {str(e)}")
@@ -1875,7 +1730,7 @@ def consultar_disponibilidade():
     try:
         st.title("🔍 Consulta de Disponibilidade")
         
-        session = get_session()
+        session = get_session(leitura=True)
         if not session:
             st.error("❌ Não foi possível conectar ao banco de dados")
             return
@@ -1895,17 +1750,17 @@ def consultar_disponibilidade():
             total_profissionais = len(profissionais)
             st.metric("Total de Profissionais", total_profissionais)
             
+        # Totais lidos dos contadores de ocupação
+        totais = obter_totais_ocupacao(session)
+        
         with col2:
-            total_disponiveis = session.query(Disponibilidade).filter_by(status="Disponível").count()
-            st.metric("Horários Disponíveis", total_disponiveis)
+            st.metric("Horários Disponíveis", totais.get("Disponível", 0))
             
         with col3:
-            total_bloqueios = session.query(Disponibilidade).filter_by(status="Bloqueio").count()
-            st.metric("Horários Bloqueados", total_bloqueios)
+            st.metric("Horários Bloqueados", totais.get("Bloqueio", 0))
             
         with col4:
-            total_atendimentos = session.query(Disponibilidade).filter_by(status="Em atendimento").count()
-            st.metric("Horários em Atendimento", total_atendimentos)
+            st.metric("Horários em Atendimento", totais.get("Em atendimento", 0))
         
         # Lista de status
         status_opcoes = ["Todos", "Disponível", "Em atendimento", "Bloqueio"]
@@ -2067,80 +1922,7 @@ def gerenciar_salas():
         for u in todas_unidades:
             st.write(f"- ID: {u.id}, Nome: {u.nome}, Ativo: {u.ativo}")
         
-        # Template para upload
-        colunas_template = ["id_unidade", "id_sala", "nome", "ativo"]
-        gerar_template_excel("template_salas.xlsx", colunas_template)
-        
-        # Upload de arquivo
-        uploaded_file = st.file_uploader(
-            "📤 Upload de Salas",
-            type=["xlsx"],
-            key="upload_salas"
-        )
-        
-        if uploaded_file:
-            try:
-                # Ler arquivo
-                df = pd.read_excel(uploaded_file)
-                
-                # Debug: Mostrar dados do arquivo
-                st.write("📄 Dados do arquivo de upload:")
-                st.write(df)
-                
-                # Verificar colunas
-                colunas_esperadas = ["id_unidade", "id_sala", "nome", "ativo"]
-                if not all(col in df.columns for col in colunas_esperadas):
-                    st.error("❌ O arquivo deve conter as colunas: id_unidade, id_sala, nome e ativo")
-                    st.write("Colunas encontradas:", df.columns.tolist())
-                    return
-                
-                # Debug: Mostrar IDs de unidades do arquivo
-                unidades_ids = df["id_unidade"].unique()
-                st.write("🔢 IDs de unidades no arquivo:", unidades_ids)
-                
-                # Converter IDs para inteiros
-                unidades_ids = [int(id) for id in unidades_ids]
-                
-                # Buscar unidades existentes
-                unidades_existentes = session.query(Unidade).filter(Unidade.id.in_(unidades_ids)).all()
-                unidades_existentes_ids = {u.id for u in unidades_existentes}
-                
-                # Debug: Mostrar IDs encontrados
-                st.write("🔍 IDs de unidades encontrados no banco:", unidades_existentes_ids)
-                
-                unidades_faltantes = set(unidades_ids) - unidades_existentes_ids
-                if unidades_faltantes:
-                    st.error(f"❌ As seguintes unidades não foram encontradas: {unidades_faltantes}")
-                    st.error("Por favor, cadastre as unidades primeiro antes de cadastrar as salas.")
-                    return
-                
-                # Limpa tabela existente
-                session.query(Sala).delete()
-                session.commit()
-                
-                # Processar dados
-                for _, row in df.iterrows():
-                    # Converte o valor de ativo para boolean
-                    ativo = str(row["ativo"]).upper() in ['ATIVO', 'A', 'TRUE', '1', 'T', 'Y', 'YES']
-                    
-                    # Garantir que id_unidade seja inteiro
-                    id_unidade = int(row["id_unidade"])
-                    
-                    sala = Sala(
-                        id=int(row["id_sala"]),
-                        nome=row["nome"],
-                        unidade_id=id_unidade,
-                        ativo=ativo
-                    )
-                    session.add(sala)
-                
-                session.commit()
-                st.success("✅ Salas atualizadas com sucesso!")
-                
-            except Exception as e:
-                session.rollback()
-                st.error(f"❌ Erro ao processar arquivo: {str(e)}")
-                logging.error(f"Erro ao processar arquivo de salas: {str(e)}\n{traceback.format_exc()}")
+        exibir_importacao_cadastro(session, IMPORTACAO_SALAS, "upload_salas", "Salas")
         
         # Lista de salas existentes
         st.subheader("📋 Salas Cadastradas")
@@ -2170,6 +1952,7 @@ def gerenciar_salas():
                         try:
                             sala.nome = novo_nome
                             sala.ativo = status == "Ativo"
+                            registrar_alteracao_ocupacao(session, profissional_ids=[])
                             session.commit()
                             st.success("✅ Sala atualizada com sucesso!")
                         except Exception as e:
@@ -2195,6 +1978,185 @@ def verificar_tabela_profissionais(session):
         logging.error(f"Erro ao verificar tabela de profissionais: {str(e)}")
         return False
 
+# Profissionais por página na lista de profissionais
+TAMANHO_PAGINA_PROFISSIONAIS = int(os.getenv('TAMANHO_PAGINA_PROFISSIONAIS', '50'))
+
+def _filtro_profissionais(consulta, filtro_nome='', filtro_status='Todos'):
+    """Aplica os filtros de nome e status da lista de profissionais"""
+    if filtro_nome and filtro_nome.strip():
+        consulta = consulta.where(Profissional.nome.ilike(f"%{filtro_nome.strip()}%"))
+    if filtro_status == "Ativos":
+        consulta = consulta.where(Profissional.ativo == True)
+    elif filtro_status == "Inativos":
+        consulta = consulta.where(Profissional.ativo == False)
+    return consulta
+
+def contar_profissionais(session, filtro_nome='', filtro_status='Todos'):
+    """Quantidade de profissionais que atendem aos filtros"""
+    return session.execute(
+        _filtro_profissionais(select(func.count(Profissional.id)), filtro_nome, filtro_status)
+    ).scalar() or 0
+
+def consultar_pagina_profissionais(session, filtro_nome='', filtro_status='Todos', pagina=1,
+                                   tamanho=TAMANHO_PAGINA_PROFISSIONAIS):
+    """Retorna um DataFrame com uma página de profissionais (sem as associações)"""
+    consulta = _filtro_profissionais(
+        select(
+            Profissional.id, Profissional.nome, Profissional.registro, Profissional.cbo,
+            Profissional.uf, Profissional.nome_conselho, Sala.nome, Profissional.ativo
+        ).outerjoin(Sala, Sala.id == Profissional.sala_id),
+        filtro_nome, filtro_status
+    ).order_by(Profissional.nome, Profissional.id).limit(tamanho).offset((pagina - 1) * tamanho)
+    return pd.DataFrame(
+        session.execute(consulta).all(),
+        columns=['id', 'nome', 'registro', 'cbo', 'uf', 'nome_conselho', 'sala', 'ativo']
+    )
+
+# Associações editáveis do profissional: (rótulo, modelo, tabela de junção, coluna do alvo)
+ASSOCIACOES_PROFISSIONAL = [
+    ("Áreas de Atuação", AreaAtuacao, profissional_area_atuacao, 'area_atuacao_id'),
+    ("Pagamentos", Pagamento, profissional_pagamento, 'pagamento_id'),
+    ("Perfis de Paciente", PerfilPaciente, profissional_perfil_paciente, 'perfil_paciente_id'),
+]
+
+def exibir_editor_profissional(session, profissional_id):
+    """Editor de um único profissional: associações carregadas apenas ao abri-lo"""
+    prof = session.get(Profissional, profissional_id)
+    if not prof:
+        st.warning("⚠️ Profissional não encontrado")
+        return
+    
+    with st.expander(f"{'✅' if prof.ativo else '❌'} {prof.nome}", expanded=True):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.write(f"**ID:** {prof.id}")
+            st.write(f"**Registro:** {prof.registro or 'Não informado'}")
+            st.write(f"**CBO:** {prof.cbo or 'Não informado'}")
+            st.write(f"**UF:** {prof.uf or 'Não informado'}")
+            st.write(f"**Conselho:** {prof.nome_conselho or 'Não informado'}")
+            st.write(f"**Sala:** {prof.sala.nome if prof.sala else 'Não atribuída'}")
+        
+        with col2:
+            selecionados = {}
+            for rotulo, modelo, tabela, coluna in ASSOCIACOES_PROFISSIONAL:
+                atuais = set(session.execute(
+                    select(tabela.c[coluna]).where(tabela.c.profissional_id == prof.id)
+                ).scalars())
+                # Opções ativas mais as já atribuídas (mesmo que inativas), como id -> nome
+                nomes = dict(session.execute(
+                    select(modelo.id, modelo.nome)
+                    .where((modelo.ativo == True) | modelo.id.in_(atuais))
+                    .order_by(modelo.nome)
+                ).tuples())
+                selecionados[coluna] = st.multiselect(
+                    rotulo,
+                    options=list(nomes),
+                    default=[id_ for id_ in nomes if id_ in atuais],
+                    format_func=nomes.get,
+                    key=f"{coluna}_{prof.id}"
+                )
+            
+            # Botão para salvar alterações nas atribuições
+            if st.button("💾 Salvar Atribuições", key=f"save_attr_{prof.id}"):
+                try:
+                    for _, _, tabela, coluna in ASSOCIACOES_PROFISSIONAL:
+                        sincronizar_associacao(
+                            session, tabela, 'profissional_id', coluna,
+                            {prof.id: set(selecionados[coluna])}
+                        )
+                    registrar_alteracao_ocupacao(session, profissional_ids=[])
+                    session.commit()
+                    st.success("✅ Atribuições atualizadas com sucesso!")
+                    st.rerun()
+                except Exception as e:
+                    session.rollback()
+                    st.error(f"❌ Erro ao salvar atribuições: {str(e)}")
+        
+        # Botões de ação
+        col_btn1, col_btn2, col_btn3 = st.columns(3)
+        
+        with col_btn1:
+            if st.button("📅 Editar Grade", key=f"grade_{prof.id}"):
+                editar_grade_profissional(prof.id)
+        
+        with col_btn2:
+            if st.button("✏️ Editar", key=f"edit_{prof.id}"):
+                st.session_state.editando_profissional = prof.id
+        
+        with col_btn3:
+            if st.button("❌ Desativar" if prof.ativo else "✅ Ativar", key=f"toggle_{prof.id}"):
+                prof.ativo = not prof.ativo
+                session.commit()
+                st.rerun()
+
+def exibir_lista_profissionais(session):
+    """Lista paginada e filtrável de profissionais, com o editor aberto sob demanda"""
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        filtro_nome = st.text_input("🔍 Filtrar por nome", key="filtro_nome_profissionais")
+    with col2:
+        filtro_status = st.selectbox(
+            "📊 Status",
+            ["Todos", "Ativos", "Inativos"],
+            index=0,
+            key="filtro_status_profissionais"
+        )
+    
+    # Volta para a primeira página quando os filtros mudam
+    filtros = (filtro_nome, filtro_status)
+    if st.session_state.get('filtros_profissionais_anteriores') != filtros:
+        st.session_state['filtros_profissionais_anteriores'] = filtros
+        st.session_state['pagina_profissionais'] = 1
+    
+    total = contar_profissionais(session, filtro_nome, filtro_status)
+    if total == 0:
+        st.info("ℹ️ Nenhum profissional encontrado")
+        return
+    
+    total_paginas = (total + TAMANHO_PAGINA_PROFISSIONAIS - 1) // TAMANHO_PAGINA_PROFISSIONAIS
+    if st.session_state.get('pagina_profissionais', 1) > total_paginas:
+        st.session_state['pagina_profissionais'] = total_paginas
+    with col3:
+        pagina = st.number_input(
+            f"Página (de {total_paginas})",
+            min_value=1,
+            max_value=total_paginas,
+            step=1,
+            key="pagina_profissionais"
+        )
+    
+    df = consultar_pagina_profissionais(session, filtro_nome, filtro_status, int(pagina))
+    st.caption(f"{total} profissional(is) encontrado(s)")
+    st.dataframe(
+        df.assign(ativo=df['ativo'].map({True: '✅', False: '❌'}))[
+            ['ativo', 'id', 'nome', 'registro', 'cbo', 'uf', 'nome_conselho', 'sala']
+        ],
+        column_config={
+            'ativo': st.column_config.TextColumn("Ativo"),
+            'id': st.column_config.NumberColumn("ID", format="%d"),
+            'nome': st.column_config.TextColumn("Nome"),
+            'registro': st.column_config.TextColumn("Registro"),
+            'cbo': st.column_config.TextColumn("CBO"),
+            'uf': st.column_config.TextColumn("UF"),
+            'nome_conselho': st.column_config.TextColumn("Conselho"),
+            'sala': st.column_config.TextColumn("Sala")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    # Editor sob demanda: só o profissional escolhido carrega suas associações
+    nomes = dict(zip(df['id'], df['nome']))
+    profissional_id = st.selectbox(
+        "Editar profissional",
+        [None] + list(nomes),
+        format_func=lambda pid: "Selecione..." if pid is None else f"{nomes[pid]} (ID: {pid})",
+        key="editar_profissional_lista"
+    )
+    if profissional_id is not None:
+        exibir_editor_profissional(session, int(profissional_id))
+
 def gerenciar_profissionais():
     """Interface para gerenciamento de profissionais"""
     try:
@@ -2214,6 +2176,7 @@ def gerenciar_profissionais():
         if st.button("🗑️ Apagar Todos os Profissionais", type="primary"):
             try:
                 session.query(Profissional).delete()
+                registrar_alteracao_ocupacao(session)
                 session.commit()
                 st.success("✅ Todos os profissionais foram apagados com sucesso!")
                 st.rerun()
@@ -2237,7 +2200,7 @@ def gerenciar_profissionais():
         st.subheader("📤 Upload de Arquivo")
         uploaded_file = st.file_uploader(
             "Selecione o arquivo Excel com os profissionais",
-            type=["xlsx", "xls"],
+            type=FORMATOS_UPLOAD,
             help="O arquivo deve conter as colunas: Id Profissional, Nome Profissional, NomeConselho, Registro, UF, CBO, Status, Id Area, Id Pagamento, Perfil Paciente"
         )
         
@@ -2247,7 +2210,7 @@ def gerenciar_profissionais():
                 session.autoflush = False
                 
                 # Processa o arquivo
-                df = pd.read_excel(uploaded_file)
+                df = ler_upload(uploaded_file, colunas=colunas)
                 
                 # Verifica se todas as colunas necessárias estão presentes
                 colunas_faltantes = [col for col in colunas if col not in df.columns]
@@ -2261,7 +2224,7 @@ def gerenciar_profissionais():
                 st.success("✅ Profissionais processados com sucesso!")
                 
                 # Exibe estatísticas
-                st.write(f"📊 Registros processados: {resultado['processados']}")
+                st.write(f"📊 Profissionais processados: {resultado['processados']}")
                 if resultado['ignorados'] > 0:
                     st.warning(f"⚠️ Registros ignorados: {resultado['ignorados']}")
                 
@@ -2278,115 +2241,8 @@ def gerenciar_profissionais():
         
         # Lista de profissionais
         st.subheader("📋 Lista de Profissionais")
+        exibir_lista_profissionais(session)
         
-        # Filtros
-        col1, col2 = st.columns(2)
-        with col1:
-            filtro_nome = st.text_input("🔍 Filtrar por nome")
-        with col2:
-            filtro_status = st.selectbox(
-                "📊 Status",
-                ["Todos", "Ativos", "Inativos"],
-                index=0
-            )
-        
-        # Consulta profissionais
-        query = session.query(Profissional)
-        if filtro_nome:
-            query = query.filter(Profissional.nome.ilike(f"%{filtro_nome}%"))
-        if filtro_status == "Ativos":
-            query = query.filter(Profissional.ativo == True)
-        elif filtro_status == "Inativos":
-            query = query.filter(Profissional.ativo == False)
-        
-        profissionais = query.all()
-        
-        if not profissionais:
-            st.info("ℹ️ Nenhum profissional encontrado")
-            return
-        
-        # Carrega todas as áreas, pagamentos e perfis ativos
-        areas = session.query(AreaAtuacao).filter_by(ativo=True).all()
-        pagamentos = session.query(Pagamento).filter_by(ativo=True).all()
-        perfis = session.query(PerfilPaciente).filter_by(ativo=True).all()
-        
-        # Exibe a lista de profissionais
-        for prof in profissionais:
-            with st.expander(f"{'✅' if prof.ativo else '❌'} {prof.nome}"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.write(f"**ID:** {prof.id}")
-                    st.write(f"**Registro:** {prof.registro or 'Não informado'}")
-                    st.write(f"**CBO:** {prof.cbo or 'Não informado'}")
-                    st.write(f"**UF:** {prof.uf or 'Não informado'}")
-                    st.write(f"**Conselho:** {prof.nome_conselho or 'Não informado'}")
-                    st.write(f"**Sala:** {prof.sala.nome if prof.sala else 'Não atribuída'}")
-                
-                with col2:
-                    # Seleção múltipla de áreas
-                    areas_selecionadas = st.multiselect(
-                        "Áreas de Atuação",
-                        options=[(a.id, a.nome) for a in areas],
-                        default=[(a.id, a.nome) for a in prof.areas_atuacao],
-                        format_func=lambda x: x[1],
-                        key=f"areas_{prof.id}"
-                    )
-                    
-                    # Seleção múltipla de pagamentos
-                    pagamentos_selecionados = st.multiselect(
-                        "Pagamentos",
-                        options=[(p.id, p.nome) for p in pagamentos],
-                        default=[(p.id, p.nome) for p in prof.pagamentos],
-                        format_func=lambda x: x[1],
-                        key=f"pagamentos_{prof.id}"
-                    )
-                    
-                    # Seleção múltipla de perfis
-                    perfis_selecionados = st.multiselect(
-                        "Perfis de Paciente",
-                        options=[(p.id, p.nome) for p in perfis],
-                        default=[(p.id, p.nome) for p in prof.perfis_paciente],
-                        format_func=lambda x: x[1],
-                        key=f"perfis_{prof.id}"
-                    )
-                    
-                    # Botão para salvar alterações nas atribuições
-                    if st.button("💾 Salvar Atribuições", key=f"save_attr_{prof.id}"):
-                        try:
-                            # Atualiza áreas
-                            prof.areas_atuacao = [a for a in areas if (a.id, a.nome) in areas_selecionadas]
-                            
-                            # Atualiza pagamentos
-                            prof.pagamentos = [p for p in pagamentos if (p.id, p.nome) in pagamentos_selecionados]
-                            
-                            # Atualiza perfis
-                            prof.perfis_paciente = [p for p in perfis if (p.id, p.nome) in perfis_selecionados]
-                            
-                            session.commit()
-                            st.success("✅ Atribuições atualizadas com sucesso!")
-                            st.rerun()
-                        except Exception as e:
-                            session.rollback()
-                            st.error(f"❌ Erro ao salvar atribuições: {str(e)}")
-                
-                # Botões de ação
-                col_btn1, col_btn2, col_btn3 = st.columns(3)
-                
-                with col_btn1:
-                    if st.button("📅 Editar Grade", key=f"grade_{prof.id}"):
-                        editar_grade_profissional(prof.id)
-                
-                with col_btn2:
-                    if st.button("✏️ Editar", key=f"edit_{prof.id}"):
-                        st.session_state.editando_profissional = prof.id
-                
-                with col_btn3:
-                    if st.button("❌ Desativar" if prof.ativo else "✅ Ativar", key=f"toggle_{prof.id}"):
-                        prof.ativo = not prof.ativo
-                        session.commit()
-                        st.rerun()
-                    
     except Exception as e:
         st.error(f"❌ Erro ao gerenciar profissionais: {str(e)}")
         logging.error(f"Erro ao gerenciar profissionais: {str(e)}")
@@ -2404,32 +2260,7 @@ def gerenciar_areas_atuacao():
 
         st.subheader("🏥 Gestão de Áreas de Atuação")
         
-        # Template para upload
-        colunas_template = ["id", "nome", "ativo"]
-        with st.expander("📥 Template para Upload", expanded=False):
-            gerar_template_excel("template_areas_atuacao.xlsx", colunas_template)
-        
-        # Upload de arquivo
-        uploaded_file = st.file_uploader("Escolha um arquivo Excel", type=["xlsx"], key="upload_areas")
-        if uploaded_file:
-            # Limpa a tabela antes do upload
-            session.query(AreaAtuacao).delete()
-            session.commit()
-            
-            df = pd.read_excel(uploaded_file)
-            for _, row in df.iterrows():
-                # Converte o valor de ativo para boolean
-                ativo = True if str(row.get("ativo", "True")).lower() in ['true', '1', 't', 'y', 'yes', 'ativo', 'sim'] else False
-                
-                area = AreaAtuacao(
-                    id=row["id"],
-                    nome=row["nome"],
-                    ativo=ativo
-                )
-                session.add(area)
-            session.commit()
-            st.success("✅ Áreas de atuação importadas com sucesso!")
-            st.rerun()
+        exibir_importacao_cadastro(session, IMPORTACAO_AREAS, "upload_areas", "Áreas de atuação")
         
         # Lista de áreas existentes
         areas = session.query(AreaAtuacao).order_by(AreaAtuacao.id).all()
@@ -2445,6 +2276,7 @@ def gerenciar_areas_atuacao():
                     if st.button("Salvar Alterações", key=f"save_{area.id}"):
                         area.nome = novo_nome
                         area.ativo = novo_status
+                        registrar_alteracao_ocupacao(session, profissional_ids=[])
                         session.commit()
                         st.success("✅ Alterações salvas com sucesso!")
                         st.rerun()
@@ -2467,32 +2299,7 @@ def gerenciar_pagamentos():
 
         st.subheader("💰 Gestão de Tipos de Pagamento")
         
-        # Template para upload
-        colunas_template = ["id", "nome", "ativo"]
-        with st.expander("📥 Template para Upload", expanded=False):
-            gerar_template_excel("template_pagamentos.xlsx", colunas_template)
-        
-        # Upload de arquivo
-        uploaded_file = st.file_uploader("Escolha um arquivo Excel", type=["xlsx"], key="upload_pagamentos")
-        if uploaded_file:
-            # Limpa a tabela antes do upload
-            session.query(Pagamento).delete()
-            session.commit()
-            
-            df = pd.read_excel(uploaded_file)
-            for _, row in df.iterrows():
-                # Converte o valor de ativo para boolean
-                ativo = True if str(row.get("ativo", "True")).lower() in ['true', '1', 't', 'y', 'yes', 'ativo', 'sim'] else False
-                
-                pagamento = Pagamento(
-                    id=row["id"],
-                    nome=row["nome"],
-                    ativo=ativo
-                )
-                session.add(pagamento)
-            session.commit()
-            st.success("✅ Tipos de pagamento importados com sucesso!")
-            st.rerun()
+        exibir_importacao_cadastro(session, IMPORTACAO_PAGAMENTOS, "upload_pagamentos", "Tipos de pagamento")
         
         # Lista de pagamentos existentes
         pagamentos = session.query(Pagamento).order_by(Pagamento.id).all()
@@ -2536,60 +2343,62 @@ def gerar_template_excel(nome_arquivo: str, colunas: list):
         logging.error(f"Erro ao gerar template: {str(e)}\n{traceback.format_exc()}")
         return False
 
+def exibir_importacao_cadastro(session, especificacao, chave, rotulo):
+    """Upload de um cadastro de referência pelo framework de importação, com o relatório das linhas rejeitadas"""
+    with st.expander("📥 Template para Upload", expanded=False):
+        gerar_template_excel(especificacao.template, colunas_template(especificacao))
+        st.caption(f"Colunas: {', '.join(colunas_template(especificacao))}")
+    
+    uploaded_file = st.file_uploader(f"📤 Upload de {rotulo}", type=FORMATOS_UPLOAD, key=chave)
+    if not uploaded_file or not st.button("📥 Importar", key=f"{chave}_importar"):
+        return
+    
+    try:
+        df = ler_upload(uploaded_file, colunas=colunas_template(especificacao))
+        resultado = importar_tabela(session, especificacao, df)
+        # Sem inclusões ou alterações nada é gravado nem invalidado (cubos e contadores continuam válidos)
+        if resultado.inseridos or resultado.atualizados:
+            registrar_alteracao_ocupacao(session, profissional_ids=[])
+            session.commit()
+        else:
+            session.rollback()
+    except ValueError as e:
+        session.rollback()
+        st.error(f"❌ {str(e)}")
+        return
+    except Exception as e:
+        session.rollback()
+        st.error(f"❌ Erro ao processar arquivo: {str(e)}")
+        logging.error(f"Erro ao importar {rotulo}: {str(e)}\n{traceback.format_exc()}")
+        return
+    
+    if resultado.identico:
+        st.info(f"ℹ️ Conteúdo idêntico ao cadastrado (impressão {resultado.impressao[:12]}): nada foi alterado")
+    else:
+        st.success(f"✅ {rotulo} importados com sucesso!")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Incluídos", resultado.inseridos)
+    col2.metric("Alterados", resultado.atualizados)
+    col3.metric("Inalterados", resultado.inalterados)
+    col4.metric("Rejeitados", len(resultado.rejeitados))
+    if not resultado.rejeitados.empty:
+        with st.expander("⚠️ Linhas rejeitadas", expanded=True):
+            st.dataframe(resultado.rejeitados, hide_index=True, use_container_width=True)
+            st.download_button(
+                "📥 Baixar relatório",
+                resultado.rejeitados.to_csv(index=False).encode('utf-8'),
+                file_name=f"rejeitados_{chave}.csv",
+                mime="text/csv",
+                key=f"{chave}_rejeitados"
+            )
+
 def gerenciar_perfis_paciente():
     """Gerenciamento de perfis de paciente"""
     st.subheader("👥 Gestão de Perfis de Paciente")
     
     session = get_session()
     try:
-        # Template para upload
-        colunas_template = ["Id", "Nome", "Descrição", "Status"]
-        gerar_template_excel("template_perfis_paciente.xlsx", colunas_template)
-        
-        # Upload de arquivo
-        uploaded_file = st.file_uploader(
-            "📤 Upload de Perfis de Paciente",
-            type=["xlsx"],
-            key="upload_perfis"
-        )
-        
-        if uploaded_file:
-            try:
-                # Ler arquivo
-                df = pd.read_excel(uploaded_file)
-                
-                # Verificar colunas
-                colunas_esperadas = ["Id", "Nome", "Descrição", "Status"]
-                if not all(col in df.columns for col in colunas_esperadas):
-                    st.error("❌ O arquivo deve conter as colunas: Id, Nome, Descrição e Status")
-                    return
-                
-                # Processar dados
-                for _, row in df.iterrows():
-                    perfil_id = row["Id"]
-                    perfil = session.query(PerfilPaciente).get(perfil_id)
-                    
-                    if perfil:
-                        # Atualizar perfil existente
-                        perfil.nome = row["Nome"]
-                        perfil.descricao = row["Descrição"]
-                        perfil.ativo = row["Status"] == "Ativo"
-                    else:
-                        # Criar novo perfil
-                        perfil = PerfilPaciente(
-                            id=perfil_id,
-                            nome=row["Nome"],
-                            descricao=row["Descrição"],
-                            ativo=row["Status"] == "Ativo"
-                        )
-                        session.add(perfil)
-                
-                session.commit()
-                st.success("✅ Perfis de paciente atualizados com sucesso!")
-                
-            except Exception as e:
-                st.error(f"❌ Erro ao processar arquivo: {str(e)}")
-                logging.error(f"Erro ao processar arquivo de perfis: {str(e)}\n{traceback.format_exc()}")
+        exibir_importacao_cadastro(session, IMPORTACAO_PERFIS, "upload_perfis", "Perfis de paciente")
         
         # Lista de perfis existentes
         st.subheader("📋 Perfis Cadastrados")
@@ -2633,39 +2442,7 @@ def gerenciar_terminologias():
 
         st.subheader("📋 Gestão de Códigos de Faturamento")
         
-        # Template para upload
-        colunas_template = ["id_area", "id_pagamento", "id_codigo", "cod_faturamento", "descricao", "ativo"]
-        with st.expander("📥 Template para Upload", expanded=False):
-            gerar_template_excel("template_terminologias.xlsx", colunas_template)
-        
-        # Upload de arquivo
-        uploaded_file = st.file_uploader("Escolha um arquivo Excel", type=["xlsx"], key="upload_terminologias")
-        if uploaded_file:
-            # Limpa a tabela antes do upload
-            session.query(Terminologia).delete()
-            session.commit()
-            
-            df = pd.read_excel(uploaded_file)
-            for _, row in df.iterrows():
-                # Converte o valor de ativo para boolean
-                ativo = True if str(row.get("ativo", "True")).lower() in ['true', '1', 't', 'y', 'yes', 'ativo', 'sim'] else False
-                
-                # Garante que o código de faturamento seja tratado como texto
-                cod_faturamento = str(row["cod_faturamento"]).zfill(8)  # Preenche com zeros à esquerda até ter 8 dígitos
-                
-                terminologia = Terminologia(
-                    id=row["id_codigo"],
-                    cod_faturamento=cod_faturamento,
-                    descricao=row["descricao"],
-                    tipo="Padrão",
-                    area_atuacao_id=row["id_area"],
-                    pagamento_id=row["id_pagamento"],
-                    ativo=ativo
-                )
-                session.add(terminologia)
-            session.commit()
-            st.success("✅ Códigos de faturamento importados com sucesso!")
-            st.rerun()
+        exibir_importacao_cadastro(session, IMPORTACAO_TERMINOLOGIAS, "upload_terminologias", "Códigos de faturamento")
         
         # Lista de terminologias existentes
         terminologias = session.query(Terminologia).order_by(Terminologia.id).all()
@@ -2701,38 +2478,243 @@ def gerenciar_terminologias():
         if session:
             session.close()
 
-def dashboard_ocupacao():
-    """Dashboard de ocupação por unidade"""
-    try:
-        session = get_session()
-        if not session:
-            st.error("❌ Erro ao conectar ao banco de dados")
+# =====================================================
+# 5. CUBO DE OCUPAÇÃO (cubo e consultas em ocupacao.py)
+# =====================================================
+
+# Tempo de vida (segundos) do cache das consultas dos dashboards
+TTL_CACHE_DASHBOARD = int(os.getenv('TTL_CACHE_DASHBOARD_SEG', '300'))
+
+@st.cache_resource
+def _estado_ocupacao():
+    """Estado compartilhado entre sessões: geração dos dados, última reconciliação e último retrato diário"""
+    return {'geracao': 0, 'reconciliado_em': None, 'snapshot_em': None, 'trava_snapshot': threading.Lock()}
+
+def geracao_ocupacao():
+    """Retorna a geração atual dos dados de ocupação (muda a cada alteração confirmada)"""
+    return _estado_ocupacao()['geracao']
+
+@st.cache_resource(max_entries=1)
+def _carregar_cubos_ocupacao(geracao):
+    """Constrói os cubos de ocupação para uma geração dos dados"""
+    with sessao_leitura() as session:
+        logging.info(f"Construindo cubos de ocupação (geração {geracao})")
+        return {
+            'profissionais': construir_cubo_profissionais(session),
+            'salas': construir_cubo_salas(session)
+        }
+
+def obter_cubos_ocupacao():
+    """Retorna os cubos de ocupação da geração atual, construindo-os apenas após alterações"""
+    return _carregar_cubos_ocupacao(geracao_ocupacao())
+
+def registrar_alteracao_ocupacao(session, profissional_ids=None):
+    """Hook único dos fluxos de escrita da grade e dos cadastros ligados à ocupação.
+    
+    Atualiza os contadores dos profissionais informados na transação corrente
+    (todos quando None; nenhum com lista vazia, para alterações só de cadastro)
+    e marca a sessão para invalidar os cubos de ocupação após o commit.
+    """
+    atualizar_contadores_ocupacao(session, profissional_ids)
+    session.info['ocupacao_alterada'] = True
+
+def _invalidar_cubos_apos_commit(session):
+    """Avança a geração dos dados de ocupação após o commit de uma alteração registrada"""
+    if session.info.pop('ocupacao_alterada', False):
+        _estado_ocupacao()['geracao'] += 1
+
+@st.cache_resource
+def _registrar_eventos_sessao():
+    """Registra os eventos da fábrica de sessões uma única vez por processo (evita duplicá-los a cada rerun)"""
+    event.listen(Session, 'after_commit', _invalidar_cubos_apos_commit)
+    return True
+
+_registrar_eventos_sessao()
+
+# =====================================================
+# 6. CONTADORES DE OCUPAÇÃO
+# =====================================================
+
+def reconciliar_contadores_ocupacao(session, corrigir=True):
+    """Compara os contadores com a grade e corrige os profissionais divergentes.
+    
+    Retorna a lista de divergências como (unidade_id, profissional_id, status, contador, grade).
+    """
+    esperado = {
+        (unidade_id, profissional_id, status): quantidade
+        for unidade_id, profissional_id, status, quantidade in session.execute(consulta_contagem_grade())
+    }
+    atual = {
+        (c.unidade_id, c.profissional_id, c.status): c.quantidade
+        for c in session.query(ContadorOcupacao).all()
+    }
+    divergencias = [
+        (*chave, atual.get(chave, 0), esperado.get(chave, 0))
+        for chave in set(esperado) | set(atual)
+        if atual.get(chave, 0) != esperado.get(chave, 0)
+    ]
+    
+    if divergencias:
+        logging.warning(f"Contadores de ocupação divergentes da grade: {len(divergencias)} chave(s)")
+        if corrigir:
+            atualizar_contadores_ocupacao(session, {d[1] for d in divergencias})
+            session.commit()
+    
+    _estado_ocupacao()['reconciliado_em'] = datetime.now()
+    return divergencias
+
+def obter_totais_ocupacao(session):
+    """Retorna {status: quantidade} a partir dos contadores (somente leitura; a reconciliação
+    ocorre no retrato diário e no botão do histórico de ocupação)"""
+    return {
+        status: int(quantidade or 0)
+        for status, quantidade in session.query(
+            ContadorOcupacao.status,
+            func.sum(ContadorOcupacao.quantidade)
+        ).group_by(ContadorOcupacao.status).all()
+    }
+
+# =====================================================
+# 7. HISTÓRICO DIÁRIO DE OCUPAÇÃO
+# =====================================================
+
+def registrar_snapshot_ocupacao(session, data=None):
+    """Grava o retrato diário dos contadores de ocupação (somente inclusão; uma vez por dia).
+    
+    Retorna True se o retrato foi gravado e False se a data já possuía retrato.
+    """
+    data = data or date.today()
+    if session.query(SnapshotOcupacao.id).filter(SnapshotOcupacao.data == data).first():
+        return False
+    
+    # O retrato parte dos contadores, então eles são conferidos com a grade antes
+    reconciliar_contadores_ocupacao(session)
+    
+    session.execute(
+        insert(SnapshotOcupacao.__table__).from_select(
+            ['data', 'unidade_id', 'profissional_id', 'status', 'quantidade'],
+            select(
+                literal(data, Date),
+                ContadorOcupacao.unidade_id,
+                ContadorOcupacao.profissional_id,
+                ContadorOcupacao.status,
+                ContadorOcupacao.quantidade
+            ).where(ContadorOcupacao.quantidade > 0)
+        )
+    )
+    session.commit()
+    logging.info(f"Retrato de ocupação registrado para {data}")
+    return True
+
+def garantir_snapshot_diario():
+    """Registra o retrato do dia (com a reconciliação dos contadores) na primeira execução do dia neste processo.
+    
+    O dia é reservado antes de começar: sessões simultâneas não repetem o trabalho e uma
+    falha não é refeita a cada renderização (fica registrada no log).
+    """
+    estado = _estado_ocupacao()
+    hoje = date.today()
+    with estado['trava_snapshot']:
+        if estado.get('snapshot_em') == hoje:
             return
+        estado['snapshot_em'] = hoje
+    
+    session = get_session()
+    try:
+        registrar_snapshot_ocupacao(session, hoje)
+    except Exception as e:
+        session.rollback()
+        logging.error(f"Erro ao registrar retrato diário de ocupação: {str(e)}")
+    finally:
+        session.close()
+
+@st.cache_data(ttl=TTL_CACHE_DASHBOARD)
+def carregar_historico_ocupacao(inicio, fim, unidade_id, area_id, dia):
+    """Histórico de ocupação em cache por filtro; `dia` renova o cache quando surge um novo retrato"""
+    with sessao_leitura() as session:
+        return consultar_historico_ocupacao(session, inicio, fim, unidade_id, area_id)
+
+# =====================================================
+# 8. AGENDA POR DATA
+# =====================================================
+
+@st.cache_data(ttl=TTL_CACHE_DASHBOARD)
+def carregar_agenda_diaria(inicio, fim, unidade, geracao):
+    """Agenda diária em cache por período e unidade; `geracao` invalida o cache após alterações"""
+    with sessao_leitura() as session:
+        return consultar_agenda_diaria(session, inicio, fim, unidade)
+
+def _opcoes_rotulos(rotulos, todos):
+    """Monta as opções de um selectbox a partir de {chave: rótulo}, com a opção "todos" no início"""
+    return [todos] + list(rotulos.items())
+
+def _chave_opcao(opcao):
+    """Extrai a chave de uma opção montada por _opcoes_rotulos (None para a opção "todos")"""
+    return opcao[0] if isinstance(opcao, tuple) else None
 
+def _contagens_status(tabela):
+    """Completa uma tabela do cubo com as colunas de status usadas nos dashboards"""
+    contagens = tabela.reindex(columns=['Disponível', 'Em atendimento', 'Bloqueio'], fill_value=0)
+    contagens['Total'] = tabela.sum(axis=1)
+    return contagens
+
+def dashboard_ocupacao():
+    """Dashboard de ocupação por unidade, com mapa de calor dia × hora"""
+    import plotly.express as px
+    try:
         st.subheader("📊 Dashboard de Ocupação por Unidade")
         
-        # Filtro de unidade
-        unidades = session.query(Unidade).all()
-        unidade_selecionada = st.selectbox(
-            "Unidade",
-            ["Todas as Unidades"] + [u.nome for u in unidades],
-            index=0
-        )
+        cubos = obter_cubos_ocupacao()
         
-        # Query base
-        query = session.query(
-            Unidade.nome,
-            func.count(DisponibilidadeSala.id).label('total_horarios'),
-            func.sum(case((DisponibilidadeSala.status == 'Em atendimento', 1), else_=0)).label('horarios_alocados')
-        ).join(Sala).join(DisponibilidadeSala).group_by(Unidade.id)
-        
-        if unidade_selecionada != "Todas as Unidades":
-            query = query.filter(Unidade.nome == unidade_selecionada)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            # Os dois cubos já estão em memória: alternar a grade não consulta o banco
+            grade = st.radio(
+                "Grade",
+                ["Salas", "Profissionais"],
+                horizontal=True,
+                key="grade_mapa_ocupacao"
+            )
+        cubo = cubos['salas'] if grade == "Salas" else cubos['profissionais']
+        unidades = {uid: nome for uid, nome in cubo.rotulos['unidade'].items() if uid != SEM_UNIDADE}
         
-        resultados = query.all()
+        # Filtro de unidade
+        with col2:
+            unidade_selecionada = st.selectbox(
+                "Unidade",
+                _opcoes_rotulos(unidades, "Todas as Unidades"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                index=0,
+                key="select_unidade_ocupacao"
+            )
+        unidade_id = _chave_opcao(unidade_selecionada)
+        
+        # Filtro de sala (apenas na grade de salas)
+        sala_id = None
+        if grade == "Salas":
+            salas = {
+                sid: rotulo for sid, rotulo in cubo.rotulos['sala'].items()
+                if not unidade_id or sid in cubo.virtuais['unidade'][1].get(unidade_id, [])
+            }
+            with col3:
+                sala_selecionada = st.selectbox(
+                    "Sala",
+                    _opcoes_rotulos(salas, "Todas as Salas"),
+                    format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                    key="select_sala_ocupacao"
+                )
+            sala_id = _chave_opcao(sala_selecionada)
         
         # Exibição dos resultados
-        for unidade, total, alocados in resultados:
+        for uid, nome in unidades.items():
+            if unidade_id and uid != unidade_id:
+                continue
+            total = cubo.somar(unidade=uid)
+            if total == 0:
+                continue
+            alocados = cubo.somar(unidade=uid, status='Em atendimento')
+            
+            st.write(f"**{nome}**")
             col1, col2, col3 = st.columns(3)
             with col1:
                 st.metric("Capacidade Total", total)
@@ -2744,167 +2726,137 @@ def dashboard_ocupacao():
                 percentual_ociosidade = (ociosidade / total * 100) if total > 0 else 0
                 st.metric("Ociosidade", f"{ociosidade} | {percentual_ociosidade:.1f}%")
         
-        # Análise de picos
-        st.subheader("📈 Análise de Picos")
-        col1, col2 = st.columns(2)
+        # Mapa de calor de ocupação
+        st.subheader("🔥 Mapa de Ocupação")
+        filtros = {'unidade': unidade_id}
+        if sala_id:
+            filtros['sala'] = sala_id
+        mapa = mapa_calor_ocupacao(cubo, **filtros)
         
-        with col1:
-            # Picos de atendimento
-            picos = session.query(
-                DisponibilidadeSala.dia_semana,
-                DisponibilidadeSala.horario,
-                func.count(DisponibilidadeSala.id).label('quantidade')
-            ).filter(DisponibilidadeSala.status == 'Em atendimento')
-            
-            if unidade_selecionada != "Todas as Unidades":
-                picos = picos.join(Sala).join(Unidade).filter(Unidade.nome == unidade_selecionada)
-            
-            picos = picos.group_by(DisponibilidadeSala.dia_semana, DisponibilidadeSala.horario).order_by(func.count(DisponibilidadeSala.id).desc()).limit(5)
-            
-            st.write("**Top 5 Picos de Atendimento**")
-            for dia, hora, qtd in picos:
-                st.write(f"- {dia} {hora}: {qtd} atendimentos")
+        if mapa.isna().all().all():
+            st.info("ℹ️ Não há horários na grade para os filtros selecionados")
+            return
         
-        with col2:
-            # Picos de vacância
-            vacancia = session.query(
-                DisponibilidadeSala.dia_semana,
-                DisponibilidadeSala.horario,
-                func.count(DisponibilidadeSala.id).label('quantidade')
-            ).filter(DisponibilidadeSala.status == 'Disponível')
-            
-            if unidade_selecionada != "Todas as Unidades":
-                vacancia = vacancia.join(Sala).join(Unidade).filter(Unidade.nome == unidade_selecionada)
-            
-            vacancia = vacancia.group_by(DisponibilidadeSala.dia_semana, DisponibilidadeSala.horario).order_by(func.count(DisponibilidadeSala.id).desc()).limit(5)
-            
-            st.write("**Top 5 Horários de Vacância**")
-            for dia, hora, qtd in vacancia:
-                st.write(f"- {dia} {hora}: {qtd} vagas")
+        fig = px.imshow(
+            mapa,
+            labels={'x': 'Horário', 'y': 'Dia', 'color': 'Ocupação (%)'},
+            color_continuous_scale='RdYlGn_r',
+            zmin=0,
+            zmax=100,
+            text_auto=True,
+            aspect='auto',
+            title=f'Taxa de Ocupação por Dia e Horário ({grade})'
+        )
+        st.plotly_chart(fig)
                 
     except Exception as e:
         st.error(f"❌ Erro ao gerar dashboard de ocupação: {str(e)}")
-    finally:
-        if session:
-            session.close()
 
 def dashboard_area_atuacao():
     """Dashboard de área de atuação por unidade"""
     try:
-        session = get_session()
-        if not session:
-            st.error("❌ Erro ao conectar ao banco de dados")
-            return
-
         st.subheader("📊 Dashboard de Área de Atuação")
         
+        cubo = obter_cubos_ocupacao()['profissionais']
+        unidades = {k: v for k, v in cubo.rotulos['unidade'].items() if k != SEM_UNIDADE}
+        
         # Filtros
         col1, col2 = st.columns(2)
         with col1:
-            unidades = session.query(Unidade).all()
             unidade_selecionada = st.selectbox(
                 "Unidade",
-                ["Todas as Unidades"] + [u.nome for u in unidades],
-                index=0
+                _opcoes_rotulos(unidades, "Todas as Unidades"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                index=0,
+                key="select_unidade_area_atuacao"
             )
         with col2:
-            areas = session.query(AreaAtuacao).all()
             area_selecionada = st.selectbox(
                 "Área de Atuação",
-                ["Todas as Áreas"] + [a.nome for a in areas],
-                index=0
+                _opcoes_rotulos(cubo.rotulos['area'], "Todas as Áreas"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                index=0,
+                key="select_area_area_atuacao"
             )
-        
-        # Query base
-        query = session.query(
-            Unidade.nome,
-            AreaAtuacao.nome,
-            func.count(Disponibilidade.id).label('total_horarios'),
-            func.sum(case((Disponibilidade.status == 'Em atendimento', 1), else_=0)).label('horarios_alocados'),
-            func.sum(case((Disponibilidade.status == 'Disponível', 1), else_=0)).label('horarios_vagos')
-        ).join(Profissional).join(profissional_area_atuacao).join(AreaAtuacao).join(Unidade).group_by(Unidade.id, AreaAtuacao.id)
-        
-        if unidade_selecionada != "Todas as Unidades":
-            query = query.filter(Unidade.nome == unidade_selecionada)
-        if area_selecionada != "Todas as Áreas":
-            query = query.filter(AreaAtuacao.nome == area_selecionada)
-        
-        resultados = query.all()
+        unidade_id = _chave_opcao(unidade_selecionada)
+        area_id = _chave_opcao(area_selecionada)
         
         # Exibição dos resultados
-        for unidade, area, total, alocados, vagos in resultados:
-            with st.expander(f"🏥 {unidade} - {area}"):
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Capacidade Total", total)
-                with col2:
-                    percentual = (alocados / total * 100) if total > 0 else 0
-                    st.metric("Horários Alocados", f"{alocados} | {percentual:.1f}%")
-                with col3:
-                    percentual = (vagos / total * 100) if total > 0 else 0
-                    st.metric("Horários Vagos", f"{vagos} | {percentual:.1f}%")
+        for aid, area in cubo.rotulos['area'].items():
+            if area_id and aid != area_id:
+                continue
+            contagens = _contagens_status(cubo.tabela(
+                'unidade', area=aid, unidade=unidade_id or list(unidades)
+            ))
+            
+            for uid, linha in contagens[contagens['Total'] > 0].iterrows():
+                total = linha['Total']
+                alocados = linha['Em atendimento']
+                vagos = linha['Disponível']
+                with st.expander(f"🏥 {cubo.rotulo('unidade', uid)} - {area}"):
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Capacidade Total", total)
+                    with col2:
+                        percentual = (alocados / total * 100) if total > 0 else 0
+                        st.metric("Horários Alocados", f"{alocados} | {percentual:.1f}%")
+                    with col3:
+                        percentual = (vagos / total * 100) if total > 0 else 0
+                        st.metric("Horários Vagos", f"{vagos} | {percentual:.1f}%")
                 
     except Exception as e:
         st.error(f"❌ Erro ao gerar dashboard de área de atuação: {str(e)}")
-    finally:
-        if session:
-            session.close()
 
 def dashboard_disponibilidade():
     """Dashboard de disponibilidade de profissionais"""
     try:
-        session = get_session()
-        if not session:
-            st.error("❌ Erro ao conectar ao banco de dados")
-            return
-
         st.subheader("📊 Dashboard de Disponibilidade de Profissionais")
         
+        cubo = obter_cubos_ocupacao()['profissionais']
+        unidades = {k: v for k, v in cubo.rotulos['unidade'].items() if k != SEM_UNIDADE}
+        
         # Filtros
         col1, col2 = st.columns(2)
         with col1:
-            unidades = session.query(Unidade).all()
             unidade_selecionada = st.selectbox(
                 "Unidade",
-                ["Todas as Unidades"] + [u.nome for u in unidades],
-                index=0
+                _opcoes_rotulos(unidades, "Todas as Unidades"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                index=0,
+                key="select_unidade_disponibilidade"
             )
         with col2:
-            areas = session.query(AreaAtuacao).all()
             area_selecionada = st.selectbox(
                 "Área de Atuação",
-                ["Todas as Áreas"] + [a.nome for a in areas],
-                index=0
+                _opcoes_rotulos(cubo.rotulos['area'], "Todas as Áreas"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                index=0,
+                key="select_area_disponibilidade"
             )
-        
-        # Query base
-        query = session.query(
-            Profissional.nome,
-            AreaAtuacao.nome,
-            func.count(Disponibilidade.id).label('total_horarios'),
-            func.sum(case((Disponibilidade.status == 'Em atendimento', 1), else_=0)).label('horarios_alocados'),
-            func.sum(case((Disponibilidade.status == 'Disponível', 1), else_=0)).label('horarios_vagos')
-        ).join(Unidade).join(Disponibilidade).join(profissional_area_atuacao).join(AreaAtuacao).group_by(Profissional.id, AreaAtuacao.id)
-        
-        if unidade_selecionada != "Todas as Unidades":
-            query = query.filter(Unidade.nome == unidade_selecionada)
-        if area_selecionada != "Todas as Áreas":
-            query = query.filter(AreaAtuacao.nome == area_selecionada)
-        
-        resultados = query.all()
+        unidade_id = _chave_opcao(unidade_selecionada)
+        area_id = _chave_opcao(area_selecionada)
         
         # Preparar dados para tabela
         dados = []
-        for prof, area, total, alocados, vagos in resultados:
-            percentual_vagos = (vagos / total * 100) if total > 0 else 0
-            dados.append({
-                'Profissional': prof,
-                'Área de Atuação': area,
-                'Capacidade Total': total,
-                'Alocados': alocados,
-                'Vagos': vagos,
-                'Vacância %': f"{percentual_vagos:.1f}%"
-            })
+        for aid, area in cubo.rotulos['area'].items():
+            if area_id and aid != area_id:
+                continue
+            contagens = _contagens_status(cubo.tabela(
+                'profissional', area=aid, unidade=unidade_id or list(unidades)
+            ))
+            
+            for prof_id, linha in contagens[contagens['Total'] > 0].iterrows():
+                total = linha['Total']
+                vagos = linha['Disponível']
+                percentual_vagos = (vagos / total * 100) if total > 0 else 0
+                dados.append({
+                    'Profissional': cubo.rotulo('profissional', prof_id),
+                    'Área de Atuação': area,
+                    'Capacidade Total': total,
+                    'Alocados': linha['Em atendimento'],
+                    'Vagos': vagos,
+                    'Vacância %': f"{percentual_vagos:.1f}%"
+                })
         
         # Ordenar por percentual de vacância
         dados = sorted(dados, key=lambda x: float(x['Vacância %'].replace('%', '')), reverse=True)
@@ -2925,89 +2877,161 @@ def dashboard_disponibilidade():
                 
     except Exception as e:
         st.error(f"❌ Erro ao gerar dashboard de disponibilidade: {str(e)}")
-    finally:
-        if session:
-            session.close()
+
+# Quantidade de profissionais exibidos em cada extremo no modo "Top/Bottom N"
+LIMITE_TOP_N = int(os.getenv('DASHBOARD_TOP_N', '15'))
+
+# A partir desta quantidade de pontos o modo "Todos" usa traços WebGL
+LIMITE_WEBGL = int(os.getenv('DASHBOARD_LIMITE_WEBGL', '300'))
+
+MODO_TOP_N = "Top/Bottom N"
+MODO_TODOS = "Todos"
+
+def tabela_profissionais(cubo, unidade_id=None, area_id=None):
+    """Monta a tabela de capacidade e ocupação por profissional a partir do cubo"""
+    contagens = _contagens_status(cubo.tabela('profissional', unidade=unidade_id, area=area_id))
+    
+    # A unidade pertence ao horário da grade: só entram profissionais com horários nela
+    if unidade_id is not None:
+        contagens = contagens[contagens['Total'] > 0]
+    
+    df = pd.DataFrame({
+        'Profissional': [cubo.rotulo('profissional', p) for p in contagens.index],
+        'Horários Bloqueados': contagens['Bloqueio'].to_numpy(),
+        'Horários Disponíveis': contagens['Disponível'].to_numpy(),
+        'Em Atendimento': contagens['Em atendimento'].to_numpy(),
+        # Capacidade total descontando os bloqueios
+        'Capacidade Total': (contagens['Total'] - contagens['Bloqueio']).to_numpy()
+    })
+    
+    # Calcula taxa de ocupação
+    capacidade = df['Capacidade Total'].where(df['Capacidade Total'] > 0)
+    df['Taxa de Ocupação (%)'] = (df['Em Atendimento'] / capacidade * 100).fillna(0).round(2)
+    
+    return df[[
+        'Profissional', 'Capacidade Total', 'Horários Bloqueados',
+        'Horários Disponíveis', 'Em Atendimento', 'Taxa de Ocupação (%)'
+    ]]
+
+def resumir_top_n(df, n):
+    """Mantém os N profissionais de maior e de menor ocupação e agrega os demais em "Outros" """
+    if len(df) <= 2 * n:
+        return df.sort_values('Taxa de Ocupação (%)', ascending=False)
+    
+    ordenado = df.sort_values('Taxa de Ocupação (%)', ascending=False)
+    meio = ordenado.iloc[n:-n]
+    capacidade = meio['Capacidade Total'].sum()
+    atendimentos = meio['Em Atendimento'].sum()
+    outros = pd.DataFrame([{
+        'Profissional': f"Outros ({len(meio)})",
+        'Capacidade Total': capacidade,
+        'Em Atendimento': atendimentos,
+        'Taxa de Ocupação (%)': round(atendimentos / capacidade * 100, 2) if capacidade > 0 else 0
+    }])
+    return pd.concat([ordenado.head(n), outros, ordenado.tail(n)], ignore_index=True)
+
+def construir_figura_profissionais(df, modo=MODO_TOP_N, n=LIMITE_TOP_N):
+    """Gráfico da taxa de ocupação por profissional (Top/Bottom N ou todos, com WebGL se necessário)"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+    titulo = 'Taxa de Ocupação por Profissional'
+    
+    if modo == MODO_TOP_N:
+        return px.bar(
+            resumir_top_n(df, n),
+            x='Profissional',
+            y='Taxa de Ocupação (%)',
+            title=titulo,
+            color='Taxa de Ocupação (%)',
+            color_continuous_scale='RdYlGn_r'
+        )
+    
+    if len(df) <= LIMITE_WEBGL:
+        return px.bar(
+            df,
+            x='Profissional',
+            y='Taxa de Ocupação (%)',
+            title=titulo,
+            color='Taxa de Ocupação (%)',
+            color_continuous_scale='RdYlGn_r'
+        )
+    
+    # Séries grandes: pontos WebGL ordenados pela taxa, nome do profissional no hover
+    ordenado = df.sort_values('Taxa de Ocupação (%)', ascending=False)
+    taxas = ordenado['Taxa de Ocupação (%)'].to_numpy()
+    fig = go.Figure(go.Scattergl(
+        x=np.arange(1, len(ordenado) + 1),
+        y=taxas,
+        mode='markers',
+        text=ordenado['Profissional'].to_numpy(),
+        hovertemplate='%{text}<br>%{y:.2f}%<extra></extra>',
+        marker=dict(
+            color=taxas,
+            colorscale='RdYlGn_r',
+            cmin=0,
+            cmax=100,
+            showscale=True,
+            colorbar=dict(title='Ocupação (%)')
+        )
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title='Profissionais (ordenados pela taxa)',
+        yaxis_title='Taxa de Ocupação (%)'
+    )
+    return fig
+
+@st.cache_data(ttl=TTL_CACHE_DASHBOARD)
+def carregar_figura_profissionais(unidade_id, area_id, modo, n, geracao):
+    """JSON da figura de profissionais em cache pelos filtros e pela geração dos dados"""
+    cubo = obter_cubos_ocupacao()['profissionais']
+    df = tabela_profissionais(cubo, unidade_id, area_id)
+    return construir_figura_profissionais(df, modo, n).to_json()
 
 def dashboard_profissionais():
     """Dashboard de métricas por profissional"""
+    import plotly.io as pio
     try:
-        session = get_session()
-        if not session:
-            st.error("❌ Erro ao conectar ao banco de dados")
-            return
-
         st.subheader("👥 Dashboard por Profissional")
         
+        cubo = obter_cubos_ocupacao()['profissionais']
+        
         # Filtros
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
-            unidades = session.query(Unidade).all()
             unidade_selecionada = st.selectbox(
                 "Unidade",
-                ["Todas as Unidades"] + [(u.id, u.nome) for u in unidades],
+                _opcoes_rotulos(cubo.rotulos['unidade'], "Todas as Unidades"),
                 format_func=lambda x: x[1] if isinstance(x, tuple) else x,
                 key="select_unidade_prof"
             )
-            unidade_id = unidade_selecionada[0] if isinstance(unidade_selecionada, tuple) else None
+            unidade_id = _chave_opcao(unidade_selecionada)
         
         with col2:
-            areas = session.query(AreaAtuacao).all()
             area_selecionada = st.selectbox(
                 "Área de Atuação",
-                ["Todas as Áreas"] + [(a.id, a.nome) for a in areas],
+                _opcoes_rotulos(cubo.rotulos['area'], "Todas as Áreas"),
                 format_func=lambda x: x[1] if isinstance(x, tuple) else x,
                 key="select_area_prof"
             )
-            area_id = area_selecionada[0] if isinstance(area_selecionada, tuple) else None
+            area_id = _chave_opcao(area_selecionada)
         
-        # Consulta profissionais com filtros
-        query = session.query(Profissional)
-        if unidade_id:
-            query = query.filter(Profissional.unidade_id == unidade_id)
-        if area_id:
-            query = query.join(Profissional.areas_atuacao).filter(AreaAtuacao.id == area_id)
+        with col3:
+            modo = st.radio(
+                "Exibição do gráfico",
+                [MODO_TOP_N, MODO_TODOS],
+                horizontal=True,
+                key="modo_grafico_prof"
+            )
         
-        profissionais = query.all()
+        # Contagem por profissional e status, fatiada do cubo em memória
+        df = tabela_profissionais(cubo, unidade_id, area_id)
         
-        if profissionais:
-            # Criar DataFrame para os dados
-            dados = []
-            
-            for prof in profissionais:
-                # Consulta grade de disponibilidade do profissional
-                disponibilidades = session.query(Disponibilidade).filter(
-                    Disponibilidade.profissional_id == prof.id
-                ).all()
-                
-                # Calcula métricas
-                total_horarios = len(disponibilidades)
-                horarios_bloqueados = len([d for d in disponibilidades if d.status == 'Bloqueio'])
-                horarios_disponiveis = len([d for d in disponibilidades if d.status == 'Disponível'])
-                horarios_atendimento = len([d for d in disponibilidades if d.status == 'Em atendimento'])
-                
-                # Capacidade total descontando os bloqueios
-                capacidade_total = total_horarios - horarios_bloqueados
-                
-                # Calcula taxa de ocupação
-                taxa_ocupacao = (horarios_atendimento / capacidade_total * 100) if capacidade_total > 0 else 0
-                
-                dados.append({
-                    'Profissional': prof.nome,
-                    'Capacidade Total': capacidade_total,
-                    'Horários Bloqueados': horarios_bloqueados,
-                    'Horários Disponíveis': horarios_disponiveis,
-                    'Em Atendimento': horarios_atendimento,
-                    'Taxa de Ocupação (%)': round(taxa_ocupacao, 2)
-                })
-            
-            # Criar DataFrame
-            df = pd.DataFrame(dados)
-            
+        if not df.empty:
             # Exibir métricas gerais
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total de Profissionais", len(profissionais))
+                st.metric("Total de Profissionais", len(df))
             with col2:
                 st.metric("Média de Capacidade", round(df['Capacidade Total'].mean(), 1))
             with col3:
@@ -3015,16 +3039,11 @@ def dashboard_profissionais():
             with col4:
                 st.metric("Total em Atendimento", df['Em Atendimento'].sum())
             
-            # Gráfico de barras para taxa de ocupação
-            fig = px.bar(
-                df,
-                x='Profissional',
-                y='Taxa de Ocupação (%)',
-                title='Taxa de Ocupação por Profissional',
-                color='Taxa de Ocupação (%)',
-                color_continuous_scale='RdYlGn_r'
+            # Gráfico de taxa de ocupação (figura serializada em cache)
+            figura = carregar_figura_profissionais(
+                unidade_id, area_id, modo, LIMITE_TOP_N, geracao_ocupacao()
             )
-            st.plotly_chart(fig)
+            st.plotly_chart(pio.from_json(figura))
             
             # Tabela detalhada
             st.dataframe(
@@ -3047,29 +3066,29 @@ def dashboard_profissionais():
 
     except Exception as e:
         st.error(f"❌ Erro ao gerar dashboard de profissionais: {str(e)}")
-    finally:
-        if session:
-            session.close()
 
 def dashboard():
     """Exibe o dashboard com métricas e gráficos"""
     st.title("📊 Dashboard")
     
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "🏥 Unidades",
-        "🎯 Áreas de Atuação",
-        "👥 Profissionais",
-        "📅 Horários"
-    ])
-    
-    with tab1:
-        dashboard_unidades()
-    with tab2:
-        dashboard_areas_atuacao()
-    with tab3:
-        dashboard_profissionais()
-    with tab4:
-        dashboard_horarios()
+    # Apenas a visão selecionada é executada; as demais reaproveitam os dados em cache
+    visoes = {
+        "🏥 Unidades": dashboard_unidades,
+        "🎯 Áreas de Atuação": dashboard_areas_atuacao,
+        "👥 Profissionais": dashboard_profissionais,
+        "📅 Horários": dashboard_horarios,
+        "📈 Histórico": dashboard_historico,
+        "🗓️ Agenda por Período": dashboard_agenda_periodo,
+        "🔥 Mapa de Ocupação": dashboard_ocupacao
+    }
+    visao = st.radio(
+        "Visão",
+        list(visoes),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="visao_dashboard"
+    )
+    visoes[visao]()
 
 def main():
     """Função principal da aplicação"""
@@ -3079,6 +3098,9 @@ def main():
             st.error("❌ Falha ao verificar/criar banco de dados")
             return
 
+        # Retrato diário da ocupação (executa uma vez por dia)
+        garantir_snapshot_diario()
+
         # Menu lateral
         st.sidebar.title("📅 Sistema de Agendamento")
         menu = st.sidebar.radio(
@@ -3090,6 +3112,12 @@ def main():
             st.title("🏠 Início")
             st.write("Bem-vindo ao Sistema de Agendamento!")
             st.write("Selecione uma opção no menu lateral para começar.")
+            
+            with st.expander("🔌 Conexões com o banco de dados"):
+                st.json(metricas_pool())
+                if engine_leitura is not engine:
+                    st.caption("Engine de leitura (dashboards e consultas)")
+                    st.json(metricas_pool(engine_leitura))
 
         elif menu == "📅 Consultar Disponibilidade":
             consultar_disponibilidade()
@@ -3173,6 +3201,8 @@ def gerenciar_agenda_fixa():
                             # Apagar dados existentes
                             session.query(AgendaFixa).delete()
                             session.query(Disponibilidade).delete()
+                            atualizar_agenda_diaria(session)
+                            registrar_alteracao_ocupacao(session)
                             session.commit()
                             st.success("✅ Dados da agenda fixa e disponibilidade apagados com sucesso!")
                             
@@ -3227,7 +3257,7 @@ def gerenciar_agenda_fixa():
             
             uploaded_file = st.file_uploader(
                 "Escolha o arquivo Excel",
-                type=["xlsx"],
+                type=FORMATOS_UPLOAD,
                 key="upload_agenda_fixa"
             )
             
@@ -3238,7 +3268,9 @@ def gerenciar_agenda_fixa():
                 
                 try:
                     # Ler arquivo
-                    df = pd.read_excel(uploaded_file)
+                    df = ler_upload(
+                        uploaded_file, colunas=COLUNAS_AGENDA_FIXA, tipos=TIPOS_AGENDA_FIXA, datas=['Data']
+                    )
                     progress_bar.progress(30, text="Verificando dados...")
                     
                     # Mostrar número de linhas e colunas
@@ -3356,14 +3388,14 @@ def gerenciar_bloqueios():
     # Upload de arquivo
     uploaded_file = st.file_uploader(
         "📤 Upload de Bloqueios",
-        type=["xlsx"],
+        type=FORMATOS_UPLOAD,
         key="upload_bloqueios"
     )
     
     if uploaded_file:
         try:
             # Ler arquivo
-            df = pd.read_excel(uploaded_file)
+            df = ler_upload(uploaded_file)
             
             # Processar arquivo
             if processar_bloqueios(df):
@@ -3374,21 +3406,59 @@ def gerenciar_bloqueios():
             st.error(f"❌ Erro ao processar arquivo: {str(e)}")
             logging.error(f"Erro ao processar arquivo de bloqueios: {str(e)}\n{traceback.format_exc()}")
 
+def consultar_ocupacao_unidades(session, unidade_nome=None):
+    """Retorna a ocupação de salas por unidade em uma única consulta agrupada"""
+    # Salas com ao menos um agendamento não cancelado (uma linha por sala)
+    salas_ocupadas = session.query(Agendamento.sala_id).filter(
+        Agendamento.status != "Cancelado"
+    ).distinct().subquery()
+    
+    query = session.query(
+        Unidade.nome,
+        func.count(Sala.id),
+        func.count(salas_ocupadas.c.sala_id)
+    ).join(Sala, Sala.unidade_id == Unidade.id).outerjoin(
+        salas_ocupadas, salas_ocupadas.c.sala_id == Sala.id
+    )
+    
+    if unidade_nome:
+        query = query.filter(Unidade.nome == unidade_nome)
+    
+    df = pd.DataFrame(
+        query.group_by(Unidade.id, Unidade.nome).order_by(Unidade.nome).all(),
+        columns=["Unidade", "Total de Salas", "Salas Ocupadas"]
+    )
+    df["Taxa de Ocupação"] = (df["Salas Ocupadas"] / df["Total de Salas"] * 100).fillna(0)
+    return df
+
+@st.cache_data(ttl=TTL_CACHE_DASHBOARD)
+def carregar_dados_unidades(unidade_nome, geracao):
+    """Métricas gerais e ocupação por unidade, em cache por filtro e geração dos dados"""
+    with sessao_leitura() as session:
+        return {
+            'total_profissionais': session.query(Profissional).count(),
+            'total_salas': session.query(Sala).count(),
+            'total_agendamentos': session.query(Agendamento).count(),
+            'ocupacao': consultar_ocupacao_unidades(session, unidade_nome)
+        }
+
 def dashboard_unidades():
     """Exibe o dashboard de unidades"""
+    import plotly.express as px
     st.subheader("🏥 Dashboard de Unidades")
     
-    session = get_session()
-    if not session:
-        st.error("❌ Erro ao conectar ao banco de dados")
-        return
-    
     try:
         # Filtros
-        unidades = session.query(Unidade).all()
+        cubo = obter_cubos_ocupacao()['profissionais']
+        unidades = [nome for uid, nome in cubo.rotulos['unidade'].items() if uid != SEM_UNIDADE]
         unidade_selecionada = st.selectbox(
             "Unidade",
-            ["Todas as Unidades"] + [u.nome for u in unidades]
+            ["Todas as Unidades"] + unidades
+        )
+        
+        dados = carregar_dados_unidades(
+            None if unidade_selecionada == "Todas as Unidades" else unidade_selecionada,
+            geracao_ocupacao()
         )
         
         # Métricas Gerais
@@ -3397,51 +3467,25 @@ def dashboard_unidades():
         
         with col1:
             # Total de Profissionais
-            total_profissionais = session.query(Profissional).count()
-            st.metric("Total de Profissionais", total_profissionais)
+            st.metric("Total de Profissionais", dados['total_profissionais'])
         
         with col2:
             # Total de Salas
-            total_salas = session.query(Sala).count()
-            st.metric("Total de Salas", total_salas)
+            st.metric("Total de Salas", dados['total_salas'])
         
         with col3:
             # Total de Agendamentos
-            total_agendamentos = session.query(Agendamento).count()
-            st.metric("Total de Agendamentos", total_agendamentos)
+            st.metric("Total de Agendamentos", dados['total_agendamentos'])
         
         # Ocupação por Unidade
         st.subheader("Ocupação por Unidade")
-        ocupacao_data = []
+        df_ocupacao = dados['ocupacao']
         
-        for unidade in unidades:
-            if unidade_selecionada == "Todas as Unidades" or unidade.nome == unidade_selecionada:
-                # Total de salas na unidade
-                total_salas_unidade = session.query(Sala).filter_by(unidade_id=unidade.id).count()
-                
-                if total_salas_unidade > 0:
-                    # Salas ocupadas
-                    salas_ocupadas = session.query(Sala).join(Agendamento).filter(
-                        Sala.unidade_id == unidade.id,
-                        Agendamento.status != "Cancelado"
-                    ).count()
-                    
-                    # Calcular taxa de ocupação
-                    taxa_ocupacao = (salas_ocupadas / total_salas_unidade * 100) if total_salas_unidade > 0 else 0
-                    
-                    ocupacao_data.append({
-                        "Unidade": unidade.nome,
-                        "Total de Salas": total_salas_unidade,
-                        "Salas Ocupadas": salas_ocupadas,
-                        "Taxa de Ocupação": taxa_ocupacao
-                    })
-        
-        if ocupacao_data:
+        if not df_ocupacao.empty:
             # Exibir tabela de ocupação
-            st.dataframe(ocupacao_data)
+            st.dataframe(df_ocupacao, hide_index=True)
             
             # Gráfico de Ocupação
-            df_ocupacao = pd.DataFrame(ocupacao_data)
             fig = px.bar(
                 df_ocupacao,
                 x="Unidade",
@@ -3455,48 +3499,55 @@ def dashboard_unidades():
     
     except Exception as e:
         st.error(f"❌ Erro ao gerar dashboard de unidades: {str(e)}")
-    finally:
-        session.close()
+
+def consultar_distribuicao_areas(session):
+    """Retorna profissionais e agendamentos por área de atuação em uma única consulta"""
+    area_id = profissional_area_atuacao.c.area_atuacao_id
+    
+    profissionais_area = session.query(
+        area_id.label('area_id'),
+        func.count(profissional_area_atuacao.c.profissional_id).label('total')
+    ).group_by(area_id).subquery()
+    
+    agendamentos_area = session.query(
+        area_id.label('area_id'),
+        func.count(Agendamento.id).label('total')
+    ).join(
+        Agendamento, Agendamento.profissional_id == profissional_area_atuacao.c.profissional_id
+    ).group_by(area_id).subquery()
+    
+    query = session.query(
+        AreaAtuacao.nome,
+        func.coalesce(profissionais_area.c.total, 0),
+        func.coalesce(agendamentos_area.c.total, 0)
+    ).outerjoin(
+        profissionais_area, profissionais_area.c.area_id == AreaAtuacao.id
+    ).outerjoin(
+        agendamentos_area, agendamentos_area.c.area_id == AreaAtuacao.id
+    ).order_by(AreaAtuacao.id)
+    
+    return pd.DataFrame(query.all(), columns=["Área", "Profissionais", "Agendamentos"])
+
+@st.cache_data(ttl=TTL_CACHE_DASHBOARD)
+def carregar_distribuicao_areas(geracao):
+    """Distribuição por área de atuação, em cache por geração dos dados"""
+    with sessao_leitura() as session:
+        return consultar_distribuicao_areas(session)
 
 def dashboard_areas_atuacao():
     """Exibe o dashboard de áreas de atuação"""
+    import plotly.express as px
     st.subheader("🎯 Dashboard de Áreas de Atuação")
     
-    session = get_session()
-    if not session:
-        st.error("❌ Erro ao conectar ao banco de dados")
-        return
-    
     try:
         # Ocupação por Área de Atuação
-        areas_data = []
-        
-        areas = session.query(AreaAtuacao).all()
-        for area in areas:
-            # Profissionais na área
-            profissionais_area = session.query(Profissional).join(
-                profissional_area_atuacao
-            ).filter(profissional_area_atuacao.c.area_atuacao_id == area.id).count()
-            
-            # Agendamentos na área
-            agendamentos_area = session.query(Agendamento).join(
-                Profissional
-            ).join(
-                profissional_area_atuacao
-            ).filter(profissional_area_atuacao.c.area_atuacao_id == area.id).count()
-            
-            areas_data.append({
-                "Área": area.nome,
-                "Profissionais": profissionais_area,
-                "Agendamentos": agendamentos_area
-            })
+        df_areas = carregar_distribuicao_areas(geracao_ocupacao())
         
-        if areas_data:
+        if not df_areas.empty:
             # Exibir tabela de áreas
-            st.dataframe(areas_data)
+            st.dataframe(df_areas, hide_index=True)
             
             # Gráfico de Áreas
-            df_areas = pd.DataFrame(areas_data)
             fig = px.bar(
                 df_areas,
                 x="Área",
@@ -3510,38 +3561,88 @@ def dashboard_areas_atuacao():
     
     except Exception as e:
         st.error(f"❌ Erro ao gerar dashboard de áreas de atuação: {str(e)}")
-    finally:
-        session.close()
+
+def consultar_agendamentos_por_horario(session, unidade_id=None, inicio=None, fim=None):
+    """Retorna agendamentos por dia da semana (0 = domingo) e hora em uma única consulta agrupada"""
+    hora = extract('hour', Agendamento.data_hora)
+    dia_semana = extract('dow', Agendamento.data_hora)
+    query = session.query(
+        dia_semana.label('dia'),
+        hora.label('hora'),
+        func.count(Agendamento.id).label('agendamentos')
+    ).filter(hora.between(8, 19))  # Das 8h às 20h
+    
+    if unidade_id:
+        query = query.join(Sala, Sala.id == Agendamento.sala_id).filter(Sala.unidade_id == unidade_id)
+    
+    # Intervalo de datas (o fim é inclusivo)
+    if inicio and fim:
+        query = query.filter(
+            Agendamento.data_hora >= datetime.combine(inicio, time(0, 0)),
+            Agendamento.data_hora < datetime.combine(fim + timedelta(days=1), time(0, 0))
+        )
+    
+    df = pd.DataFrame(
+        query.group_by(dia_semana, hora).all(),
+        columns=['dia', 'hora', 'agendamentos']
+    )
+    df[['dia', 'hora']] = df[['dia', 'hora']].astype(int)
+    return df
+
+@st.cache_data(ttl=TTL_CACHE_DASHBOARD)
+def carregar_agendamentos_por_horario(unidade_id, inicio, fim):
+    """Agendamentos por dia da semana e hora, em cache por filtro"""
+    with sessao_leitura() as session:
+        return consultar_agendamentos_por_horario(session, unidade_id, inicio, fim)
 
 def dashboard_horarios():
     """Exibe o dashboard de horários"""
+    import plotly.express as px
     st.subheader("📅 Dashboard de Horários")
     
-    session = get_session()
-    if not session:
-        st.error("❌ Erro ao conectar ao banco de dados")
-        return
-    
     try:
-        # Horários de Pico
-        horarios_data = []
+        # Filtros
+        col1, col2 = st.columns(2)
+        with col1:
+            cubo = obter_cubos_ocupacao()['profissionais']
+            unidades = {uid: nome for uid, nome in cubo.rotulos['unidade'].items() if uid != SEM_UNIDADE}
+            unidade_selecionada = st.selectbox(
+                "Unidade",
+                _opcoes_rotulos(unidades, "Todas as Unidades"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                key="select_unidade_horarios"
+            )
+            unidade_id = _chave_opcao(unidade_selecionada)
         
-        for hora in range(8, 20):  # Das 8h às 20h
-            agendamentos_hora = session.query(Agendamento).filter(
-                extract('hour', Agendamento.data_hora) == hora
-            ).count()
-            
-            horarios_data.append({
-                "Hora": f"{hora:02d}:00",
-                "Agendamentos": agendamentos_hora
-            })
+        with col2:
+            filtrar_periodo = st.checkbox("Filtrar por período", key="filtrar_periodo_horarios")
+            inicio = fim = None
+            if filtrar_periodo:
+                hoje = date.today()
+                periodo = st.date_input(
+                    "Período",
+                    value=(hoje - timedelta(days=30), hoje),
+                    format="DD/MM/YYYY",
+                    key="periodo_horarios"
+                )
+                if len(periodo) == 2:
+                    inicio, fim = periodo
+        
+        # Horários de Pico: uma única consulta agrupada por dia da semana e hora
+        df = carregar_agendamentos_por_horario(unidade_id, inicio, fim)
+        
+        # Distribuição completa por hora, inclusive horas sem agendamentos
+        por_hora = df.groupby('hora')['agendamentos'].sum().reindex(range(8, 20), fill_value=0)
+        df_horarios = pd.DataFrame({
+            "Hora": [f"{h:02d}:00" for h in por_hora.index],
+            "Agendamentos": por_hora.values
+        })
         
-        if horarios_data:
+        if df_horarios['Agendamentos'].sum() > 0:
             # Exibir tabela de horários
-            st.dataframe(horarios_data)
+            st.dataframe(df_horarios, hide_index=True)
             
             # Gráfico de Horários
-            df_horarios = pd.DataFrame(horarios_data)
             fig = px.line(
                 df_horarios,
                 x="Hora",
@@ -3549,13 +3650,234 @@ def dashboard_horarios():
                 title="Distribuição de Agendamentos por Horário"
             )
             st.plotly_chart(fig)
+            
+            # Detalhamento por dia da semana (mesmo resultado, sem nova consulta)
+            with st.expander("📅 Agendamentos por dia da semana e horário"):
+                dias = {0: "Domingo", 1: "Segunda", 2: "Terça", 3: "Quarta", 4: "Quinta", 5: "Sexta", 6: "Sábado"}
+                grade = df.pivot_table(
+                    index='dia', columns='hora', values='agendamentos', aggfunc='sum', fill_value=0
+                ).reindex(index=range(7), columns=range(8, 20), fill_value=0)
+                grade.index = [dias[d] for d in grade.index]
+                grade.columns = [f"{h:02d}:00" for h in grade.columns]
+                st.dataframe(grade)
         else:
             st.info("ℹ️ Não há dados de horários para exibir")
     
     except Exception as e:
         st.error(f"❌ Erro ao gerar dashboard de horários: {str(e)}")
-    finally:
-        session.close()
+
+def dashboard_historico():
+    """Exibe a evolução da ocupação a partir dos retratos diários"""
+    import plotly.express as px
+    st.subheader("📈 Histórico de Ocupação")
+    
+    try:
+        # Conferência manual dos contadores com a grade (também feita no retrato diário)
+        reconciliado_em = _estado_ocupacao()['reconciliado_em']
+        if reconciliado_em:
+            st.caption(f"Contadores conferidos com a grade em {reconciliado_em.strftime('%d/%m/%Y %H:%M')}")
+        if st.button("🔄 Reconciliar contadores", key="reconciliar_contadores"):
+            with st.spinner("⏳ Conferindo contadores com a grade..."):
+                with sessao_banco() as session:
+                    divergencias = reconciliar_contadores_ocupacao(session)
+            st.success(f"✅ Contadores reconciliados: {len(divergencias)} divergência(s) corrigida(s)")
+        
+        cubo = obter_cubos_ocupacao()['profissionais']
+        unidades = {uid: nome for uid, nome in cubo.rotulos['unidade'].items() if uid != SEM_UNIDADE}
+        
+        # Filtros
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            unidade_selecionada = st.selectbox(
+                "Unidade",
+                _opcoes_rotulos(unidades, "Todas as Unidades"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                key="select_unidade_historico"
+            )
+        with col2:
+            area_selecionada = st.selectbox(
+                "Área de Atuação",
+                _opcoes_rotulos(cubo.rotulos['area'], "Todas as Áreas"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                key="select_area_historico"
+            )
+        with col3:
+            hoje = date.today()
+            periodo = st.date_input(
+                "Período",
+                value=(hoje - timedelta(days=90), hoje),
+                format="DD/MM/YYYY",
+                key="periodo_historico"
+            )
+        with col4:
+            agrupamento = st.selectbox("Agrupar por", ["Dia", "Semana"], key="agrupamento_historico")
+        
+        if len(periodo) != 2:
+            st.info("ℹ️ Selecione a data inicial e a data final")
+            return
+        
+        historico = carregar_historico_ocupacao(
+            periodo[0], periodo[1],
+            _chave_opcao(unidade_selecionada), _chave_opcao(area_selecionada),
+            hoje
+        )
+        
+        if historico.empty:
+            st.info("ℹ️ Não há retratos de ocupação no período selecionado")
+            return
+        
+        historico.index = pd.to_datetime(historico.index)
+        if agrupamento == "Semana":
+            # Média semanal dos retratos diários (semanas iniciando na segunda-feira)
+            historico = historico.resample('W-MON', label='left', closed='left').mean().dropna()
+        
+        capacidade = (historico.sum(axis=1) - historico['Bloqueio']).where(lambda c: c > 0)
+        df = pd.DataFrame({
+            'Data': historico.index,
+            'Taxa de Ocupação (%)': (historico['Em atendimento'] / capacidade * 100).fillna(0).round(2).to_numpy(),
+            'Em Atendimento': historico['Em atendimento'].to_numpy(),
+            'Disponíveis': historico['Disponível'].to_numpy(),
+            'Bloqueados': historico['Bloqueio'].to_numpy()
+        })
+        
+        fig = px.line(
+            df,
+            x='Data',
+            y='Taxa de Ocupação (%)',
+            title='Evolução da Taxa de Ocupação',
+            markers=True
+        )
+        st.plotly_chart(fig)
+        
+        fig = px.area(
+            df,
+            x='Data',
+            y=['Em Atendimento', 'Disponíveis', 'Bloqueados'],
+            title='Horários por Status'
+        )
+        st.plotly_chart(fig)
+    
+    except Exception as e:
+        st.error(f"❌ Erro ao gerar histórico de ocupação: {str(e)}")
+
+def dashboard_agenda_periodo():
+    """Exibe a ocupação da agenda fixa por data, comparada com a capacidade da grade"""
+    import plotly.express as px
+    st.subheader("🗓️ Agenda por Período")
+    
+    try:
+        cubo = obter_cubos_ocupacao()['profissionais']
+        unidades = {uid: nome for uid, nome in cubo.rotulos['unidade'].items() if uid != SEM_UNIDADE}
+        
+        # Filtros
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            unidade_selecionada = st.selectbox(
+                "Unidade",
+                _opcoes_rotulos(unidades, "Todas as Unidades"),
+                format_func=lambda x: x[1] if isinstance(x, tuple) else x,
+                key="select_unidade_agenda_periodo"
+            )
+        with col2:
+            hoje = date.today()
+            periodo = st.date_input(
+                "Período",
+                value=(hoje.replace(day=1), hoje),
+                format="DD/MM/YYYY",
+                key="periodo_agenda"
+            )
+        with col3:
+            dimensoes = {
+                "Data": 'data',
+                "Profissional": 'profissional',
+                "Tipo de Atendimento": 'tipo_atend',
+                "Pagamento": 'pagamento'
+            }
+            agrupar_por = st.selectbox("Agrupar por", list(dimensoes), key="agrupamento_agenda_periodo")
+        
+        if len(periodo) != 2:
+            st.info("ℹ️ Selecione a data inicial e a data final")
+            return
+        inicio, fim = periodo
+        
+        unidade_id = _chave_opcao(unidade_selecionada)
+        df = carregar_agenda_diaria(inicio, fim, unidades.get(unidade_id), geracao_ocupacao())
+        capacidade = capacidade_no_periodo(cubo, inicio, fim, unidade=unidade_id)
+        
+        total_atendimentos = int(df['atendimentos'].sum())
+        total_capacidade = int(capacidade.sum())
+        
+        # Métricas
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Agendamentos", int(df['agendamentos'].sum()))
+        with col2:
+            st.metric("Atendimentos", total_atendimentos)
+        with col3:
+            st.metric("Capacidade no Período", total_capacidade)
+        with col4:
+            taxa = (total_atendimentos / total_capacidade * 100) if total_capacidade > 0 else 0
+            st.metric("Taxa de Ocupação", f"{taxa:.1f}%")
+        
+        if df.empty:
+            st.info("ℹ️ Não há registros da agenda fixa no período selecionado")
+            return
+        
+        coluna = dimensoes[agrupar_por]
+        if coluna == 'data':
+            por_data = df.groupby('data')['atendimentos'].sum()
+            por_data.index = pd.to_datetime(por_data.index)
+            serie = pd.DataFrame({
+                'Data': capacidade.index,
+                'Atendimentos': por_data.reindex(capacidade.index, fill_value=0).to_numpy(),
+                'Capacidade': capacidade.to_numpy()
+            })
+            serie['Taxa de Ocupação (%)'] = (
+                serie['Atendimentos'] / serie['Capacidade'].where(serie['Capacidade'] > 0) * 100
+            ).fillna(0).round(2)
+            
+            fig = px.line(
+                serie,
+                x='Data',
+                y='Taxa de Ocupação (%)',
+                title='Taxa de Ocupação por Data',
+                markers=True
+            )
+            st.plotly_chart(fig)
+        else:
+            resumo = df.groupby(coluna)[['agendamentos', 'atendimentos']].sum()
+            if coluna == 'profissional':
+                # A agenda fixa guarda o nome do profissional; a grade é indexada por ID
+                capacidade_prof = capacidade_no_periodo(cubo, inicio, fim, por='profissional', unidade=unidade_id)
+                capacidade_prof.index = capacidade_prof.index.map(lambda p: cubo.rotulo('profissional', p))
+                resumo['capacidade'] = capacidade_prof.groupby(level=0).sum().reindex(resumo.index, fill_value=0)
+                resumo['taxa'] = (
+                    resumo['atendimentos'] / resumo['capacidade'].where(resumo['capacidade'] > 0) * 100
+                ).fillna(0).round(2)
+            
+            resumo = resumo.sort_values('atendimentos', ascending=False).reset_index()
+            resumo[coluna] = resumo[coluna].replace('', 'Não informado')
+            
+            fig = px.bar(
+                resumo,
+                x=coluna,
+                y='atendimentos',
+                title=f'Atendimentos por {agrupar_por}',
+                labels={coluna: agrupar_por, 'atendimentos': 'Atendimentos'}
+            )
+            st.plotly_chart(fig)
+            
+            with st.expander("📋 Ver tabela"):
+                st.dataframe(resumo.rename(columns={
+                    coluna: agrupar_por,
+                    'agendamentos': 'Agendamentos',
+                    'atendimentos': 'Atendimentos',
+                    'capacidade': 'Capacidade',
+                    'taxa': 'Taxa de Ocupação (%)'
+                }), hide_index=True)
+    
+    except Exception as e:
+        st.error(f"❌ Erro ao gerar agenda por período: {str(e)}")
 
 def editar_grade_profissional(profissional_id):
     """Interface para edição de grade do profissional"""
@@ -3678,6 +4000,7 @@ def editar_grade_profissional(profissional_id):
         # Botão para salvar alterações
         if st.button("💾 Salvar Alterações"):
             try:
+                registrar_alteracao_ocupacao(session, profissional_ids=[profissional_id])
                 session.commit()
                 st.success("✅ Grade atualizada com sucesso!")
             except Exception as e:
@@ -3733,15 +4056,6 @@ HORARIOS_DISPONIVEIS = [
     time(17, 0), time(18, 0)
 ]
 
-def get_session():
-    """Retorna uma sessão do banco de dados"""
-    try:
-        session = Session()
-        return session
-    except Exception as e:
-        logging.error(f"Erro ao criar sessão do banco de dados: {str(e)}")
-        return None
-
 def processar_upload_profissionais(session, df):
     """Processa o upload de profissionais"""
     try:
@@ -3789,66 +4103,66 @@ def processar_upload_profissionais(session, df):
         # Remove linhas com ID inválido
         df = df.dropna(subset=['id_profissional'])
         
-        # Obtém lista de IDs existentes
-        ids_existentes = {p.id for p in session.query(Profissional).all()}
+        # Cadastros de referência carregados uma única vez (ids inexistentes são ignorados, como antes)
+        areas_validas = {id_ for (id_,) in session.query(AreaAtuacao.id)}
+        pagamentos_validos = {id_ for (id_,) in session.query(Pagamento.id)}
+        perfis_validos = {id_ for (id_,) in session.query(PerfilPaciente.id)}
         
         # Inicializa contadores
-        processados = 0
         ignorados = 0
         erros = []
         
-        # Processa cada linha
-        for _, row in df.iterrows():
+        # Monta os registros e as associações desejadas (a última linha de um mesmo ID prevalece)
+        registros = {}
+        areas, pagamentos, perfis = {}, {}, {}
+        for indice, row in df.iterrows():
             try:
-                id_prof = row['id_profissional']
-                
-                if id_prof in ids_existentes:
-                    # Atualiza profissional existente
-                    profissional = session.query(Profissional).filter_by(id=id_prof).first()
-                    profissional.nome = row['nome_profissional']
-                    profissional.nome_conselho = row['nomeconselho']
-                    profissional.registro = row['registro']
-                    profissional.uf = row['uf']
-                    profissional.cbo = row['cbo']
-                    profissional.ativo = row['status']
-                else:
-                    # Cria novo profissional
-                    profissional = Profissional(
-                        id=id_prof,
-                        nome=row['nome_profissional'],
-                        nome_conselho=row['nomeconselho'],
-                        registro=row['registro'],
-                        uf=row['uf'],
-                        cbo=row['cbo'],
-                        ativo=row['status']
-                    )
-                    session.add(profissional)
-                    ids_existentes.add(id_prof)
+                id_prof = int(row['id_profissional'])
+                if pd.isna(row['nome_profissional']) or not str(row['nome_profissional']).strip():
+                    raise ValueError("Nome do profissional não informado")
                 
-                # Atualiza áreas de atuação
-                areas = session.query(AreaAtuacao).filter(AreaAtuacao.id.in_(row['id_area'])).all()
-                profissional.areas_atuacao = areas
-                
-                # Atualiza pagamentos
-                pagamentos = session.query(Pagamento).filter(Pagamento.id.in_(row['id_pagamento'])).all()
-                profissional.pagamentos = pagamentos
-                
-                # Atualiza perfis de paciente
-                perfis = session.query(PerfilPaciente).filter(PerfilPaciente.id.in_(row['perfil_paciente'])).all()
-                profissional.perfis_paciente = perfis
-                
-                processados += 1
+                registros[id_prof] = {
+                    'id': id_prof,
+                    'nome': str(row['nome_profissional']).strip(),
+                    'nome_conselho': row['nomeconselho'] if pd.notna(row['nomeconselho']) else None,
+                    'registro': row['registro'],
+                    'uf': row['uf'] if pd.notna(row['uf']) else None,
+                    'cbo': row['cbo'],
+                    'ativo': bool(row['status'])
+                }
+                areas[id_prof] = set(row['id_area']) & areas_validas
+                pagamentos[id_prof] = set(row['id_pagamento']) & pagamentos_validos
+                perfis[id_prof] = set(row['perfil_paciente']) & perfis_validos
                 
             except Exception as e:
                 ignorados += 1
-                erros.append(f"Erro na linha {_ + 2}: {str(e)}")
+                erros.append(f"Erro na linha {indice + 2}: {str(e)}")
                 continue
         
+        # Profissionais inseridos/atualizados em lote e associações sincronizadas por diferença
+        upsert_em_lote(
+            session,
+            Profissional.__table__,
+            list(registros.values()),
+            chaves=['id'],
+            atualizar=['nome', 'nome_conselho', 'registro', 'uf', 'cbo', 'ativo']
+        )
+        for tabela, coluna, desejados in (
+            (profissional_area_atuacao, 'area_atuacao_id', areas),
+            (profissional_pagamento, 'pagamento_id', pagamentos),
+            (profissional_perfil_paciente, 'perfil_paciente_id', perfis)
+        ):
+            inseridos, removidos = sincronizar_associacao(session, tabela, 'profissional_id', coluna, desejados)
+            logging.info(f"{tabela.name}: {inseridos} associação(ões) incluída(s), {removidos} removida(s)")
+        
         # Commit das alterações
+        registrar_alteracao_ocupacao(session, profissional_ids=[])
         session.commit()
+        otimizar_apos_importacao(session, ['profissionais', 'profissional_area_atuacao', 'profissional_pagamento', 'profissional_perfil_paciente'])
         
+        # Profissionais distintos gravados (IDs repetidos contam uma vez)
         return {
-            'processados': processados,
+            'processados': len(registros),
             'ignorados': ignorados,
             'erros': erros
         }
@@ -3869,7 +4183,7 @@ def gerar_template_agenda_fixa(nome_arquivo):
 def exibir_amostra_disponibilidade():
     """Exibe uma amostra dos dados da tabela disponibilidade"""
     try:
-        session = get_session()
+        session = get_session(leitura=True)
         if not session:
             st.error("❌ Erro ao conectar ao banco de dados")
             return
@@ -3899,12 +4213,11 @@ def exibir_amostra_disponibilidade():
             
             st.dataframe(dados)
             
-            # Exibir estatísticas
-            total_registros = session.query(Disponibilidade).count()
-            total_bloqueios = session.query(Disponibilidade).filter_by(status="Bloqueio").count()
+            # Exibir estatísticas (lidas dos contadores de ocupação)
+            totais = obter_totais_ocupacao(session)
             
-            st.write(f"Total de registros na tabela: {total_registros}")
-            st.write(f"Total de bloqueios: {total_bloqueios}")
+            st.write(f"Total de registros na tabela: {sum(totais.values())}")
+            st.write(f"Total de bloqueios: {totais.get('Bloqueio', 0)}")
             
             # Exibir tipos de dados
             st.subheader("📝 Tipos de Dados")
@@ -3927,25 +4240,14 @@ def gerar_template_pacientes(nome_arquivo: str):
     return gerar_template_excel(nome_arquivo, colunas)
 
 def processar_upload_pacientes(df: pd.DataFrame) -> dict:
-    """Processa o arquivo de upload de pacientes"""
+    """Processa o arquivo de upload de pacientes (upsert em lote, sem apagar o histórico)"""
+    session = None
     try:
         session = get_session()
         if not session:
             raise Exception("Erro ao conectar ao banco de dados")
-            
-        registros_processados = 0
-        registros_ignorados = 0
-        erros = []
         
-        # Limpar tabelas existentes
-        try:
-            session.query(Carteira).delete()
-            session.query(Paciente).delete()
-            session.commit()
-            logging.info("Tabelas de pacientes e carteiras limpas com sucesso")
-        except Exception as e:
-            session.rollback()
-            raise Exception(f"Erro ao limpar tabelas: {str(e)}")
+        erros = []
         
         # Verificar colunas obrigatórias e normalizar nomes
         colunas_esperadas = {
@@ -3964,61 +4266,89 @@ def processar_upload_pacientes(df: pd.DataFrame) -> dict:
         # Renomear colunas para o formato interno
         df = df.rename(columns=colunas_esperadas)
         
-        # Processar cada linha
-        for idx, row in df.iterrows():
-            try:
-                # Normalizar dados
-                numero_carteira = str(row['numero_carteira']).strip()
-                # Converter ID do paciente para inteiro, removendo decimais
-                id_paciente = int(float(row['id_paciente_carteira']))
-                nome_paciente = str(row['nome_paciente']).strip()
-                id_pagamento = int(float(row['id_pagamento']))
-                status = str(row['status']).strip()
-                
-                # Validar status
-                status_normalizado = status.lower()
-                if status_normalizado in ['ativo', 'sim']:
-                    status = 'Ativo'
-                elif status_normalizado in ['inativo', 'não', 'nao']:
-                    status = 'Inativo'
-                else:
-                    status = 'Ativo'  # Default para status inválido
-                
-                # Verificar pagamento
-                pagamento = session.query(Pagamento).get(id_pagamento)
-                if not pagamento:
-                    erros.append(f"Pagamento não encontrado na linha {idx+2}: ID {id_pagamento}")
-                    registros_ignorados += 1
-                    continue
-                
-                # Criar paciente
-                paciente = Paciente(
-                    id_paciente_carteira=id_paciente,
-                    nome=nome_paciente
-                )
-                session.add(paciente)
-                session.flush()  # Para obter o ID do paciente
-                
-                # Criar carteira
-                nova_carteira = Carteira(
-                    numero_carteira=numero_carteira,
-                    id_pagamento=id_pagamento,
-                    status=status,
-                    paciente_id=paciente.id
-                )
-                session.add(nova_carteira)
-                
-                registros_processados += 1
-                
-            except Exception as e:
-                erros.append(f"Erro ao processar linha {idx+2}: {str(e)}")
-                registros_ignorados += 1
-                continue
+        # Normalizar dados (linha do Excel = índice + 2)
+        dados = pd.DataFrame({
+            'linha': df.index + 2,
+            'numero_carteira': df['numero_carteira'].astype(str).str.strip(),
+            # IDs convertidos para inteiro, removendo decimais
+            'id_paciente_carteira': pd.to_numeric(df['id_paciente_carteira'], errors='coerce'),
+            'nome': df['nome_paciente'].astype(str).str.strip(),
+            'id_pagamento': pd.to_numeric(df['id_pagamento'], errors='coerce')
+        })
+        
+        # Validar status (valores inválidos viram "Ativo")
+        status = df['status'].astype(str).str.strip().str.lower()
+        dados['status'] = np.where(status.isin(['inativo', 'não', 'nao']), 'Inativo', 'Ativo')
+        
+        # Linhas sem IDs inteiros (12.5 não pode virar 12 e gravar sobre outro paciente)
+        invalidas = pd.Series(False, index=dados.index)
+        for coluna in ('id_paciente_carteira', 'id_pagamento'):
+            invalidas |= dados[coluna].isna() | (dados[coluna] % 1 != 0)
+        for linha in dados.loc[invalidas, 'linha']:
+            erros.append(f"Erro ao processar linha {linha}: ID do paciente ou do pagamento inválido (deve ser inteiro)")
+        dados = dados[~invalidas].astype({'id_paciente_carteira': 'int64', 'id_pagamento': 'int64'})
+        
+        # Verificar pagamentos (IDs válidos carregados uma única vez)
+        pagamentos_validos = {p.id for p in session.query(Pagamento.id).all()}
+        sem_pagamento = ~dados['id_pagamento'].isin(pagamentos_validos)
+        for linha, id_pagamento in dados.loc[sem_pagamento, ['linha', 'id_pagamento']].itertuples(index=False):
+            erros.append(f"Pagamento não encontrado na linha {linha}: ID {id_pagamento}")
+        dados = dados[~sem_pagamento]
+        
+        agora = datetime.now()
+        
+        # Upsert dos pacientes pelo ID externo (a última linha do arquivo prevalece)
+        pacientes = dados.drop_duplicates('id_paciente_carteira', keep='last')
+        upsert_em_lote(
+            session,
+            Paciente.__table__,
+            [
+                {'id_paciente_carteira': int(id_externo), 'nome': nome, 'created_at': agora, 'updated_at': agora}
+                for id_externo, nome in pacientes[['id_paciente_carteira', 'nome']].itertuples(index=False)
+            ],
+            chaves=['id_paciente_carteira'],
+            atualizar=['nome', 'updated_at']
+        )
         
+        # IDs internos dos pacientes, para vincular as carteiras
+        ids_pacientes = dict(session.query(Paciente.id_paciente_carteira, Paciente.id).all())
+        dados = dados.assign(paciente_id=dados['id_paciente_carteira'].map(ids_pacientes))
+        
+        # Upsert das carteiras por (paciente, número, pagamento), com os componentes do número
+        carteiras = dados.drop_duplicates(['paciente_id', 'numero_carteira', 'id_pagamento'], keep='last')
+        carteiras = pd.concat(
+            [carteiras, decompor_carteiras(carteiras['numero_carteira']).set_axis(carteiras.index)],
+            axis=1
+        )
+        upsert_em_lote(
+            session,
+            Carteira.__table__,
+            [
+                {
+                    'paciente_id': int(registro['paciente_id']),
+                    'numero_carteira': registro['numero_carteira'],
+                    'id_pagamento': int(registro['id_pagamento']),
+                    'status': registro['status'],
+                    **{campo: registro[campo] for campo in CAMPOS_CARTEIRA},
+                    'created_at': agora,
+                    'updated_at': agora
+                }
+                for registro in carteiras.to_dict('records')
+            ],
+            chaves=['paciente_id', 'numero_carteira', 'id_pagamento'],
+            atualizar=['status', 'updated_at']
+        )
+        
+        # Liga à agenda fixa os pacientes que acabaram de ser cadastrados
+        vincular_agenda_fixa(session)
         session.commit()
+        otimizar_apos_importacao(session, ['pacientes', 'carteiras'])
+        logging.info(f"Upload de pacientes: {len(pacientes)} paciente(s) e {len(carteiras)} carteira(s) gravados")
+        # Pacientes e carteiras distintos gravados (linhas repetidas contam uma vez)
         return {
-            'processados': registros_processados,
-            'ignorados': registros_ignorados,
+            'processados': len(pacientes),
+            'carteiras': len(carteiras),
+            'ignorados': len(erros),
             'erros': erros
         }
         
@@ -4026,6 +4356,303 @@ def processar_upload_pacientes(df: pd.DataFrame) -> dict:
         if session:
             session.rollback()
         raise Exception(f"Erro ao processar arquivo: {str(e)}")
+    finally:
+        if session:
+            session.close()
+
+# Pacientes por página na lista de pacientes
+TAMANHO_PAGINA_PACIENTES = int(os.getenv('TAMANHO_PAGINA_PACIENTES', '50'))
+
+def _filtro_busca_pacientes(busca):
+    """Condição de busca por prefixo do nome, ID do paciente ou prefixo do número da carteira"""
+    termo = busca.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    condicoes = [
+        Paciente.nome.ilike(f"{termo}%", escape='\\'),
+        Carteira.numero_carteira.like(f"{termo}%", escape='\\'),
+        # Número parcial: início da base da carteira (ex.: '391158' em '0064.8000.391158.00-0')
+        Carteira.base.like(f"{termo}%", escape='\\')
+    ]
+    if busca.strip().isdigit():
+        condicoes.append(Paciente.id_paciente_carteira == int(busca.strip()))
+    return or_(*condicoes)
+
+def _pacientes_encontrados(busca=''):
+    """SELECT dos IDs dos pacientes que atendem à busca"""
+    encontrados = select(Paciente.id).outerjoin(Carteira, Carteira.paciente_id == Paciente.id)
+    if busca and busca.strip():
+        encontrados = encontrados.where(_filtro_busca_pacientes(busca))
+    return encontrados.distinct()
+
+def contar_pacientes(session, busca=''):
+    """Quantidade de pacientes que atendem à busca"""
+    return session.execute(
+        select(func.count()).select_from(_pacientes_encontrados(busca).subquery())
+    ).scalar() or 0
+
+def consultar_pagina_pacientes(session, busca='', pagina=1, tamanho=TAMANHO_PAGINA_PACIENTES):
+    """Retorna um DataFrame da página de pacientes, uma linha por carteira, com o nome do pagamento.
+    
+    A página de pacientes é selecionada em uma subconsulta e carregada com as
+    carteiras e os nomes dos pagamentos em uma única consulta com junções.
+    """
+    encontrados = _pacientes_encontrados(busca)
+    pagina_ids = (
+        select(Paciente.id)
+        .where(Paciente.id.in_(encontrados))
+        .order_by(Paciente.nome, Paciente.id)
+        .limit(tamanho)
+        .offset((pagina - 1) * tamanho)
+    )
+    linhas = session.query(
+        Paciente.id,
+        Paciente.id_paciente_carteira,
+        Paciente.nome,
+        Carteira.numero_carteira,
+        Carteira.status,
+        Pagamento.nome
+    ).outerjoin(
+        Carteira, Carteira.paciente_id == Paciente.id
+    ).outerjoin(
+        Pagamento, Pagamento.id == Carteira.id_pagamento
+    ).filter(
+        Paciente.id.in_(pagina_ids)
+    ).order_by(Paciente.nome, Paciente.id, Carteira.numero_carteira).all()
+    
+    return pd.DataFrame(
+        linhas,
+        columns=['id', 'id_paciente_carteira', 'nome', 'numero_carteira', 'status', 'pagamento']
+    )
+
+def exibir_lista_pacientes(session):
+    """Lista paginada e pesquisável de pacientes, com detalhes sob demanda"""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        busca = st.text_input(
+            "🔍 Buscar",
+            placeholder="Início do nome, ID do paciente, número da carteira ou base da carteira",
+            key="busca_pacientes"
+        )
+    
+    # Volta para a primeira página quando a busca muda
+    if st.session_state.get('busca_pacientes_anterior') != busca:
+        st.session_state['busca_pacientes_anterior'] = busca
+        st.session_state['pagina_pacientes'] = 1
+    
+    total = contar_pacientes(session, busca)
+    if total == 0:
+        st.info("ℹ️ Nenhum paciente encontrado" if busca else "ℹ️ Nenhum paciente cadastrado")
+        return
+    
+    total_paginas = (total + TAMANHO_PAGINA_PACIENTES - 1) // TAMANHO_PAGINA_PACIENTES
+    if st.session_state.get('pagina_pacientes', 1) > total_paginas:
+        st.session_state['pagina_pacientes'] = total_paginas
+    with col2:
+        pagina = st.number_input(
+            f"Página (de {total_paginas})",
+            min_value=1,
+            max_value=total_paginas,
+            step=1,
+            key="pagina_pacientes"
+        )
+    
+    df = consultar_pagina_pacientes(session, busca, int(pagina))
+    st.caption(f"{total} paciente(s) encontrado(s)")
+    
+    # Uma linha por paciente, com as carteiras resumidas
+    df['carteira'] = np.where(
+        df['numero_carteira'].notna(),
+        df['numero_carteira'].fillna('') + ' (' + df['pagamento'].fillna('N/A') + ', ' + df['status'].fillna('') + ')',
+        ''
+    )
+    resumo = df.groupby(['id', 'nome', 'id_paciente_carteira'], sort=False)['carteira'].agg(
+        lambda carteiras: '; '.join(c for c in carteiras if c)
+    ).reset_index()
+    
+    st.dataframe(
+        resumo[['nome', 'id_paciente_carteira', 'carteira']],
+        column_config={
+            'nome': st.column_config.TextColumn("Nome"),
+            'id_paciente_carteira': st.column_config.NumberColumn("ID Paciente", format="%d"),
+            'carteira': st.column_config.TextColumn("Carteiras")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    # Detalhes sob demanda
+    paciente_id = st.selectbox(
+        "Ver detalhes do paciente",
+        [None] + resumo['id'].tolist(),
+        format_func=lambda pid: "Selecione..." if pid is None else (
+            f"{resumo.loc[resumo['id'] == pid, 'nome'].iloc[0]} "
+            f"(ID: {resumo.loc[resumo['id'] == pid, 'id_paciente_carteira'].iloc[0]})"
+        ),
+        key="detalhe_paciente"
+    )
+    if paciente_id is None:
+        return
+    
+    carteiras = df[(df['id'] == paciente_id) & df['numero_carteira'].notna()]
+    paciente = resumo[resumo['id'] == paciente_id].iloc[0]
+    with st.expander(f"📋 {paciente['nome']} (ID: {paciente['id_paciente_carteira']})", expanded=True):
+        # Informações do paciente
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.write("**Nome:**", paciente['nome'])
+            st.write("**ID Paciente:**", paciente['id_paciente_carteira'])
+            
+            # Carteiras do paciente
+            st.write("**Carteiras:**")
+            for carteira in carteiras.itertuples(index=False):
+                status_color = "🟢" if carteira.status == "Ativo" else "🔴"
+                st.write(f"{status_color} Carteira: {carteira.numero_carteira}")
+                st.write(f"   Pagamento: {carteira.pagamento or 'N/A'}")
+                st.write(f"   Status: {carteira.status}")
+        
+        with col2:
+            if st.button("🗑️ Excluir", key=f"del_{paciente_id}"):
+                try:
+                    session.delete(session.get(Paciente, int(paciente_id)))
+                    session.commit()
+                    st.success("✅ Paciente excluído com sucesso!")
+                    st.rerun()
+                except Exception as e:
+                    session.rollback()
+                    st.error(f"❌ Erro ao excluir paciente: {str(e)}")
+
+# Propostas exibidas por vez na aba de duplicados
+LIMITE_PROPOSTAS_DUPLICADOS = 50
+
+def vincular_nome_agenda(session, nome_agenda, paciente, paciente_anterior_id=None):
+    """Substitui o nome livre do paciente na agenda fixa pelo paciente cadastrado (nome e chave); retorna as linhas alteradas.
+
+    Só altera as linhas sem paciente vinculado ou, na mesclagem, vinculadas a `paciente_anterior_id`;
+    linhas de outro paciente com o mesmo nome não são tocadas.
+    """
+    vinculo = AgendaFixa.paciente_id.is_(None)
+    if paciente_anterior_id is not None:
+        vinculo = vinculo | (AgendaFixa.paciente_id == paciente_anterior_id)
+    resultado = session.execute(
+        update(AgendaFixa).where(AgendaFixa.paciente == nome_agenda, vinculo)
+        .values(paciente=paciente.nome, paciente_id=paciente.id)
+    )
+    return resultado.rowcount
+
+def mesclar_pacientes(session, manter_id, remover_id):
+    """Mescla o paciente `remover_id` em `manter_id`: religa carteiras e linhas da agenda fixa e remove o duplicado"""
+    manter = session.get(Paciente, manter_id)
+    remover = session.get(Paciente, remover_id)
+    if not manter or not remover or manter.id == remover.id:
+        raise ValueError("Pacientes inválidos para mesclagem")
+    
+    # Carteiras que o paciente mantido já possui são descartadas (chave única paciente/número/pagamento)
+    chaves_mantidas = set(
+        session.query(Carteira.numero_carteira, Carteira.id_pagamento)
+        .filter(Carteira.paciente_id == manter_id).all()
+    )
+    repetidas = [
+        carteira.id
+        for carteira in session.query(Carteira.id, Carteira.numero_carteira, Carteira.id_pagamento)
+        .filter(Carteira.paciente_id == remover_id).all()
+        if (carteira.numero_carteira, carteira.id_pagamento) in chaves_mantidas
+    ]
+    if repetidas:
+        session.execute(delete(Carteira).where(Carteira.id.in_(repetidas)))
+    session.execute(
+        update(Carteira).where(Carteira.paciente_id == remover_id).values(paciente_id=manter_id)
+    )
+    
+    linhas_agenda = vincular_nome_agenda(session, remover.nome, manter, paciente_anterior_id=remover_id)
+    session.execute(
+        update(AgendaFixa).where(AgendaFixa.paciente_id == remover_id)
+        .values(paciente=manter.nome, paciente_id=manter_id)
+    )
+    session.execute(delete(Paciente).where(Paciente.id == remover_id))
+    logging.info(
+        f"Paciente {remover_id} mesclado em {manter_id}: {len(repetidas)} carteira(s) repetida(s) removida(s), "
+        f"{linhas_agenda} linha(s) da agenda religada(s)"
+    )
+
+def exibir_duplicados_pacientes(session):
+    """Propõe e aplica mesclagens de pacientes duplicados e de nomes da agenda fixa sem cadastro"""
+    st.write("### Pacientes Duplicados")
+    
+    limiar = st.slider("Similaridade mínima (%)", 70, 100, LIMIAR_SIMILARIDADE, key="limiar_duplicados")
+    if st.button("🔍 Procurar duplicados"):
+        with st.spinner("⏳ Comparando nomes..."):
+            pacientes = [(p.id, p.nome) for p in session.query(Paciente.id, Paciente.nome).all()]
+            nomes_cadastrados = {nome for _, nome in pacientes}
+            # Nomes livres da agenda fixa ainda sem paciente vinculado
+            nomes_agenda = [
+                (nome, nome)
+                for (nome,) in session.query(AgendaFixa.paciente).filter(
+                    AgendaFixa.paciente_id.is_(None),
+                    AgendaFixa.paciente.isnot(None), AgendaFixa.paciente != ''
+                ).distinct().all()
+                if nome not in nomes_cadastrados
+            ]
+            st.session_state['duplicados_pacientes'] = propor_duplicados(pacientes, limiar=limiar)
+            st.session_state['duplicados_agenda'] = propor_duplicados(pacientes, nomes_agenda, limiar=limiar)
+    
+    duplicados = st.session_state.get('duplicados_pacientes')
+    if duplicados is None:
+        st.info("ℹ️ Clique em \"Procurar duplicados\" para analisar os cadastros")
+        return
+    
+    st.write(f"**Cadastros semelhantes:** {len(duplicados)} par(es)")
+    for proposta in duplicados.head(LIMITE_PROPOSTAS_DUPLICADOS).itertuples(index=False):
+        col1, col2, col3, col4 = st.columns([3, 3, 1, 2])
+        with col1:
+            st.write(f"🅰️ {proposta.nome_a} (ID {proposta.id_a})")
+        with col2:
+            st.write(f"🅱️ {proposta.nome_b} (ID {proposta.id_b})")
+        with col3:
+            st.write(f"{proposta.pontuacao:.0f}%")
+        with col4:
+            manter_a = st.button("Manter 🅰️", key=f"mesclar_{proposta.id_a}_{proposta.id_b}_a")
+            manter_b = st.button("Manter 🅱️", key=f"mesclar_{proposta.id_a}_{proposta.id_b}_b")
+        if manter_a or manter_b:
+            manter_id, remover_id = (proposta.id_a, proposta.id_b) if manter_a else (proposta.id_b, proposta.id_a)
+            try:
+                mesclar_pacientes(session, int(manter_id), int(remover_id))
+                session.commit()
+                # Descarta as propostas que envolviam o paciente removido
+                st.session_state['duplicados_pacientes'] = duplicados[
+                    (duplicados['id_a'] != remover_id) & (duplicados['id_b'] != remover_id)
+                ]
+                agenda = st.session_state.get('duplicados_agenda')
+                if agenda is not None:
+                    st.session_state['duplicados_agenda'] = agenda[agenda['id_a'] != remover_id]
+                st.success("✅ Pacientes mesclados com sucesso!")
+                st.rerun()
+            except Exception as e:
+                session.rollback()
+                st.error(f"❌ Erro ao mesclar pacientes: {str(e)}")
+    
+    agenda = st.session_state.get('duplicados_agenda')
+    if agenda is None or agenda.empty:
+        return
+    
+    st.write(f"**Nomes da agenda fixa sem cadastro:** {len(agenda)} proposta(s)")
+    for proposta in agenda.head(LIMITE_PROPOSTAS_DUPLICADOS).itertuples(index=False):
+        col1, col2, col3, col4 = st.columns([3, 3, 1, 2])
+        with col1:
+            st.write(f"📅 {proposta.nome_b}")
+        with col2:
+            st.write(f"👤 {proposta.nome_a} (ID {proposta.id_a})")
+        with col3:
+            st.write(f"{proposta.pontuacao:.0f}%")
+        with col4:
+            if st.button("🔗 Vincular", key=f"vincular_{proposta.id_a}_{proposta.nome_b}"):
+                try:
+                    linhas = vincular_nome_agenda(session, proposta.nome_b, session.get(Paciente, int(proposta.id_a)))
+                    session.commit()
+                    st.session_state['duplicados_agenda'] = agenda[agenda['nome_b'] != proposta.nome_b]
+                    st.success(f"✅ {linhas} linha(s) da agenda vinculada(s)")
+                    st.rerun()
+                except Exception as e:
+                    session.rollback()
+                    st.error(f"❌ Erro ao vincular nome da agenda: {str(e)}")
 
 def gerenciar_pacientes():
     """Interface para gerenciamento de pacientes"""
@@ -4044,44 +4671,12 @@ def gerenciar_pacientes():
             return
         
         # Criar abas
-        tab_lista, tab_cadastro, tab_upload = st.tabs(["📋 Lista", "➕ Cadastro", "📤 Upload"])
+        tab_lista, tab_cadastro, tab_upload, tab_duplicados = st.tabs(
+            ["📋 Lista", "➕ Cadastro", "📤 Upload", "🔗 Duplicados"]
+        )
         
         with tab_lista:
-            # Lista de pacientes
-            pacientes = session.query(Paciente).all()
-            
-            if not pacientes:
-                st.info("ℹ️ Nenhum paciente cadastrado")
-            else:
-                # Exibir pacientes em uma tabela expansível
-                for paciente in pacientes:
-                    with st.expander(f"📋 {paciente.nome} (ID: {paciente.id_paciente_carteira})"):
-                        # Informações do paciente
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.write("**Nome:**", paciente.nome)
-                            st.write("**ID Paciente:**", paciente.id_paciente_carteira)
-                            
-                            # Carteiras do paciente
-                            st.write("**Carteiras:**")
-                            for carteira in paciente.carteiras:
-                                status_color = "🟢" if carteira.status == "Ativo" else "🔴"
-                                pagamento = session.query(Pagamento).get(carteira.id_pagamento)
-                                nome_pagamento = pagamento.nome if pagamento else "N/A"
-                                st.write(f"{status_color} Carteira: {carteira.numero_carteira}")
-                                st.write(f"   Pagamento: {nome_pagamento}")
-                                st.write(f"   Status: {carteira.status}")
-                        
-                        with col2:
-                            if st.button("🗑️ Excluir", key=f"del_{paciente.id}"):
-                                try:
-                                    session.delete(paciente)
-                                    session.commit()
-                                    st.success("✅ Paciente excluído com sucesso!")
-                                    st.rerun()
-                                except Exception as e:
-                                    session.rollback()
-                                    st.error(f"❌ Erro ao excluir paciente: {str(e)}")
+            exibir_lista_pacientes(session)
         
         with tab_cadastro:
             # Formulário para cadastro/edição
@@ -4162,8 +4757,12 @@ def gerenciar_pacientes():
                         session.rollback()
                         st.error(f"❌ Erro ao salvar paciente: {str(e)}")
         
+        with tab_duplicados:
+            exibir_duplicados_pacientes(session)
+        
         with tab_upload:
             st.write("### Upload de Pacientes")
+            st.caption("ℹ️ Pacientes e carteiras já cadastrados são atualizados; nenhum registro é apagado.")
             
             # Botão para download do template
             if st.button("📥 Download Template"):
@@ -4171,12 +4770,12 @@ def gerenciar_pacientes():
                 st.success("✅ Template gerado com sucesso!")
             
             # Upload do arquivo
-            uploaded_file = st.file_uploader("Escolha o arquivo Excel", type=['xlsx'])
+            uploaded_file = st.file_uploader("Escolha o arquivo Excel", type=FORMATOS_UPLOAD)
             
             if uploaded_file is not None:
                 try:
-                    # Ler arquivo Excel
-                    df = pd.read_excel(uploaded_file)
+                    # Ler arquivo (Excel, CSV ou Parquet)
+                    df = ler_upload(uploaded_file)
                     
                     # Exibir preview dos dados
                     st.write("Preview dos dados:")
@@ -4191,10 +4790,12 @@ def gerenciar_pacientes():
                                 st.success("✅ Arquivo processado com sucesso!")
                                 
                                 # Exibir estatísticas
-                                col1, col2 = st.columns(2)
+                                col1, col2, col3 = st.columns(3)
                                 with col1:
-                                    st.metric("Registros Processados", resultado['processados'])
+                                    st.metric("Pacientes Processados", resultado['processados'])
                                 with col2:
+                                    st.metric("Carteiras Processadas", resultado['carteiras'])
+                                with col3:
                                     st.metric("Registros Ignorados", resultado['ignorados'])
                                 
                                 if resultado['erros']:
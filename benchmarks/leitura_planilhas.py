@@ -0,0 +1,54 @@
+"""Compara o tempo de leitura de uma planilha com pd.read_excel e com leitura.ler_planilha.
+
+Mede a leitura padrão (openpyxl completo), a camada de leitura com todas as colunas
+e a camada de leitura apenas com as colunas da agenda fixa. O resultado é a mediana
+em milissegundos.
+
+Uso:
+    python benchmarks/leitura_planilhas.py [--repeticoes 5] [arquivo.xlsx]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import pandas as pd  # noqa: E402
+
+from leitura import MOTOR_XLSX, ler_planilha  # noqa: E402
+
+# Mesmas colunas lidas no upload da agenda fixa (app.COLUNAS_AGENDA_FIXA)
+COLUNAS_AGENDA = [
+    "Id Profissional", "Data", "Hora inicial", "Hora Inicial", "Unidade", "Sala", "Profissional",
+    "Tipo Atend", "Codigo Faturamento", "Qtd Sess", "Pagamento", "Paciente"
+]
+
+def medir(funcao, repeticoes):
+    """Mediana, em milissegundos, do tempo de execução da função"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('arquivo', nargs='?', default=os.path.join(RAIZ, 'temp_agenda fixa.xlsx'))
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    casos = [
+        ('pd.read_excel', lambda: pd.read_excel(args.arquivo)),
+        (f'ler_planilha ({MOTOR_XLSX})', lambda: ler_planilha(args.arquivo)),
+        ('ler_planilha, colunas da agenda', lambda: ler_planilha(args.arquivo, colunas=COLUNAS_AGENDA)),
+    ]
+    print(f"{'Leitura':<36} {'Mediana (ms)':>14}")
+    for nome, funcao in casos:
+        print(f"{nome:<36} {medir(funcao, args.repeticoes):>14.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Compara a latência de importação e de dashboard no SQLite com e sem o perfil de desempenho.
+
+Para cada modo cria um banco SQLite temporário e mede:
+- importação: inclusão de registros da agenda fixa com commit a cada lote
+  (como nos uploads da aplicação);
+- dashboard: construção do cubo de ocupação dos profissionais e reconstrução
+  da agenda diária.
+
+Uso:
+    python benchmarks/perfil_sqlite.py [--registros 20000] [--profissionais 300] [--lote 100]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# database.py cria o engine na importação; o benchmark usa os próprios engines
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import Base, criar_engine  # noqa: E402
+from models import AgendaFixa, Disponibilidade, Profissional, Unidade  # noqa: E402
+from ocupacao import DIAS_GRADE, atualizar_agenda_diaria, construir_cubo_profissionais  # noqa: E402
+
+HORARIOS = [f"{h:02d}:00" for h in range(7, 19)]
+STATUS = ['Disponível', 'Em atendimento', 'Bloqueio']
+
+def preparar_grade(session, profissionais):
+    """Cria unidades, profissionais e a grade semanal de disponibilidade"""
+    session.add_all([Unidade(id=i, nome=f"Unidade {i}") for i in range(1, 6)])
+    session.add_all([Profissional(id=i, nome=f"Profissional {i}") for i in range(1, profissionais + 1)])
+    session.bulk_insert_mappings(Disponibilidade, [
+        {
+            'profissional_id': p,
+            'unidade_id': random.randint(1, 5),
+            'dia_semana': dia,
+            'hora_inicio': hora,
+            'hora_fim': hora,
+            'periodo': 'Matutino' if hora < '13:00' else 'Vespertino',
+            'status': random.choice(STATUS)
+        }
+        for p in range(1, profissionais + 1) for dia in DIAS_GRADE for hora in HORARIOS
+    ])
+    session.commit()
+
+def medir_importacao(session, registros, profissionais, lote):
+    """Inclui registros da agenda fixa com commit a cada `lote` registros; retorna segundos"""
+    inicio_datas = date.today().replace(day=1)
+    inicio = time.perf_counter()
+    for i in range(registros):
+        data = inicio_datas + timedelta(days=i % 60)
+        session.add(AgendaFixa(
+            data=data,
+            dia_semana='Segunda-feira',
+            horario=random.choice(HORARIOS),
+            unidade=f"Unidade {random.randint(1, 5)}",
+            profissional=f"Profissional {random.randint(1, profissionais)}",
+            tipo_atend='Sessão',
+            pagamento=random.choice(['Particular', 'Convênio']),
+            paciente=f"Paciente {i}"
+        ))
+        if (i + 1) % lote == 0:
+            session.commit()
+    session.commit()
+    return time.perf_counter() - inicio
+
+def medir_dashboard(Sessao, repeticoes):
+    """Tempo médio (s) para montar o cubo de profissionais e reconstruir a agenda diária"""
+    tempos = []
+    for _ in range(repeticoes):
+        session = Sessao()
+        try:
+            inicio = time.perf_counter()
+            construir_cubo_profissionais(session)
+            atualizar_agenda_diaria(session)
+            session.commit()
+            tempos.append(time.perf_counter() - inicio)
+        finally:
+            session.close()
+    return statistics.mean(tempos)
+
+def executar(perfil, args):
+    """Executa o benchmark em um banco temporário; retorna (importação, dashboard) em segundos"""
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as diretorio:
+        url = f"sqlite:///{os.path.join(diretorio, 'benchmark.sqlite')}"
+        engine = criar_engine(url, perfil_sqlite=perfil)
+        Base.metadata.create_all(engine)
+        Sessao = sessionmaker(bind=engine)
+        
+        session = Sessao()
+        try:
+            preparar_grade(session, args.profissionais)
+            importacao = medir_importacao(session, args.registros, args.profissionais, args.lote)
+        finally:
+            session.close()
+        
+        dashboard = medir_dashboard(Sessao, args.repeticoes)
+        engine.dispose()
+    return importacao, dashboard
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--registros', type=int, default=20000)
+    parser.add_argument('--profissionais', type=int, default=300)
+    parser.add_argument('--lote', type=int, default=100)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+    
+    print(f"{'Modo':<12} {'Importação (s)':>16} {'Dashboard (ms)':>16}")
+    for nome, perfil in (('padrão', False), ('perfil', True)):
+        importacao, dashboard = executar(perfil, args)
+        print(f"{nome:<12} {importacao:>16.2f} {dashboard * 1000:>16.1f}")
+
+if __name__ == '__main__':
+    main()
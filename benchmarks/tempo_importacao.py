@@ -0,0 +1,67 @@
+"""Mede o tempo de importação dos módulos da aplicação e das bibliotecas pesadas.
+
+Cada módulo é importado em um processo Python novo (importação a frio), repetido
+algumas vezes; o resultado é a mediana em milissegundos.
+
+Uso:
+    python benchmarks/tempo_importacao.py [--repeticoes 5] [modulo ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS_PADRAO = [
+    'pandas',
+    'numpy',
+    'sqlalchemy',
+    'streamlit',
+    'plotly.express',
+    'database',
+    'models',
+    'ocupacao',
+]
+
+CODIGO = (
+    "import time; inicio = time.perf_counter(); import {modulo}; "
+    "print((time.perf_counter() - inicio) * 1000)"
+)
+
+def medir(modulo, repeticoes):
+    """Retorna os tempos (ms) de importação a frio do módulo"""
+    ambiente = dict(os.environ)
+    # database.py cria o engine na importação; sem .env usa um SQLite em memória
+    ambiente.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+    tempos = []
+    for _ in range(repeticoes):
+        resultado = subprocess.run(
+            [sys.executable, '-c', CODIGO.format(modulo=modulo)],
+            cwd=RAIZ,
+            env=ambiente,
+            capture_output=True,
+            text=True
+        )
+        if resultado.returncode != 0:
+            raise RuntimeError(resultado.stderr.strip().splitlines()[-1])
+        tempos.append(float(resultado.stdout.strip().splitlines()[-1]))
+    return tempos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modulos', nargs='*', default=MODULOS_PADRAO)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+    
+    print(f"{'Módulo':<20} {'Mediana (ms)':>14} {'Mínimo (ms)':>14}")
+    for modulo in args.modulos:
+        try:
+            tempos = medir(modulo, args.repeticoes)
+            print(f"{modulo:<20} {statistics.median(tempos):>14.1f} {min(tempos):>14.1f}")
+        except RuntimeError as e:
+            print(f"{modulo:<20} {'erro':>14}   {e}")
+
+if __name__ == '__main__':
+    main()
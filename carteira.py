@@ -0,0 +1,38 @@
+"""Decomposição dos números de carteira no formato 'operadora.plano.base.dependencia-digito'.
+
+Exemplo: '0064.8000.391158.00-0' -> operadora '0064', plano '8000', base '391158',
+dependência '00' e dígito '0'. Usado pelo app (ao gravar carteiras) e pelo ImportBaseGuias.py.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+CAMPOS_CARTEIRA = ('operadora', 'plano', 'base', 'dependencia', 'digito')
+
+ComponentesCarteira = namedtuple('ComponentesCarteira', CAMPOS_CARTEIRA)
+
+# Mesma regra de decompor_carteira: três pontos, depois o primeiro traço (opcional)
+PADRAO_CARTEIRA = r'^([^.]*)\.([^.]*)\.([^.]*)\.([^-]*)-?(.*)$'
+
+@lru_cache(maxsize=4096)
+def decompor_carteira(numero):
+    """Retorna os ComponentesCarteira do número, ou None se não estiver no formato esperado"""
+    if not isinstance(numero, str):
+        return None
+    try:
+        # Divide nos três primeiros pontos
+        operadora, resto = numero.strip().split('.', 1)
+        plano, resto = resto.split('.', 1)
+        base, resto = resto.split('.', 1)
+    except ValueError:
+        return None
+    # Divide o restante com base no primeiro traço
+    dependencia, _, digito = resto.partition('-')
+    return ComponentesCarteira(*(parte.strip() for parte in (operadora, plano, base, dependencia, digito)))
+
+def decompor_carteiras(numeros):
+    """Versão vetorizada para arquivos em lote: recebe uma pd.Series de números e retorna um
+    DataFrame com uma coluna por componente (None nas linhas fora do formato)"""
+    componentes = numeros.astype(str).str.strip().str.extract(PADRAO_CARTEIRA)
+    componentes.columns = list(CAMPOS_CARTEIRA)
+    componentes = componentes.apply(lambda coluna: coluna.str.strip())
+    return componentes.astype(object).where(componentes.notna(), None)
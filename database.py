@@ -0,0 +1,213 @@
+"""Configuração do banco de dados: engine, pool de conexões e sessões.
+
+Módulo importado uma única vez por processo: os reruns do Streamlit reexecutam
+apenas o app.py e reutilizam o mesmo engine e o mesmo pool de conexões.
+"""
+import os
+import logging
+from contextlib import contextmanager
+from sqlalchemy import bindparam, create_engine, event, select, text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv(override=True)
+
+# Obter a URL do banco de dados do arquivo .env
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# Logger do módulo (a configuração do logging é feita pelo app.py)
+logger = logging.getLogger(__name__)
+
+# Configuração do pool de conexões (ignorada pelo SQLite, que usa o pool padrão do dialeto)
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT_SEG', '30'))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE_SEG', '1800'))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'sim')
+
+# Engine de leitura (dashboards e consultas): réplica em DATABASE_READ_URL ou, no SQLite,
+# uma segunda conexão em modo WAL com DB_LEITURA_SQLITE_WAL=true; sem isso, usa o engine principal
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')
+LEITURA_SQLITE_WAL = os.getenv('DB_LEITURA_SQLITE_WAL', 'false').lower() in ('1', 'true', 'sim')
+POOL_LEITURA_SIZE = int(os.getenv('DB_LEITURA_POOL_SIZE', str(POOL_SIZE)))
+POOL_LEITURA_MAX_OVERFLOW = int(os.getenv('DB_LEITURA_POOL_MAX_OVERFLOW', str(POOL_MAX_OVERFLOW)))
+
+# Perfil de desempenho do SQLite (implantações de um único servidor), aplicado a cada conexão
+PERFIL_SQLITE = os.getenv('DB_PERFIL_SQLITE', 'false').lower() in ('1', 'true', 'sim')
+SQLITE_MMAP_MB = int(os.getenv('DB_SQLITE_MMAP_MB', '256'))
+SQLITE_CACHE_MB = int(os.getenv('DB_SQLITE_CACHE_MB', '64'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('DB_SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+def _aplicar_pragmas_sqlite(conexao, registro):
+    """WAL (leitores não bloqueiam o gravador), fsync só nos checkpoints, mmap, cache e espera por lock"""
+    cursor = conexao.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    # cache_size negativo é expresso em KiB
+    cursor.execute(f"PRAGMA cache_size={-SQLITE_CACHE_MB * 1024}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def criar_engine(url=None, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, perfil_sqlite=PERFIL_SQLITE):
+    """Cria o engine com as opções de pool configuradas (e o perfil SQLite, se ativo)"""
+    url = url or DATABASE_URL
+    opcoes = {
+        'echo': False,
+        'pool_pre_ping': POOL_PRE_PING,
+        'pool_recycle': POOL_RECYCLE
+    }
+    if not url.startswith('sqlite'):
+        opcoes.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=POOL_TIMEOUT
+        )
+    logger.info(f"Criando engine do banco de dados (pool: {opcoes})")
+    novo_engine = create_engine(url, **opcoes)
+    if perfil_sqlite and url.startswith('sqlite'):
+        event.listen(novo_engine, 'connect', _aplicar_pragmas_sqlite)
+    return novo_engine
+
+def _configurar_sqlite_leitura(conexao, registro):
+    """Conexão SQLite de leitura: WAL permite ler durante as gravações e query_only bloqueia escritas"""
+    cursor = conexao.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def criar_engine_leitura():
+    """Cria o engine de leitura com pool próprio, ou reutiliza o principal quando não configurado"""
+    if DATABASE_READ_URL:
+        return criar_engine(DATABASE_READ_URL, POOL_LEITURA_SIZE, POOL_LEITURA_MAX_OVERFLOW)
+    if LEITURA_SQLITE_WAL and DATABASE_URL.startswith('sqlite'):
+        engine_sqlite = criar_engine(DATABASE_URL)
+        event.listen(engine_sqlite, 'connect', _configurar_sqlite_leitura)
+        return engine_sqlite
+    return engine
+
+# Configuração do banco de dados
+Base = declarative_base()
+engine = criar_engine()
+Session = sessionmaker(bind=engine)
+engine_leitura = criar_engine_leitura()
+SessionLeitura = sessionmaker(bind=engine_leitura) if engine_leitura is not engine else Session
+
+# Função base para sessão do banco de dados
+def get_session(leitura=False):
+    """Retorna uma sessão do banco de dados (no engine de leitura quando `leitura=True`)"""
+    try:
+        session = SessionLeitura() if leitura else Session()
+        return session
+    except Exception as e:
+        logger.error(f"Erro ao criar sessão do banco de dados: {str(e)}")
+        return None
+
+@contextmanager
+def sessao_banco():
+    """Sessão do banco como gerenciador de contexto: desfaz em caso de erro e sempre devolve a conexão ao pool"""
+    session = Session()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+@contextmanager
+def sessao_leitura():
+    """Sessão somente leitura para dashboards e consultas, no engine de leitura"""
+    session = SessionLeitura()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+# Registros por comando INSERT nas inclusões em lote
+TAMANHO_LOTE_UPSERT = int(os.getenv('DB_TAMANHO_LOTE_UPSERT', '1000'))
+
+def upsert_em_lote(session, tabela, registros, chaves, atualizar, tamanho_lote=TAMANHO_LOTE_UPSERT):
+    """Insere ou atualiza registros em lote com INSERT ... ON CONFLICT (SQLite e PostgreSQL).
+    
+    `chaves` são as colunas do índice único usado como alvo do conflito e
+    `atualizar` as colunas sobrescritas quando o registro já existe.
+    """
+    dialeto = session.get_bind().dialect.name
+    if dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    elif dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    else:
+        raise NotImplementedError(f"Upsert em lote não suportado para o banco '{dialeto}'")
+    
+    if not registros:
+        return
+    if dialeto == 'sqlite':
+        # Limite de parâmetros por comando do SQLite (32766 a partir da versão 3.32)
+        tamanho_lote = max(1, min(tamanho_lote, 32000 // len(registros[0])))
+    
+    for inicio in range(0, len(registros), tamanho_lote):
+        comando = insert_dialeto(tabela).values(registros[inicio:inicio + tamanho_lote])
+        session.execute(comando.on_conflict_do_update(
+            index_elements=chaves,
+            set_={coluna: comando.excluded[coluna] for coluna in atualizar}
+        ))
+
+def sincronizar_associacao(session, tabela, coluna_dono, coluna_alvo, desejados):
+    """Faz a tabela de junção refletir `desejados` ({id do dono: conjunto de ids}) com INSERT e DELETE em lote.
+    
+    Apenas os donos presentes em `desejados` são alterados; retorna (inseridos, removidos).
+    """
+    if not desejados:
+        return 0, 0
+    dono, alvo = tabela.c[coluna_dono], tabela.c[coluna_alvo]
+    atuais = set()
+    donos = list(desejados)
+    # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+    for inicio in range(0, len(donos), TAMANHO_LOTE_UPSERT):
+        atuais.update(session.execute(
+            select(dono, alvo).where(dono.in_(donos[inicio:inicio + TAMANHO_LOTE_UPSERT]))
+        ).tuples())
+    pares = {(id_dono, id_alvo) for id_dono, ids in desejados.items() for id_alvo in ids}
+    
+    remover = [{'dono': id_dono, 'alvo': id_alvo} for id_dono, id_alvo in atuais - pares]
+    if remover:
+        session.execute(
+            tabela.delete().where(dono == bindparam('dono'), alvo == bindparam('alvo')),
+            remover
+        )
+    inserir = [{coluna_dono: id_dono, coluna_alvo: id_alvo} for id_dono, id_alvo in pares - atuais]
+    if inserir:
+        session.execute(tabela.insert(), inserir)
+    return len(inserir), len(remover)
+
+def otimizar_apos_importacao(session, tabelas=()):
+    """Atualiza as estatísticas do planejador após importações em lote (somente com o perfil SQLite)"""
+    if not (PERFIL_SQLITE and session.get_bind().dialect.name == 'sqlite'):
+        return
+    try:
+        for tabela in tabelas:
+            session.execute(text(f'ANALYZE "{tabela}"'))
+        session.execute(text("PRAGMA optimize"))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Erro ao otimizar o banco após importação: {str(e)}")
+
+def metricas_pool(engine_alvo=None):
+    """Retorna o uso atual do pool de conexões do engine (o principal quando omitido)"""
+    pool = (engine_alvo or engine).pool
+    metricas = {'Tipo': type(pool).__name__, 'Status': pool.status()}
+    for nome, atributo in (
+        ('Tamanho', 'size'),
+        ('Em uso', 'checkedout'),
+        ('Livres', 'checkedin'),
+        ('Excedentes', 'overflow')
+    ):
+        if hasattr(pool, atributo):
+            metricas[nome] = getattr(pool, atributo)()
+    return metricas
@@ -0,0 +1,89 @@
+"""Detecção de nomes duplicados de pacientes por blocagem e pontuação de similaridade.
+
+Em vez de comparar todos os pares, cada nome gera algumas chaves de bloco a partir
+do texto normalizado (normalizar_texto) e só são comparados os nomes que
+compartilham alguma chave.
+"""
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+from utils import normalizar_texto
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # rapidfuzz é opcional; sem ele usa o difflib da biblioteca padrão
+    fuzz = None
+
+# Pontuação mínima (0 a 100) para propor uma mesclagem
+LIMIAR_SIMILARIDADE = 90
+
+# Blocos maiores que isto (ex.: nomes muito comuns) são ignorados para não voltar a O(n²)
+LIMITE_BLOCO = 200
+
+def chaves_bloco(nome_normalizado):
+    """Chaves de bloco de um nome normalizado: tokens ordenados, primeiro + último nome e iniciais"""
+    tokens = nome_normalizado.split()
+    if not tokens:
+        return set()
+    primeiro, ultimo = tokens[0], tokens[-1]
+    return {
+        'tokens:' + ' '.join(sorted(tokens)),
+        'extremos:' + primeiro + ' ' + ultimo,
+        'prefixos:' + primeiro[:4] + ' ' + ultimo[:4]
+    }
+
+def similaridade(nome_a, nome_b):
+    """Similaridade (0 a 100) entre dois nomes normalizados, indiferente à ordem das palavras"""
+    if fuzz is not None:
+        return fuzz.token_sort_ratio(nome_a, nome_b)
+    ordenado_a = ' '.join(sorted(nome_a.split()))
+    ordenado_b = ' '.join(sorted(nome_b.split()))
+    return SequenceMatcher(None, ordenado_a, ordenado_b).ratio() * 100
+
+def _indexar(registros):
+    """Normaliza os nomes e agrupa os índices dos registros por chave de bloco"""
+    normalizados = [normalizar_texto(nome) for _, nome in registros]
+    blocos = defaultdict(list)
+    for posicao, nome in enumerate(normalizados):
+        for chave in chaves_bloco(nome):
+            blocos[chave].append(posicao)
+    return normalizados, blocos
+
+def propor_duplicados(registros, candidatos=None, limiar=LIMIAR_SIMILARIDADE):
+    """Propõe pares de nomes semelhantes.
+
+    `registros` e `candidatos` são listas de (id, nome). Sem `candidatos`, compara os
+    registros entre si; com `candidatos`, compara apenas registros × candidatos.
+    Retorna um DataFrame (id_a, nome_a, id_b, nome_b, pontuacao) em ordem decrescente.
+    """
+    cruzado = candidatos is not None
+    normalizados_a, blocos_a = _indexar(registros)
+    normalizados_b, blocos_b = _indexar(candidatos) if cruzado else (normalizados_a, blocos_a)
+
+    pares = set()
+    for chave, posicoes_a in blocos_a.items():
+        posicoes_b = blocos_b.get(chave, [])
+        if len(posicoes_a) > LIMITE_BLOCO or len(posicoes_b) > LIMITE_BLOCO:
+            continue
+        for i in posicoes_a:
+            for j in posicoes_b:
+                # Entre os próprios registros, cada par é considerado uma única vez
+                if cruzado or i < j:
+                    pares.add((i, j))
+
+    propostas = []
+    for i, j in pares:
+        id_a, nome_a = registros[i]
+        id_b, nome_b = (candidatos if cruzado else registros)[j]
+        if not cruzado and id_a == id_b:
+            continue
+        pontuacao = similaridade(normalizados_a[i], normalizados_b[j])
+        if pontuacao >= limiar:
+            propostas.append((id_a, nome_a, id_b, nome_b, round(pontuacao, 1)))
+
+    return pd.DataFrame(
+        propostas,
+        columns=['id_a', 'nome_a', 'id_b', 'nome_b', 'pontuacao']
+    ).sort_values('pontuacao', ascending=False, ignore_index=True)
@@ -0,0 +1,257 @@
+"""Importação declarativa dos cadastros de referência (unidades, salas, áreas, pagamentos, perfis e terminologias).
+
+Cada tabela declara suas colunas em uma EspecificacaoImportacao; importar_tabela
+converte e valida a planilha de forma vetorizada, rejeita as linhas inválidas com
+o motivo e grava o restante com upsert em lote, contando inclusões, alterações e
+linhas inalteradas.
+
+A planilha e a tabela são comparadas por impressões digitais (hash do conteúdo
+normalizado): um upload idêntico ao cadastro não grava nada, e um upload com
+mudanças parciais grava apenas as chaves cujas linhas diferem.
+"""
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import upsert_em_lote
+from models import AreaAtuacao, Pagamento, PerfilPaciente, Sala, Terminologia, Unidade
+
+# Valores da planilha interpretados como verdadeiro nas colunas booleanas
+VALORES_VERDADEIROS = {'true', '1', '1.0', 't', 'y', 'yes', 'a', 'ativo', 'sim'}
+
+# Coluna da planilha -> coluna do modelo.
+# tipo: 'inteiro', 'texto', 'codigo' (texto vindo de número, completado com zeros até `largura`) ou 'booleano'.
+# referencia: modelo cujo id deve existir; padrao: valor quando a coluna falta ou está vazia.
+Campo = namedtuple(
+    'Campo',
+    ['coluna', 'destino', 'tipo', 'obrigatorio', 'referencia', 'padrao', 'largura'],
+    defaults=('texto', False, None, None, None)
+)
+
+# modelo, campos, chaves (destinos usados no upsert), unicos (destinos sem repetição),
+# fixos (valores constantes gravados em todas as linhas) e nome do arquivo de template
+EspecificacaoImportacao = namedtuple(
+    'EspecificacaoImportacao',
+    ['modelo', 'campos', 'chaves', 'unicos', 'fixos', 'template'],
+    defaults=((), None, None)
+)
+
+# `impressao` é a impressão digital do conteúdo válido da planilha; `identico` indica que ela
+# coincide com a da tabela (nada foi gravado)
+ResultadoImportacao = namedtuple(
+    'ResultadoImportacao',
+    ['inseridos', 'atualizados', 'inalterados', 'rejeitados', 'impressao', 'identico']
+)
+
+IMPORTACAO_UNIDADES = EspecificacaoImportacao(
+    modelo=Unidade,
+    campos=[
+        Campo('id', 'id', 'inteiro', obrigatorio=True),
+        Campo('nome', 'nome', obrigatorio=True),
+        Campo('atende_sabado', 'atende_sabado', 'booleano', padrao=False),
+        Campo('ativo', 'ativo', 'booleano', padrao=True),
+    ],
+    chaves=['id'],
+    unicos=['nome'],
+    template='template_unidades.xlsx'
+)
+
+IMPORTACAO_SALAS = EspecificacaoImportacao(
+    modelo=Sala,
+    campos=[
+        Campo('id_unidade', 'unidade_id', 'inteiro', obrigatorio=True, referencia=Unidade),
+        Campo('id_sala', 'id', 'inteiro', obrigatorio=True),
+        Campo('nome', 'nome', obrigatorio=True),
+        Campo('ativo', 'ativo', 'booleano', padrao=True),
+    ],
+    chaves=['id'],
+    template='template_salas.xlsx'
+)
+
+IMPORTACAO_AREAS = EspecificacaoImportacao(
+    modelo=AreaAtuacao,
+    campos=[
+        Campo('id', 'id', 'inteiro', obrigatorio=True),
+        Campo('nome', 'nome', obrigatorio=True),
+        Campo('ativo', 'ativo', 'booleano', padrao=True),
+    ],
+    chaves=['id'],
+    unicos=['nome'],
+    template='template_areas_atuacao.xlsx'
+)
+
+IMPORTACAO_PAGAMENTOS = EspecificacaoImportacao(
+    modelo=Pagamento,
+    campos=[
+        Campo('id', 'id', 'inteiro', obrigatorio=True),
+        Campo('nome', 'nome', obrigatorio=True),
+        Campo('ativo', 'ativo', 'booleano', padrao=True),
+    ],
+    chaves=['id'],
+    unicos=['nome'],
+    template='template_pagamentos.xlsx'
+)
+
+IMPORTACAO_PERFIS = EspecificacaoImportacao(
+    modelo=PerfilPaciente,
+    campos=[
+        Campo('Id', 'id', 'inteiro', obrigatorio=True),
+        Campo('Nome', 'nome', obrigatorio=True),
+        Campo('Descrição', 'descricao'),
+        Campo('Status', 'ativo', 'booleano', padrao=True),
+    ],
+    chaves=['id'],
+    unicos=['nome'],
+    template='template_perfis_paciente.xlsx'
+)
+
+IMPORTACAO_TERMINOLOGIAS = EspecificacaoImportacao(
+    modelo=Terminologia,
+    campos=[
+        Campo('id_area', 'area_atuacao_id', 'inteiro', referencia=AreaAtuacao),
+        Campo('id_pagamento', 'pagamento_id', 'inteiro', referencia=Pagamento),
+        Campo('id_codigo', 'id', 'inteiro', obrigatorio=True),
+        Campo('cod_faturamento', 'cod_faturamento', 'codigo', obrigatorio=True, largura=8),
+        Campo('descricao', 'descricao', obrigatorio=True),
+        Campo('ativo', 'ativo', 'booleano', padrao=True),
+    ],
+    chaves=['id'],
+    fixos={'tipo': 'Padrão'},
+    template='template_terminologias.xlsx'
+)
+
+def colunas_template(especificacao):
+    """Colunas da planilha de template de uma especificação"""
+    return [campo.coluna for campo in especificacao.campos]
+
+def _texto(serie):
+    """Texto sem espaços nas pontas; vazio vira ausente"""
+    texto = serie.where(serie.isna(), serie.astype(str).str.strip())
+    return texto.mask(texto == '')
+
+def _converter(campo, serie):
+    """Converte a coluna para o tipo do campo; retorna (valores, máscara de valores inválidos)"""
+    if campo.tipo == 'inteiro':
+        numeros = pd.to_numeric(serie, errors='coerce')
+        invalidos = serie.notna() & (numeros.isna() | (numeros % 1 != 0))
+        return numeros.mask(invalidos).astype('Int64'), invalidos
+    if campo.tipo == 'booleano':
+        valores = serie.astype(str).str.strip().str.lower().isin(VALORES_VERDADEIROS)
+        return valores.where(serie.notna(), campo.padrao), pd.Series(False, index=serie.index)
+
+    texto = _texto(serie)
+    if campo.tipo == 'codigo':
+        # Códigos lidos como número pelo Excel (ex.: 10101012.0) voltam a ser texto inteiro
+        numeros = pd.to_numeric(serie, errors='coerce')
+        inteiros = numeros.notna() & (numeros % 1 == 0)
+        texto = texto.mask(inteiros, numeros.where(inteiros).astype('Int64').astype(str))
+        if campo.largura:
+            texto = texto.where(texto.isna(), texto.str.zfill(campo.largura))
+    return texto, pd.Series(False, index=serie.index)
+
+def impressao_linhas(quadro, colunas):
+    """Hash (uint64) de cada linha, sobre o texto normalizado das colunas (ausentes viram 'None')"""
+    normalizado = quadro[colunas].astype(object)
+    normalizado = normalizado.where(normalizado.notna(), None).astype(str)
+    return pd.util.hash_pandas_object(normalizado, index=False)
+
+def impressao_digital(hashes_linhas):
+    """Impressão digital (SHA-256) do conteúdo a partir dos hashes das linhas, independente da ordem"""
+    return hashlib.sha256(np.sort(hashes_linhas.to_numpy()).tobytes()).hexdigest()
+
+def importar_tabela(session, especificacao, df):
+    """Valida e grava a planilha `df` conforme a especificação; o commit fica a cargo de quem chama.
+
+    Gera ValueError se faltar uma coluna obrigatória. As linhas rejeitadas voltam em
+    `rejeitados` com o número da linha na planilha e o motivo.
+    """
+    faltantes = [campo.coluna for campo in especificacao.campos if campo.obrigatorio and campo.coluna not in df.columns]
+    if faltantes:
+        raise ValueError(f"Colunas obrigatórias faltando: {', '.join(faltantes)}")
+
+    df = df.reset_index(drop=True)
+    dados = pd.DataFrame(index=df.index)
+    motivo = pd.Series(None, index=df.index, dtype=object)
+
+    def rejeitar(condicao, texto):
+        motivo.mask(motivo.isna() & condicao, texto, inplace=True)
+
+    for campo in especificacao.campos:
+        original = df[campo.coluna] if campo.coluna in df.columns else pd.Series(None, index=df.index, dtype=object)
+        valores, invalidos = _converter(campo, original)
+        rejeitar(invalidos, f"Valor inválido em '{campo.coluna}'")
+        if campo.padrao is not None:
+            valores = valores.where(valores.notna(), campo.padrao)
+        if campo.obrigatorio:
+            rejeitar(valores.isna(), f"'{campo.coluna}' não informado")
+        if campo.referencia is not None:
+            cadastrados = set(session.execute(select(campo.referencia.id)).scalars())
+            rejeitar(valores.notna() & ~valores.isin(cadastrados), f"'{campo.coluna}' não cadastrado")
+        dados[campo.destino] = valores
+    for destino, valor in (especificacao.fixos or {}).items():
+        dados[destino] = valor
+
+    # Chave repetida na planilha: vale a última ocorrência
+    rejeitar(
+        dados.duplicated(subset=especificacao.chaves, keep='last'),
+        "Chave repetida no arquivo (vale a última linha)"
+    )
+    colunas = list(dados.columns)
+    tabela = especificacao.modelo.__table__
+    existentes = pd.DataFrame(
+        session.execute(select(*(tabela.c[coluna] for coluna in colunas))).all(),
+        columns=colunas
+    )
+    for coluna in especificacao.unicos:
+        aceitos = motivo.isna()
+        repetidos = dados.loc[aceitos, coluna].dropna().duplicated(keep=False)
+        rejeitar(repetidos.reindex(dados.index, fill_value=False), f"'{coluna}' repetido no arquivo")
+        # Valor já usado no banco por um registro de outra chave
+        chaves_banco = dados[[coluna]].join(existentes.set_index(coluna)[especificacao.chaves], on=coluna)
+        outro = pd.Series(False, index=dados.index)
+        for chave in especificacao.chaves:
+            outro |= chaves_banco[chave].notna() & (chaves_banco[chave] != dados[chave]).fillna(True)
+        rejeitar(outro, f"'{coluna}' já cadastrado para outro registro")
+
+    rejeitados = df[motivo.notna()].copy()
+    rejeitados.insert(0, 'motivo', motivo.dropna())
+    rejeitados.insert(0, 'linha', rejeitados.index + 2)
+    validos = dados[motivo.isna()]
+
+    # Mesmos tipos dos dois lados para que as impressões coincidam (ex.: inteiros anuláveis)
+    for coluna in colunas:
+        if str(validos[coluna].dtype) == 'Int64':
+            existentes[coluna] = existentes[coluna].astype('Int64')
+    # Hash de cada linha calculado uma única vez de cada lado; a comparação pelas chaves separa
+    # inclusões, alterações e linhas inalteradas
+    hashes_validos = impressao_linhas(validos, colunas)
+    impressao = impressao_digital(hashes_validos)
+    comparacao = validos.assign(_impressao=hashes_validos).merge(
+        existentes[especificacao.chaves].assign(_impressao_atual=impressao_linhas(existentes, colunas)),
+        on=especificacao.chaves, how='left', indicator=True
+    )
+    novos = comparacao['_merge'] == 'left_only'
+    alterados = ~novos & (comparacao['_impressao'] != comparacao['_impressao_atual'])
+    # Idêntico ao cadastro: nada novo, nada alterado e nenhuma linha a mais na tabela
+    if not novos.any() and not alterados.any() and len(validos) == len(existentes):
+        return ResultadoImportacao(0, 0, len(validos), rejeitados, impressao, True)
+
+    gravar = comparacao.loc[novos | alterados, colunas]
+    upsert_em_lote(
+        session,
+        tabela,
+        gravar.astype(object).where(gravar.notna(), None).to_dict('records'),
+        chaves=especificacao.chaves,
+        atualizar=[coluna for coluna in colunas if coluna not in especificacao.chaves]
+    )
+    return ResultadoImportacao(
+        inseridos=int(novos.sum()),
+        atualizados=int(alterados.sum()),
+        inalterados=int(len(comparacao) - novos.sum() - alterados.sum()),
+        rejeitados=rejeitados,
+        impressao=impressao,
+        identico=False
+    )
@@ -0,0 +1,166 @@
+"""Leitura dos arquivos enviados (Excel, CSV e Parquet) com detecção do formato.
+
+O formato é detectado pelo conteúdo (assinatura do arquivo) e, na falta dela, pela
+extensão. Planilhas .xlsx são lidas com o calamine quando o pacote python-calamine
+está instalado e, caso contrário, com o openpyxl em modo somente leitura
+(iter_rows), sem gravar arquivo temporário. Apenas as colunas pedidas são
+carregadas, e o tempo de leitura de cada arquivo é medido.
+"""
+import csv
+import logging
+import time
+from collections import namedtuple
+from io import BytesIO
+
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401  (habilita engine='calamine' no pandas >= 2.2)
+    MOTOR_XLSX = 'calamine'
+except ImportError:  # python-calamine é opcional
+    MOTOR_XLSX = 'openpyxl'
+
+# Extensões aceitas nos uploads (st.file_uploader); o formato .xls antigo exigiria o xlrd
+FORMATOS_UPLOAD = ['xlsx', 'csv', 'parquet']
+
+# Assinaturas dos formatos binários
+_ASSINATURAS = [
+    (b'PK\x03\x04', 'xlsx'),
+    (b'\xd0\xcf\x11\xe0', 'xls'),
+    (b'PAR1', 'parquet'),
+]
+
+Leitura = namedtuple('Leitura', ['dados', 'formato', 'motor', 'segundos'])
+
+def detectar_formato(conteudo, nome=''):
+    """Formato do arquivo pela assinatura do conteúdo ou, se não houver, pela extensão do nome"""
+    for assinatura, formato in _ASSINATURAS:
+        if conteudo.startswith(assinatura):
+            return formato
+    extensao = nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+    return extensao if extensao in FORMATOS_UPLOAD else 'csv'
+
+def _filtro_colunas(colunas):
+    """usecols que aceita colunas ausentes (a falta delas é apontada pela validação de cada upload)"""
+    if colunas is None:
+        return None
+    desejadas = set(colunas)
+    return lambda coluna: coluna in desejadas
+
+def _aplicar_tipos(dados, tipos):
+    """Converte as colunas para os tipos pedidos mantendo as células vazias como ausentes"""
+    for coluna, tipo in (tipos or {}).items():
+        if coluna in dados.columns:
+            preenchidas = dados[coluna].notna()
+            dados[coluna] = dados[coluna].where(~preenchidas, dados[coluna][preenchidas].astype(tipo))
+    return dados
+
+def _aplicar_datas(dados, datas):
+    """Converte as colunas de data; textos (ex.: CSV) são lidos como ISO (aaaa-mm-dd) ou dia primeiro (dd/mm/aaaa).
+
+    Valores que não são datas ficam como estão, para a validação de cada upload apontá-los.
+    """
+    for coluna in datas or ():
+        if coluna not in dados.columns:
+            continue
+        valores = dados[coluna]
+        textos = valores.map(lambda valor: isinstance(valor, str))
+        convertidas = pd.to_datetime(valores.where(~textos), errors='coerce')
+        if textos.any():
+            texto = valores[textos].str.strip()
+            iso = pd.to_datetime(texto, format='ISO8601', errors='coerce')
+            convertidas[textos] = iso.fillna(pd.to_datetime(texto, format='mixed', dayfirst=True, errors='coerce'))
+        dados[coluna] = convertidas.astype(object).where(convertidas.notna(), valores)
+    return dados
+
+def _ler_xlsx_openpyxl(conteudo, colunas, tipos):
+    """Lê a primeira aba com openpyxl em modo somente leitura, montando só as colunas pedidas"""
+    from openpyxl import load_workbook
+
+    pasta = load_workbook(BytesIO(conteudo), read_only=True, data_only=True)
+    try:
+        linhas = pasta.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, ())
+        desejadas = set(colunas) if colunas is not None else None
+        indices = [
+            i for i, coluna in enumerate(cabecalho)
+            if coluna is not None and (desejadas is None or coluna in desejadas)
+        ]
+        dados = pd.DataFrame(
+            ([linha[i] if i < len(linha) else None for i in indices] for linha in linhas),
+            columns=[cabecalho[i] for i in indices]
+        )
+    finally:
+        pasta.close()
+    # Linhas vazias no fim da aba (formatação residual) são descartadas
+    return _aplicar_tipos(dados.dropna(how='all'), tipos)
+
+def _separador_csv(conteudo):
+    """Separador do CSV (';' é comum nas planilhas exportadas em português)"""
+    amostra = conteudo[:4096].decode('latin-1')
+    try:
+        return csv.Sniffer().sniff(amostra, delimiters=';,\t|').delimiter
+    except csv.Error:
+        return ','
+
+def _ler_csv(conteudo, colunas, tipos):
+    """Lê um CSV detectando o separador; tenta UTF-8 e, em seguida, Latin-1"""
+    opcoes = {'sep': _separador_csv(conteudo), 'usecols': _filtro_colunas(colunas), 'dtype': tipos}
+    try:
+        return pd.read_csv(BytesIO(conteudo), encoding='utf-8-sig', **opcoes)
+    except UnicodeDecodeError:
+        return pd.read_csv(BytesIO(conteudo), encoding='latin-1', **opcoes)
+
+def _ler_parquet(conteudo, colunas, tipos):
+    """Lê um Parquet carregando apenas as colunas pedidas que existem no arquivo"""
+    selecionadas = None
+    if colunas is not None:
+        try:
+            import pyarrow.parquet as pq
+            disponiveis = pq.ParquetFile(BytesIO(conteudo)).schema_arrow.names
+            selecionadas = [coluna for coluna in disponiveis if coluna in set(colunas)]
+        except ImportError:
+            selecionadas = None
+    return _aplicar_tipos(pd.read_parquet(BytesIO(conteudo), columns=selecionadas), tipos)
+
+def ler_planilha(arquivo, colunas=None, tipos=None, nome=None, datas=None):
+    """Lê um upload (arquivo do Streamlit, bytes ou caminho) em um DataFrame.
+
+    `colunas` limita as colunas carregadas, `tipos` define os dtypes das colunas
+    (ex.: str para códigos e nomes) e `datas` lista as colunas de data, cujos textos
+    seguem o padrão brasileiro (dia primeiro). Retorna uma Leitura com os dados, o formato,
+    o motor usado e o tempo de leitura em segundos.
+    """
+    inicio = time.perf_counter()
+    if isinstance(arquivo, (bytes, bytearray)):
+        conteudo = bytes(arquivo)
+    elif isinstance(arquivo, str):
+        nome = nome or arquivo
+        with open(arquivo, 'rb') as f:
+            conteudo = f.read()
+    else:
+        nome = nome or getattr(arquivo, 'name', '')
+        conteudo = arquivo.getvalue()
+
+    formato = detectar_formato(conteudo, nome or '')
+    if formato == 'xlsx' and MOTOR_XLSX == 'calamine':
+        motor = 'calamine'
+        dados = pd.read_excel(
+            BytesIO(conteudo), engine='calamine', usecols=_filtro_colunas(colunas), dtype=tipos
+        ).dropna(how='all')
+    elif formato == 'xlsx':
+        motor = 'openpyxl (somente leitura)'
+        dados = _ler_xlsx_openpyxl(conteudo, colunas, tipos)
+    elif formato == 'xls':
+        raise ValueError("Formato .xls (Excel 97-2003) não suportado: salve a planilha como .xlsx")
+    elif formato == 'parquet':
+        motor = 'parquet'
+        dados = _ler_parquet(conteudo, colunas, tipos)
+    else:
+        motor = 'csv'
+        dados = _ler_csv(conteudo, colunas, tipos)
+
+    dados = _aplicar_datas(dados, datas)
+    segundos = time.perf_counter() - inicio
+    logging.info(f"Arquivo '{nome}' lido em {segundos:.2f}s ({formato}, {motor}): {len(dados)} linha(s)")
+    return Leitura(dados, formato, motor, segundos)
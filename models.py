@@ -0,0 +1,298 @@
+"""Modelos de dados (SQLAlchemy) do sistema de agendamento"""
+from datetime import datetime
+from sqlalchemy import (
+    Column, Integer, String, Boolean, ForeignKey, Date, DateTime, Table, Index, UniqueConstraint
+)
+from sqlalchemy.orm import relationship, validates
+
+from carteira import CAMPOS_CARTEIRA, decompor_carteira
+from database import Base
+
+# Tabelas de junção
+profissional_area_atuacao = Table(
+    'profissional_area_atuacao', Base.metadata,
+    Column('profissional_id', Integer, ForeignKey('profissionais.id'), primary_key=True),
+    Column('area_atuacao_id', Integer, ForeignKey('areas_atuacao.id'), primary_key=True)
+)
+
+profissional_pagamento = Table(
+    'profissional_pagamento', Base.metadata,
+    Column('profissional_id', Integer, ForeignKey('profissionais.id'), primary_key=True),
+    Column('pagamento_id', Integer, ForeignKey('pagamentos.id'), primary_key=True)
+)
+
+profissional_perfil_paciente = Table(
+    'profissional_perfil_paciente', Base.metadata,
+    Column('profissional_id', Integer, ForeignKey('profissionais.id'), primary_key=True),
+    Column('perfil_paciente_id', Integer, ForeignKey('perfis_paciente.id'), primary_key=True)
+)
+
+# Modelos
+class Unidade(Base):
+    """Modelo para unidades"""
+    __tablename__ = 'unidades'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nome = Column(String(100), nullable=False, unique=True)
+    atende_sabado = Column(Boolean, default=False)
+    ativo = Column(Boolean, default=True)
+    
+    # Relacionamentos
+    salas = relationship("Sala", back_populates="unidade", cascade="all, delete-orphan")
+    disponibilidades = relationship("Disponibilidade", back_populates="unidade", cascade="all, delete-orphan")
+
+class Sala(Base):
+    """Modelo para salas"""
+    __tablename__ = 'salas'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nome = Column(String(50), nullable=False)
+    unidade_id = Column(Integer, ForeignKey('unidades.id'), nullable=False)
+    ativo = Column(Boolean, default=True)
+    
+    # Relacionamentos
+    unidade = relationship("Unidade", back_populates="salas")
+    profissionais = relationship("Profissional", back_populates="sala", cascade="all, delete-orphan")
+    disponibilidades_sala = relationship("DisponibilidadeSala", back_populates="sala", cascade="all, delete-orphan")
+
+class AreaAtuacao(Base):
+    """Modelo para áreas de atuação dos profissionais"""
+    __tablename__ = 'areas_atuacao'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nome = Column(String(100), nullable=False, unique=True)
+    descricao = Column(String(200))
+    ativo = Column(Boolean, default=True)
+    
+    # Relacionamentos
+    profissionais = relationship("Profissional", secondary="profissional_area_atuacao", back_populates="areas_atuacao")
+    terminologias = relationship("Terminologia", back_populates="area_atuacao")
+
+class Pagamento(Base):
+    """Modelo para tipos de pagamento"""
+    __tablename__ = 'pagamentos'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nome = Column(String(100), nullable=False, unique=True)
+    ativo = Column(Boolean, default=True)
+    
+    # Relacionamentos
+    profissionais = relationship("Profissional", secondary="profissional_pagamento", back_populates="pagamentos")
+    terminologias = relationship("Terminologia", back_populates="pagamento")
+
+class PerfilPaciente(Base):
+    """Modelo para perfis de pacientes"""
+    __tablename__ = 'perfis_paciente'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nome = Column(String(100), nullable=False, unique=True)
+    descricao = Column(String(200))
+    ativo = Column(Boolean, default=True)
+    
+    # Relacionamentos
+    profissionais = relationship("Profissional", secondary="profissional_perfil_paciente", back_populates="perfis_paciente")
+
+class Disponibilidade(Base):
+    """Modelo para disponibilidade de profissionais"""
+    __tablename__ = 'disponibilidade'
+    __table_args__ = {'extend_existing': True}
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    profissional_id = Column(Integer, ForeignKey('profissionais.id'), nullable=False)
+    unidade_id = Column(Integer, ForeignKey('unidades.id'), nullable=True)
+    dia_semana = Column(String(20), nullable=False)
+    periodo = Column(String(20), nullable=False)  # 'Matutino' ou 'Vespertino'
+    hora_inicio = Column(String(5), nullable=True)
+    hora_fim = Column(String(5), nullable=True)
+    status = Column(String(20), nullable=False, default='Disponível')
+    
+    # Relacionamentos
+    profissional = relationship("Profissional", back_populates="disponibilidades")
+    unidade = relationship("Unidade", back_populates="disponibilidades")
+
+class DisponibilidadeSala(Base):
+    """Modelo para disponibilidade de salas"""
+    __tablename__ = 'disponibilidade_salas'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sala_id = Column(Integer, ForeignKey('salas.id'), nullable=False)
+    dia_semana = Column(String(20), nullable=False)
+    horario = Column(String(5), nullable=False)
+    status = Column(String(20), nullable=False, default='Disponível')
+    
+    # Relacionamentos
+    sala = relationship("Sala", back_populates="disponibilidades_sala")
+
+class Terminologia(Base):
+    """Modelo para terminologias"""
+    __tablename__ = 'terminologias'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    descricao = Column(String(200), nullable=False)
+    cod_faturamento = Column(String(50), nullable=False)
+    tipo = Column(String(50), nullable=False)
+    pagamento_id = Column(Integer, ForeignKey('pagamentos.id'), nullable=True)
+    area_atuacao_id = Column(Integer, ForeignKey('areas_atuacao.id'), nullable=True)
+    ativo = Column(Boolean, default=True)
+    
+    # Relacionamentos
+    profissionais = relationship("Profissional", back_populates="terminologia")
+    pagamento = relationship("Pagamento", back_populates="terminologias")
+    area_atuacao = relationship("AreaAtuacao", back_populates="terminologias")
+
+class Profissional(Base):
+    """Modelo para profissionais"""
+    __tablename__ = 'profissionais'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nome = Column(String(100), nullable=False, unique=True)
+    cod_faturamento = Column(String(50), nullable=True)
+    terminologia_id = Column(Integer, ForeignKey('terminologias.id'), nullable=True)
+    sala_id = Column(Integer, ForeignKey('salas.id'), nullable=True)
+    nome_conselho = Column(String(100), nullable=True)
+    registro = Column(String(50), nullable=True)
+    uf = Column(String(2), nullable=True)
+    cbo = Column(String(10), nullable=True)
+    ativo = Column(Boolean, default=True)
+    
+    # Relacionamentos
+    terminologia = relationship("Terminologia", back_populates="profissionais")
+    sala = relationship("Sala", back_populates="profissionais")
+    disponibilidades = relationship("Disponibilidade", back_populates="profissional", cascade="all, delete-orphan")
+    
+    # Relacionamentos com as tabelas de junção
+    areas_atuacao = relationship("AreaAtuacao", secondary=profissional_area_atuacao, back_populates="profissionais")
+    pagamentos = relationship("Pagamento", secondary=profissional_pagamento, back_populates="profissionais")
+    perfis_paciente = relationship("PerfilPaciente", secondary=profissional_perfil_paciente, back_populates="profissionais")
+
+class AgendaFixa(Base):
+    """Modelo para agenda fixa"""
+    __tablename__ = 'agenda_fixa'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data = Column(Date, nullable=False, index=True)
+    dia_semana = Column(String(20), nullable=False)
+    horario = Column(String(5), nullable=False)
+    unidade = Column(String(100), nullable=False)
+    sala = Column(String(50), nullable=True)
+    profissional = Column(String(100), nullable=False)
+    tipo_atend = Column(String(100), nullable=False)
+    cod_faturamento = Column(String(50), nullable=True)
+    qtd_sess = Column(Integer, nullable=True)
+    pagamento = Column(String(50), nullable=True)
+    paciente = Column(String(100), nullable=True)
+    # Chaves das entidades correspondentes aos nomes acima (preenchidas na importação)
+    unidade_id = Column(Integer, ForeignKey('unidades.id', ondelete='SET NULL'), nullable=True, index=True)
+    sala_id = Column(Integer, ForeignKey('salas.id', ondelete='SET NULL'), nullable=True, index=True)
+    profissional_id = Column(Integer, ForeignKey('profissionais.id', ondelete='SET NULL'), nullable=True, index=True)
+    pagamento_id = Column(Integer, ForeignKey('pagamentos.id', ondelete='SET NULL'), nullable=True, index=True)
+    paciente_id = Column(Integer, ForeignKey('pacientes.id', ondelete='SET NULL'), nullable=True, index=True)
+    created_at = Column(Date, nullable=True, default=datetime.now().date())
+    updated_at = Column(Date, nullable=True, default=datetime.now().date())
+
+class AgendaDiaria(Base):
+    """Agregação diária da agenda fixa (reconstruída a cada importação)"""
+    __tablename__ = 'agenda_diaria'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data = Column(Date, nullable=False, index=True)
+    unidade = Column(String(100), nullable=False)
+    profissional = Column(String(100), nullable=False)
+    tipo_atend = Column(String(100), nullable=False, default='')
+    pagamento = Column(String(50), nullable=False, default='')
+    agendamentos = Column(Integer, nullable=False, default=0)
+    atendimentos = Column(Integer, nullable=False, default=0)
+
+class VersaoEsquema(Base):
+    """Migrações de esquema aplicadas ao banco"""
+    __tablename__ = 'versao_esquema'
+    
+    versao = Column(Integer, primary_key=True, autoincrement=False)
+    descricao = Column(String(200), nullable=False)
+    aplicada_em = Column(DateTime, nullable=False, default=datetime.now)
+
+class Agendamento(Base):
+    """Modelo para agendamentos"""
+    __tablename__ = 'agendamentos'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data_hora = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False)
+    profissional_id = Column(Integer, ForeignKey('profissionais.id'), nullable=False)
+    sala_id = Column(Integer, ForeignKey('salas.id'), nullable=False)
+    paciente = Column(String(100), nullable=True)
+    created_at = Column(DateTime, nullable=True, default=datetime.now())
+    updated_at = Column(DateTime, nullable=True, default=datetime.now())
+
+class Paciente(Base):
+    """Modelo para pacientes"""
+    __tablename__ = 'pacientes'
+    __table_args__ = {'extend_existing': True}
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    id_paciente_carteira = Column(Integer, nullable=False, unique=True)  # ID externo único
+    nome = Column(String(100), nullable=False, index=True)
+    created_at = Column(DateTime, nullable=True, default=datetime.now())
+    updated_at = Column(DateTime, nullable=True, default=datetime.now())
+    
+    # Relacionamentos
+    carteiras = relationship("Carteira", back_populates="paciente", cascade="all, delete-orphan")
+
+class Carteira(Base):
+    """Modelo para carteiras dos pacientes"""
+    __tablename__ = 'carteiras'
+    __table_args__ = (
+        # Chave do upsert em lote das carteiras
+        Index('uq_carteiras_paciente_numero_pagamento', 'paciente_id', 'numero_carteira', 'id_pagamento', unique=True),
+        {'extend_existing': True}  # Permite recriar a tabela se necessário
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    numero_carteira = Column(String(50), nullable=False, index=True)
+    id_pagamento = Column(Integer, ForeignKey('pagamentos.id'), nullable=False)
+    status = Column(String(20), nullable=False, default='Ativo')
+    paciente_id = Column(Integer, ForeignKey('pacientes.id'), nullable=False)
+    created_at = Column(DateTime, nullable=True, default=datetime.now())
+    updated_at = Column(DateTime, nullable=True, default=datetime.now())
+    
+    # Componentes do número da carteira (ver carteira.py), preenchidos ao gravar o número
+    operadora = Column(String(20), nullable=True, index=True)
+    plano = Column(String(20), nullable=True)
+    base = Column(String(50), nullable=True, index=True)
+    dependencia = Column(String(20), nullable=True)
+    digito = Column(String(20), nullable=True)
+    
+    # Relacionamentos
+    paciente = relationship("Paciente", back_populates="carteiras")
+    pagamento = relationship("Pagamento")
+    
+    @validates('numero_carteira')
+    def _decompor_numero(self, chave, numero):
+        """Atualiza os componentes sempre que o número da carteira é atribuído"""
+        componentes = decompor_carteira(numero)
+        for campo in CAMPOS_CARTEIRA:
+            setattr(self, campo, getattr(componentes, campo) if componentes else None)
+        return numero
+
+class ContadorOcupacao(Base):
+    """Contadores de horários da grade por unidade, profissional e status"""
+    __tablename__ = 'contadores_ocupacao'
+    __table_args__ = (UniqueConstraint('unidade_id', 'profissional_id', 'status'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    unidade_id = Column(Integer, nullable=False, default=0)  # 0 = horário sem unidade
+    profissional_id = Column(Integer, nullable=False, index=True)
+    status = Column(String(20), nullable=False)
+    quantidade = Column(Integer, nullable=False, default=0)
+
+class SnapshotOcupacao(Base):
+    """Retrato diário (somente inclusão) dos contadores de ocupação"""
+    __tablename__ = 'snapshots_ocupacao'
+    __table_args__ = (UniqueConstraint('data', 'unidade_id', 'profissional_id', 'status'),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data = Column(Date, nullable=False, index=True)
+    unidade_id = Column(Integer, nullable=False)
+    profissional_id = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False)
+    quantidade = Column(Integer, nullable=False)
@@ -0,0 +1,369 @@
+"""Serviços de ocupação: cubo NumPy da grade, contadores e agregações da agenda.
+
+Funções puras sobre sessões e DataFrames (sem Streamlit); o cache e a interface
+ficam no app.py.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, delete, func, insert, select
+
+from models import (
+    AgendaDiaria, AgendaFixa, AreaAtuacao, ContadorOcupacao, Disponibilidade,
+    DisponibilidadeSala, Profissional, Sala, SnapshotOcupacao, Unidade,
+    profissional_area_atuacao
+)
+
+# Dias da grade (mesmo formato de Disponibilidade.dia_semana)
+DIAS_GRADE = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
+
+# Chave usada para horários sem unidade atribuída
+SEM_UNIDADE = 0
+
+# Status da grade que contam como capacidade de atendimento (bloqueios ficam de fora)
+STATUS_CAPACIDADE = ['Disponível', 'Em atendimento']
+
+class CuboOcupacao:
+    """Contagem de horários em um ndarray NumPy, com um índice por dimensão.
+    
+    Dimensões "virtuais" (ex.: área de atuação) são filtros que mapeiam cada
+    chave para um conjunto de chaves de uma dimensão real (ex.: profissional).
+    """
+    
+    def __init__(self, dimensoes, dados, rotulos=None, virtuais=None):
+        self.nomes = list(dimensoes)
+        self.chaves = {nome: list(chaves) for nome, chaves in dimensoes.items()}
+        self.indices = {
+            nome: {chave: i for i, chave in enumerate(chaves)}
+            for nome, chaves in self.chaves.items()
+        }
+        self.dados = dados
+        self.rotulos = rotulos or {}
+        # nome virtual -> (dimensão real, {chave virtual: [chaves reais]})
+        self.virtuais = virtuais or {}
+    
+    @classmethod
+    def de_dataframe(cls, df, dimensoes, rotulos=None, virtuais=None):
+        """Monta o cubo a partir de um DataFrame com uma coluna por dimensão e a coluna 'quantidade'"""
+        # Chaves presentes nos dados e ausentes nas listas de referência vão para o fim do eixo
+        eixos = {}
+        for nome, chaves in dimensoes.items():
+            conhecidas = set(chaves)
+            eixos[nome] = list(chaves) + [c for c in pd.unique(df[nome]) if c not in conhecidas]
+        dimensoes = eixos
+        dados = np.zeros([len(chaves) for chaves in dimensoes.values()], dtype=np.int32)
+        cubo = cls(dimensoes, dados, rotulos, virtuais)
+        if not df.empty:
+            posicoes = tuple(
+                df[nome].map(cubo.indices[nome]).to_numpy(dtype=np.intp)
+                for nome in cubo.nomes
+            )
+            np.add.at(dados, posicoes, df['quantidade'].to_numpy(dtype=np.int32))
+        return cubo
+    
+    def _posicoes(self, nome, valor):
+        """Converte o valor de um filtro (chave ou lista de chaves) em posições do eixo"""
+        valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+        indice = self.indices[nome]
+        return np.array(sorted({indice[v] for v in valores if v in indice}), dtype=np.intp)
+    
+    def selecionar(self, **filtros):
+        """Aplica os filtros {dimensão: chave(s)} e retorna (array, chaves restantes por dimensão)"""
+        posicoes = {}
+        for nome, valor in filtros.items():
+            if valor is None:
+                continue
+            if nome in self.virtuais:
+                real, membros = self.virtuais[nome]
+                valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+                pos = self._posicoes(real, [m for v in valores for m in membros.get(v, [])])
+                nome = real
+            else:
+                pos = self._posicoes(nome, valor)
+            posicoes[nome] = np.intersect1d(posicoes[nome], pos) if nome in posicoes else pos
+        
+        fatia = self.dados
+        chaves = {}
+        for eixo, nome in enumerate(self.nomes):
+            if nome in posicoes:
+                fatia = np.take(fatia, posicoes[nome], axis=eixo)
+                chaves[nome] = [self.chaves[nome][i] for i in posicoes[nome]]
+            else:
+                chaves[nome] = self.chaves[nome]
+        return fatia, chaves
+    
+    def somar(self, manter=(), **filtros):
+        """Soma o cubo filtrado em todas as dimensões fora de `manter`.
+        
+        Retorna um inteiro quando nenhuma dimensão é mantida ou uma pd.Series
+        indexada pelas chaves das dimensões mantidas (na ordem do cubo).
+        """
+        fatia, chaves = self.selecionar(**filtros)
+        eixos = tuple(i for i, nome in enumerate(self.nomes) if nome not in manter)
+        total = fatia.sum(axis=eixos)
+        mantidas = [nome for nome in self.nomes if nome in manter]
+        if not mantidas:
+            return int(total)
+        if len(mantidas) == 1:
+            indice = pd.Index(chaves[mantidas[0]], name=mantidas[0])
+        else:
+            indice = pd.MultiIndex.from_product([chaves[n] for n in mantidas], names=mantidas)
+        return pd.Series(total.ravel(), index=indice)
+    
+    def tabela(self, linhas, colunas='status', **filtros):
+        """Soma o cubo filtrado em um DataFrame linhas × colunas (duas dimensões do cubo)"""
+        fatia, chaves = self.selecionar(**filtros)
+        i, j = self.nomes.index(linhas), self.nomes.index(colunas)
+        eixos = tuple(k for k in range(len(self.nomes)) if k not in (i, j))
+        total = fatia.sum(axis=eixos)
+        if i > j:
+            total = total.T
+        return pd.DataFrame(
+            total,
+            index=pd.Index(chaves[linhas], name=linhas),
+            columns=pd.Index(chaves[colunas], name=colunas)
+        )
+    
+    def rotulo(self, nome, chave):
+        """Retorna o rótulo de exibição de uma chave"""
+        return self.rotulos.get(nome, {}).get(chave, chave)
+
+def _membros_areas(session):
+    """Mapeia cada área de atuação para os IDs dos seus profissionais"""
+    membros = {}
+    for area_id, profissional_id in session.query(
+        profissional_area_atuacao.c.area_atuacao_id,
+        profissional_area_atuacao.c.profissional_id
+    ).all():
+        membros.setdefault(area_id, []).append(profissional_id)
+    return membros
+
+def construir_cubo_profissionais(session):
+    """Monta o cubo unidade × profissional × dia × hora × status da grade dos profissionais"""
+    df = pd.DataFrame(
+        session.query(
+            Disponibilidade.unidade_id,
+            Disponibilidade.profissional_id,
+            Disponibilidade.dia_semana,
+            Disponibilidade.hora_inicio,
+            Disponibilidade.status,
+            func.count(Disponibilidade.id)
+        ).group_by(
+            Disponibilidade.unidade_id,
+            Disponibilidade.profissional_id,
+            Disponibilidade.dia_semana,
+            Disponibilidade.hora_inicio,
+            Disponibilidade.status
+        ).all(),
+        columns=['unidade', 'profissional', 'dia', 'hora', 'status', 'quantidade']
+    )
+    df['unidade'] = df['unidade'].fillna(SEM_UNIDADE).astype(int)
+    df['hora'] = df['hora'].fillna('')
+    
+    unidades = session.query(Unidade.id, Unidade.nome).order_by(Unidade.nome).all()
+    profissionais = session.query(Profissional.id, Profissional.nome).order_by(Profissional.nome).all()
+    areas = session.query(AreaAtuacao.id, AreaAtuacao.nome).order_by(AreaAtuacao.nome).all()
+    
+    return CuboOcupacao.de_dataframe(
+        df,
+        {
+            'unidade': [SEM_UNIDADE] + [u.id for u in unidades],
+            'profissional': [p.id for p in profissionais],
+            'dia': DIAS_GRADE,
+            'hora': sorted(df['hora'].unique()),
+            'status': sorted(df['status'].unique())
+        },
+        rotulos={
+            'unidade': {SEM_UNIDADE: 'Sem unidade', **{u.id: u.nome for u in unidades}},
+            'profissional': {p.id: p.nome for p in profissionais},
+            'area': {a.id: a.nome for a in areas}
+        },
+        virtuais={'area': ('profissional', _membros_areas(session))}
+    )
+
+def construir_cubo_salas(session):
+    """Monta o cubo sala × dia × hora × status da grade das salas"""
+    df = pd.DataFrame(
+        session.query(
+            DisponibilidadeSala.sala_id,
+            DisponibilidadeSala.dia_semana,
+            DisponibilidadeSala.horario,
+            DisponibilidadeSala.status,
+            func.count(DisponibilidadeSala.id)
+        ).group_by(
+            DisponibilidadeSala.sala_id,
+            DisponibilidadeSala.dia_semana,
+            DisponibilidadeSala.horario,
+            DisponibilidadeSala.status
+        ).all(),
+        columns=['sala', 'dia', 'hora', 'status', 'quantidade']
+    )
+    # A grade de salas usa "Segunda-feira"; o cubo usa o formato da grade de profissionais
+    df['dia'] = df['dia'].str.replace('-feira', '', regex=False)
+    
+    unidades = session.query(Unidade.id, Unidade.nome).order_by(Unidade.nome).all()
+    salas = session.query(Sala.id, Sala.nome, Sala.unidade_id).order_by(Sala.unidade_id, Sala.nome).all()
+    nomes_unidades = {u.id: u.nome for u in unidades}
+    
+    salas_por_unidade = {}
+    for sala in salas:
+        salas_por_unidade.setdefault(sala.unidade_id, []).append(sala.id)
+    
+    return CuboOcupacao.de_dataframe(
+        df,
+        {
+            'sala': [s.id for s in salas],
+            'dia': DIAS_GRADE,
+            'hora': sorted(df['hora'].unique()),
+            'status': sorted(df['status'].unique())
+        },
+        rotulos={
+            'sala': {s.id: f"{s.nome} ({nomes_unidades.get(s.unidade_id, 'N/A')})" for s in salas},
+            'unidade': nomes_unidades
+        },
+        virtuais={'unidade': ('sala', salas_por_unidade)}
+    )
+
+def consulta_contagem_grade(profissional_ids=None):
+    """SELECT agrupado da grade por unidade, profissional e status (no formato dos contadores)"""
+    unidade = func.coalesce(Disponibilidade.unidade_id, SEM_UNIDADE)
+    consulta = select(
+        unidade,
+        Disponibilidade.profissional_id,
+        Disponibilidade.status,
+        func.count(Disponibilidade.id)
+    ).group_by(unidade, Disponibilidade.profissional_id, Disponibilidade.status)
+    if profissional_ids is not None:
+        consulta = consulta.where(Disponibilidade.profissional_id.in_(profissional_ids))
+    return consulta
+
+def atualizar_contadores_ocupacao(session, profissional_ids=None):
+    """Recalcula, na transação corrente, os contadores dos profissionais informados (todos quando None)"""
+    contadores = ContadorOcupacao.__table__
+    remover = delete(contadores)
+    if profissional_ids is not None:
+        profissional_ids = sorted(set(profissional_ids))
+        if not profissional_ids:
+            return
+        remover = remover.where(contadores.c.profissional_id.in_(profissional_ids))
+    
+    # Garante que alterações pendentes da grade entrem na contagem
+    session.flush()
+    session.execute(remover)
+    session.execute(
+        insert(contadores).from_select(
+            ['unidade_id', 'profissional_id', 'status', 'quantidade'],
+            consulta_contagem_grade(profissional_ids)
+        )
+    )
+
+def consultar_historico_ocupacao(session, inicio, fim, unidade_id=None, area_id=None):
+    """Retorna um DataFrame data × status com os retratos diários do período"""
+    query = session.query(
+        SnapshotOcupacao.data,
+        SnapshotOcupacao.status,
+        func.sum(SnapshotOcupacao.quantidade)
+    ).filter(SnapshotOcupacao.data.between(inicio, fim))
+    
+    if unidade_id:
+        query = query.filter(SnapshotOcupacao.unidade_id == unidade_id)
+    if area_id:
+        query = query.join(
+            profissional_area_atuacao,
+            profissional_area_atuacao.c.profissional_id == SnapshotOcupacao.profissional_id
+        ).filter(profissional_area_atuacao.c.area_atuacao_id == area_id)
+    
+    df = pd.DataFrame(
+        query.group_by(SnapshotOcupacao.data, SnapshotOcupacao.status).all(),
+        columns=['data', 'status', 'quantidade']
+    )
+    return df.pivot_table(
+        index='data', columns='status', values='quantidade', aggfunc='sum', fill_value=0
+    ).reindex(columns=['Disponível', 'Em atendimento', 'Bloqueio'], fill_value=0)
+
+def atualizar_agenda_diaria(session):
+    """Reconstrói a agregação diária da agenda fixa na transação corrente"""
+    session.flush()
+    session.execute(delete(AgendaDiaria.__table__))
+    
+    com_paciente = and_(AgendaFixa.paciente.isnot(None), AgendaFixa.paciente != '')
+    session.execute(
+        insert(AgendaDiaria.__table__).from_select(
+            ['data', 'unidade', 'profissional', 'tipo_atend', 'pagamento', 'agendamentos', 'atendimentos'],
+            select(
+                AgendaFixa.data,
+                AgendaFixa.unidade,
+                AgendaFixa.profissional,
+                func.coalesce(AgendaFixa.tipo_atend, ''),
+                func.coalesce(AgendaFixa.pagamento, ''),
+                func.count(AgendaFixa.id),
+                func.sum(case((com_paciente, 1), else_=0))
+            ).group_by(
+                AgendaFixa.data,
+                AgendaFixa.unidade,
+                AgendaFixa.profissional,
+                func.coalesce(AgendaFixa.tipo_atend, ''),
+                func.coalesce(AgendaFixa.pagamento, '')
+            )
+        )
+    )
+
+def consultar_agenda_diaria(session, inicio, fim, unidade=None):
+    """Retorna a agregação diária da agenda fixa no período (opcionalmente de uma unidade)"""
+    query = session.query(
+        AgendaDiaria.data,
+        AgendaDiaria.unidade,
+        AgendaDiaria.profissional,
+        AgendaDiaria.tipo_atend,
+        AgendaDiaria.pagamento,
+        AgendaDiaria.agendamentos,
+        AgendaDiaria.atendimentos
+    ).filter(AgendaDiaria.data.between(inicio, fim))
+    if unidade:
+        query = query.filter(AgendaDiaria.unidade == unidade)
+    return pd.DataFrame(
+        query.all(),
+        columns=['data', 'unidade', 'profissional', 'tipo_atend', 'pagamento', 'agendamentos', 'atendimentos']
+    )
+
+def capacidade_no_periodo(cubo, inicio, fim, por=None, **filtros):
+    """Capacidade datada a partir da grade semanal do cubo de profissionais.
+    
+    Sem `por`, retorna uma pd.Series indexada pelas datas do período; com `por`
+    (dimensão do cubo), retorna a capacidade total do período por chave da dimensão.
+    """
+    datas = pd.date_range(inicio, fim, freq='D')
+    # dayofweek: 0 = segunda ... 5 = sábado; domingo fica sem grade
+    dias = pd.Series(datas.dayofweek, index=datas).map(dict(enumerate(DIAS_GRADE)))
+    
+    if por is None:
+        por_dia = cubo.somar(manter=('dia',), status=STATUS_CAPACIDADE, **filtros)
+        return dias.map(por_dia).fillna(0).astype(int)
+    
+    tabela = cubo.tabela(por, 'dia', status=STATUS_CAPACIDADE, **filtros)
+    ocorrencias = dias.value_counts().reindex(tabela.columns, fill_value=0)
+    return tabela.dot(ocorrencias)
+
+def mapa_calor_ocupacao(cubo, **filtros):
+    """Taxa de ocupação (%) dia × hora calculada do cubo em uma única passada.
+    
+    Retorna um DataFrame com os dias da grade nas linhas e os horários nas colunas;
+    células sem capacidade ficam como NaN.
+    """
+    fatia, chaves = cubo.selecionar(**filtros)
+    manter = [cubo.nomes.index(nome) for nome in ('dia', 'hora', 'status')]
+    eixos = tuple(i for i in range(len(cubo.nomes)) if i not in manter)
+    # Após a soma restam os eixos dia × hora × status, na ordem do cubo
+    total = fatia.sum(axis=eixos)
+    
+    por_status = {s: total[..., i] for i, s in enumerate(chaves['status'])}
+    vazio = np.zeros(total.shape[:2])
+    ocupados = por_status.get('Em atendimento', vazio)
+    capacidade = sum((por_status.get(s, vazio) for s in STATUS_CAPACIDADE), vazio)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        taxa = np.where(capacidade > 0, ocupados / capacidade * 100, np.nan)
+    return pd.DataFrame(
+        taxa.round(1),
+        index=pd.Index(chaves['dia'], name='dia'),
+        columns=pd.Index(chaves['hora'], name='hora')
+    )
@@ -0,0 +1,110 @@
+"""Resolução dos nomes livres da agenda fixa para as chaves das entidades cadastradas.
+
+Os cadastros são carregados uma vez em mapas em memória (nome normalizado -> id), de
+modo que a importação e o preenchimento das linhas existentes não consultam o banco
+a cada linha.
+"""
+import logging
+
+import pandas as pd
+from sqlalchemy import update
+
+from models import AgendaFixa, Paciente, Pagamento, Profissional, Sala, Unidade
+from utils import normalizar_texto
+
+# Colunas de texto da agenda fixa e a coluna de chave estrangeira correspondente
+CHAVES_AGENDA = {
+    'unidade': 'unidade_id',
+    'sala': 'sala_id',
+    'profissional': 'profissional_id',
+    'pagamento': 'pagamento_id',
+    'paciente': 'paciente_id',
+}
+
+def _mapa_nomes(linhas):
+    """Mapa nome normalizado -> id; nomes que aparecem com ids diferentes ficam ambíguos (None)"""
+    mapa = {}
+    for id_, *chave in linhas:
+        chave = tuple(chave) if len(chave) > 1 else chave[0]
+        if chave in mapa and mapa[chave] != id_:
+            mapa[chave] = None
+        else:
+            mapa[chave] = id_
+    return mapa
+
+class MapasAgenda:
+    """Mapas em memória dos cadastros usados para resolver as linhas da agenda fixa"""
+
+    def __init__(self, session):
+        self.unidades = _mapa_nomes(
+            (id_, normalizar_texto(nome)) for id_, nome in session.query(Unidade.id, Unidade.nome)
+        )
+        # Salas têm o nome repetido entre unidades: a chave inclui a unidade
+        self.salas = _mapa_nomes(
+            (id_, unidade_id, normalizar_texto(nome))
+            for id_, unidade_id, nome in session.query(Sala.id, Sala.unidade_id, Sala.nome)
+        )
+        self.profissionais = _mapa_nomes(
+            (id_, normalizar_texto(nome)) for id_, nome in session.query(Profissional.id, Profissional.nome)
+        )
+        self.pagamentos = _mapa_nomes(
+            (id_, normalizar_texto(nome)) for id_, nome in session.query(Pagamento.id, Pagamento.nome)
+        )
+        self.pacientes = _mapa_nomes(
+            (id_, normalizar_texto(nome)) for id_, nome in session.query(Paciente.id, Paciente.nome)
+        )
+
+    def adicionar_unidade(self, nome, unidade_id):
+        """Registra a unidade resolvida fora do mapa (ex.: criada durante a importação)"""
+        self.unidades[normalizar_texto(nome)] = unidade_id
+
+    def resolver(self, unidade=None, sala=None, profissional=None, pagamento=None, paciente=None):
+        """Retorna as chaves estrangeiras (ou None) correspondentes aos nomes de uma linha da agenda"""
+        unidade_id = self.unidades.get(normalizar_texto(unidade)) if unidade else None
+        return {
+            'unidade_id': unidade_id,
+            'sala_id': self.salas.get((unidade_id, normalizar_texto(sala))) if sala and unidade_id else None,
+            'profissional_id': self.profissionais.get(normalizar_texto(profissional)) if profissional else None,
+            'pagamento_id': self.pagamentos.get(normalizar_texto(pagamento)) if pagamento else None,
+            'paciente_id': self.pacientes.get(normalizar_texto(paciente)) if paciente else None,
+        }
+
+def vincular_agenda_fixa(session, somente_pendentes=True):
+    """Preenche as chaves estrangeiras das linhas da agenda fixa a partir dos nomes; retorna as linhas alteradas.
+
+    Com `somente_pendentes`, considera apenas as linhas que ainda têm alguma chave vazia.
+    O commit fica a cargo de quem chama.
+    """
+    colunas = [AgendaFixa.id] + [getattr(AgendaFixa, nome) for nome in (*CHAVES_AGENDA, *CHAVES_AGENDA.values())]
+    consulta = session.query(*colunas)
+    if somente_pendentes:
+        consulta = consulta.filter(
+            AgendaFixa.unidade_id.is_(None) | AgendaFixa.sala_id.is_(None) |
+            AgendaFixa.profissional_id.is_(None) | AgendaFixa.pagamento_id.is_(None) |
+            AgendaFixa.paciente_id.is_(None)
+        )
+    linhas = pd.DataFrame(consulta.all(), columns=[coluna.key for coluna in colunas])
+    if linhas.empty:
+        return 0
+
+    mapas = MapasAgenda(session)
+    alteracoes = []
+    # Resolve cada combinação distinta de nomes uma única vez
+    nomes = list(CHAVES_AGENDA)
+    resolvidos = {}
+    for linha in linhas.itertuples(index=False):
+        combinacao = tuple(getattr(linha, nome) for nome in nomes)
+        if combinacao not in resolvidos:
+            resolvidos[combinacao] = mapas.resolver(*combinacao)
+        chaves = {
+            chave: valor for chave, valor in resolvidos[combinacao].items()
+            if valor is not None and pd.isna(getattr(linha, chave))
+        }
+        if chaves:
+            alteracoes.append({'id': int(linha.id), **chaves})
+
+    if alteracoes:
+        # UPDATE em lote pela chave primária
+        session.execute(update(AgendaFixa), alteracoes)
+    logging.info(f"Chaves da agenda fixa preenchidas em {len(alteracoes)} de {len(linhas)} linha(s)")
+    return len(alteracoes)
@@ -0,0 +1,41 @@
+"""Decomposição das carteiras: a versão vetorizada deve coincidir com a escalar"""
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from carteira import CAMPOS_CARTEIRA, decompor_carteira, decompor_carteiras  # noqa: E402
+
+AMOSTRAS = [
+    '0064.8000.391158.00-0',      # bem formada
+    ' 0064 . 8000.391158.00-0 ',  # espaços nas pontas e entre as partes
+    '0064.8000.391158.00',        # sem traço
+    '0064.8000.391158.00-',       # traço sem dígito
+    '0064.8000.391158.00-0-1',    # traço a mais
+    '0064.8000.391158.00.1-2',    # ponto a mais
+    '0064.8000.391158',           # pontos a menos
+    '...-',                       # apenas separadores
+    '00648000391158000',          # sem separadores
+    '',
+    '   ',
+    None,
+    float('nan'),
+    12345,
+]
+
+@pytest.mark.parametrize('numero', AMOSTRAS, ids=repr)
+def test_versao_vetorizada_coincide_com_a_escalar(numero):
+    escalar = decompor_carteira(numero)
+    vetorizada = decompor_carteiras(pd.Series([numero], dtype=object)).iloc[0]
+
+    esperado = escalar._asdict() if escalar else dict.fromkeys(CAMPOS_CARTEIRA)
+    assert vetorizada.to_dict() == esperado
+
+def test_versao_vetorizada_mantem_a_ordem_do_lote():
+    numeros = pd.Series(AMOSTRAS, dtype=object, index=range(100, 100 + len(AMOSTRAS)))
+
+    componentes = decompor_carteiras(numeros)
+
+    assert list(componentes.index) == list(numeros.index)
+    assert [tuple(linha) for linha in componentes.itertuples(index=False)] == [
+        tuple(decompor_carteira(numero) or (None,) * len(CAMPOS_CARTEIRA)) for numero in AMOSTRAS
+    ]
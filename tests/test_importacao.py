@@ -0,0 +1,49 @@
+"""Importação dos cadastros de referência: comparação por impressões digitais"""
+import os
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+pd = pytest.importorskip('pandas')
+
+# database.py cria o engine na importação; o teste usa um engine próprio
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import Base, criar_engine  # noqa: E402
+from importacao import IMPORTACAO_UNIDADES, importar_tabela  # noqa: E402
+
+@pytest.fixture
+def session(tmp_path):
+    engine = criar_engine(f"sqlite:///{tmp_path / 'agenda.sqlite'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+def unidades(*nomes):
+    return pd.DataFrame({'id': range(1, len(nomes) + 1), 'nome': nomes, 'atende_sabado': 'sim', 'ativo': 1})
+
+def test_upload_identico_em_outra_ordem_nao_grava(session):
+    importar_tabela(session, IMPORTACAO_UNIDADES, unidades("Centro", "Oeste"))
+    session.commit()
+
+    resultado = importar_tabela(session, IMPORTACAO_UNIDADES, unidades("Centro", "Oeste").iloc[::-1])
+
+    assert resultado.identico
+    assert resultado[:3] == (0, 0, 2)
+
+def test_upload_parcial_grava_apenas_as_diferencas(session):
+    importar_tabela(session, IMPORTACAO_UNIDADES, unidades("Centro", "Oeste"))
+    session.commit()
+
+    # Subconjunto da tabela: não é idêntico, mas nada é gravado
+    subconjunto = importar_tabela(session, IMPORTACAO_UNIDADES, unidades("Centro"))
+    assert not subconjunto.identico
+    assert subconjunto[:3] == (0, 0, 1)
+
+    resultado = importar_tabela(session, IMPORTACAO_UNIDADES, unidades("Centro", "Leste", "Sul"))
+
+    assert not resultado.identico
+    assert resultado[:3] == (1, 1, 1)
@@ -0,0 +1,17 @@
+"""Leitura dos uploads: datas em texto no padrão brasileiro"""
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from leitura import ler_planilha  # noqa: E402
+
+def test_datas_de_csv_com_o_dia_primeiro():
+    conteudo = "Data;Profissional\n05/10/2026;Ana\n2026-10-06;Bia\nsem data;Caio\n".encode('utf-8')
+
+    dados = ler_planilha(conteudo, nome='agenda.csv', datas=['Data']).dados
+
+    assert list(dados['Data'][:2]) == [datetime(2026, 10, 5), datetime(2026, 10, 6)]
+    # Texto que não é data fica como veio, para a validação do upload
+    assert dados['Data'][2] == 'sem data'
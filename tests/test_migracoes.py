@@ -0,0 +1,95 @@
+"""Migrações de esquema: atualização de um banco existente a partir da versão 2"""
+import os
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+pytest.importorskip('pandas')
+pytest.importorskip('streamlit')
+
+# database.py cria o engine na importação; o teste usa um engine próprio
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from sqlalchemy import inspect, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app  # noqa: E402
+from database import Base, criar_engine  # noqa: E402
+from models import AgendaFixa, Carteira, Paciente, Pagamento, VersaoEsquema  # noqa: E402
+
+NUMERO_CARTEIRA = '0064.8000.391158.00-0'
+
+@pytest.fixture
+def banco_versao_2(tmp_path):
+    """Banco SQLite em arquivo (pool com várias conexões) na versão 2: sem o índice único,
+    sem os componentes da carteira, agenda fixa sem chaves estrangeiras e carteiras repetidas"""
+    engine = criar_engine(f"sqlite:///{tmp_path / 'agenda.sqlite'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        for indice in ('uq_carteiras_paciente_numero_pagamento', 'ix_carteiras_operadora', 'ix_carteiras_base'):
+            conexao.execute(text(f"DROP INDEX {indice}"))
+        for coluna in ('operadora', 'plano', 'base', 'dependencia', 'digito'):
+            conexao.execute(text(f"ALTER TABLE carteiras DROP COLUMN {coluna}"))
+        # Agenda fixa como era antes das chaves estrangeiras (só os nomes)
+        conexao.execute(text("DROP TABLE agenda_fixa"))
+        conexao.execute(text("""
+            CREATE TABLE agenda_fixa (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, data DATE NOT NULL, dia_semana VARCHAR(20) NOT NULL,
+                horario VARCHAR(5) NOT NULL, unidade VARCHAR(100) NOT NULL, sala VARCHAR(50),
+                profissional VARCHAR(100) NOT NULL, tipo_atend VARCHAR(100) NOT NULL,
+                cod_faturamento VARCHAR(50), qtd_sess INTEGER, pagamento VARCHAR(50),
+                paciente VARCHAR(100), created_at DATE, updated_at DATE
+            )
+        """))
+        conexao.execute(text("CREATE INDEX ix_agenda_fixa_data ON agenda_fixa (data)"))
+
+    Sessao = sessionmaker(bind=engine)
+    with Sessao() as session:
+        session.add_all([
+            VersaoEsquema(versao=1, descricao="Criação das tabelas e dados iniciais"),
+            VersaoEsquema(versao=2, descricao="Índice de AgendaFixa.data e agenda diária"),
+            Pagamento(id=1, nome="Convênio"),
+            Paciente(id=1, id_paciente_carteira=10, nome="Maria da Silva"),
+        ])
+        session.flush()
+        # Mesma chave três vezes (tabela ainda sem os componentes)
+        session.execute(text(
+            "INSERT INTO carteiras (paciente_id, numero_carteira, id_pagamento, status) "
+            "VALUES (1, :numero, 1, 'Ativo')"
+        ), [{'numero': NUMERO_CARTEIRA}] * 3)
+        session.execute(text(
+            "INSERT INTO agenda_fixa (data, dia_semana, horario, unidade, profissional, tipo_atend, pagamento, paciente) "
+            "VALUES ('2025-04-07', 'Segunda-feira', '08:00', 'Unidade Oeste', 'Ana Souza', 'Terapia', "
+            "'Convênio', 'Maria da Silva')"
+        ))
+        session.commit()
+
+    yield Sessao, engine
+    engine.dispose()
+
+def test_atualiza_banco_versao_2_com_carteiras_duplicadas(banco_versao_2):
+    Sessao, engine = banco_versao_2
+
+    with Sessao() as session:
+        versao = app.aplicar_migracoes(session)
+
+    assert versao == app.MIGRACOES[-1][0]
+    indices = {indice['name'] for indice in inspect(engine).get_indexes('carteiras')}
+    assert {'uq_carteiras_paciente_numero_pagamento', 'ix_carteiras_operadora', 'ix_carteiras_base'} <= indices
+    with Sessao() as session:
+        carteiras = session.query(Carteira).all()
+        assert len(carteiras) == 1
+        assert carteiras[0].base == '391158'
+        agenda = session.query(AgendaFixa).one()
+        assert (agenda.paciente_id, agenda.pagamento_id) == (1, 1)
+    indices_agenda = {indice['name'] for indice in inspect(engine).get_indexes('agenda_fixa')}
+    assert {'ix_agenda_fixa_paciente_id', 'ix_agenda_fixa_profissional_id'} <= indices_agenda
+
+def test_migracoes_aplicadas_sao_ignoradas(banco_versao_2):
+    Sessao, _ = banco_versao_2
+
+    with Sessao() as session:
+        app.aplicar_migracoes(session)
+    with Sessao() as session:
+        assert app.aplicar_migracoes(session) == app.MIGRACOES[-1][0]
+        assert session.query(VersaoEsquema).count() == len(app.MIGRACOES)
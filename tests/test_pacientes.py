@@ -0,0 +1,76 @@
+"""Pacientes: upload, mesclagem de duplicados e vínculo dos nomes da agenda fixa"""
+import os
+from datetime import date
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+pytest.importorskip('pandas')
+pytest.importorskip('streamlit')
+
+# database.py cria o engine na importação; o teste usa um engine próprio
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pandas as pd  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app  # noqa: E402
+from database import Base, criar_engine  # noqa: E402
+from models import AgendaFixa, Paciente, Pagamento  # noqa: E402
+
+@pytest.fixture
+def session(tmp_path):
+    engine = criar_engine(f"sqlite:///{tmp_path / 'agenda.sqlite'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add_all([
+            Paciente(id=1, id_paciente_carteira=10, nome="Maria Silva"),
+            Paciente(id=2, id_paciente_carteira=20, nome="Maria da Silva"),
+            # Homônimo do duplicado, com linhas próprias na agenda
+            Paciente(id=3, id_paciente_carteira=30, nome="Maria da Silva"),
+        ])
+        for paciente_id in (None, 2, 3):
+            session.add(AgendaFixa(
+                data=date(2026, 10, 5), dia_semana='Segunda-feira', horario='08:00', unidade='Unidade Oeste',
+                profissional='Ana Souza', tipo_atend='Terapia', paciente="Maria da Silva", paciente_id=paciente_id
+            ))
+        session.commit()
+        yield session
+    engine.dispose()
+
+def vinculos(session):
+    """Pacientes vinculados às linhas da agenda (0 = sem vínculo), em ordem"""
+    return sorted(id_ or 0 for (id_,) in session.query(AgendaFixa.paciente_id))
+
+def test_mesclagem_preserva_agenda_de_homonimo(session):
+    app.mesclar_pacientes(session, manter_id=1, remover_id=2)
+    session.commit()
+
+    assert vinculos(session) == [1, 1, 3]
+    assert session.get(Paciente, 2) is None
+
+def test_vinculo_da_agenda_altera_apenas_linhas_sem_paciente(session):
+    linhas = app.vincular_nome_agenda(session, "Maria da Silva", session.get(Paciente, 1))
+    session.commit()
+
+    assert linhas == 1
+    assert vinculos(session) == [1, 2, 3]
+
+def test_upload_recusa_id_de_paciente_nao_inteiro(session, monkeypatch):
+    session.add(Pagamento(id=1, nome="Convênio"))
+    session.commit()
+    monkeypatch.setattr(app, 'get_session', lambda: session)
+    planilha = pd.DataFrame({
+        'numeroCarteira': ['0064.8000.391158.00-0', '0064.8000.391159.00-0'],
+        'idPacienteCarteira': [10.5, 40],
+        'NomePaciente': ["Outra Pessoa", "João Souza"],
+        'IdPagamento': [1, 1],
+        'Status': ['Ativo', 'Ativo'],
+    })
+
+    resultado = app.processar_upload_pacientes(planilha)
+
+    assert (resultado['processados'], resultado['ignorados']) == (1, 1)
+    assert "linha 2" in resultado['erros'][0]
+    # O paciente 10 não foi sobrescrito
+    assert session.query(Paciente.nome).filter(Paciente.id_paciente_carteira == 10).scalar() == "Maria Silva"
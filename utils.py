@@ -0,0 +1,40 @@
+"""Funções utilitárias de texto compartilhadas pelo app e pelos serviços"""
+import logging
+import re
+import unicodedata
+
+import pandas as pd
+from unidecode import unidecode
+
+def remover_acentos(texto: str) -> str:
+    """Remove acentos de um texto"""
+    if not isinstance(texto, str):
+        return ''
+    nfkd = unicodedata.normalize('NFKD', texto)
+    return u"".join([c for c in nfkd if not unicodedata.combining(c)])
+
+def normalizar_texto(texto):
+    """Normaliza um texto removendo acentos, caracteres especiais e espaços extras"""
+    try:
+        if pd.isna(texto) or texto is None:
+            return ""
+        
+        # Converter para string
+        texto = str(texto)
+        
+        # Remover caracteres especiais e acentos
+        texto = unidecode(texto)
+        
+        # Converter para minúsculo
+        texto = texto.lower()
+        
+        # Remover caracteres especiais mantendo letras, números e espaços
+        texto = re.sub(r'[^a-z0-9\s]', '', texto)
+        
+        # Remover espaços extras
+        texto = ' '.join(texto.split())
+        
+        return texto
+    except Exception as e:
+        logging.error(f"Erro ao normalizar texto '{texto}': {str(e)}")
+        return texto